@@ -0,0 +1,94 @@
+import queue
+import threading
+import cv2
+
+class AnnotatedVideoWriter:
+    '''
+    在背景執行緒中將標記好的畫面以 cv2.VideoWriter 寫成影片[path]，編碼不會拖慢偵測。[fps]為輸出影片每秒的幀數。
+    [scale]為畫面縮放的比例，[everyNth]為每幾幀寫入一幀。尚未寫入的畫面最多暫存[queueSize]幀，已滿時[block]為False則捨棄該幀，否則等待寫入。
+    畫面放入後會直接在背景執行緒中使用，放入後不可再修改。
+    '''
+    def __init__(self, path, fps, scale = 1.0, everyNth = 1, queueSize = 64, block = False, fourcc = 'mp4v'):
+        #輸出影片的路徑。
+        self._path = path
+        #輸出影片每秒的幀數，每幾幀寫入一幀時等比例降低，播放速度才會與原影片相同。
+        self._fps = max(1.0, (fps if fps > 0 else 30.0) / everyNth)
+        #畫面縮放的比例。
+        self._scale = scale
+        #每幾幀寫入一幀。
+        self._everyNth = everyNth
+        #暫存已滿時是否等待寫入。
+        self._block = block
+        #影片編碼。
+        self._fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        #尚未寫入的畫面。
+        self._frameQueue = queue.Queue(maxsize = queueSize)
+        #傳入過的幀數。
+        self._nFrames = 0
+        #因暫存已滿而被捨棄的幀數。
+        self._nDropped = 0
+        #背景執行緒中發生的異常，關閉時再拋出。
+        self._error = None
+        self._writer = None
+        self._thread = threading.Thread(target = self._run, daemon = True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    #傳入一幀標記好的畫面[frame]，每 everyNth 幀才會放入暫存等待寫入。
+    def write(self, frame):
+        self._nFrames += 1
+        if (self._nFrames - 1) % self._everyNth != 0:
+            return
+        if self._block:
+            self._frameQueue.put(frame)
+            return
+        try:
+            self._frameQueue.put_nowait(frame)
+        except queue.Full:
+            self._nDropped += 1
+
+    #因暫存已滿而被捨棄的幀數。
+    def droppedFrames(self):
+        return self._nDropped
+
+    #背景執行緒，依序縮放並寫入暫存中的畫面，收到None時結束。
+    def _run(self):
+        while True:
+            frame = self._frameQueue.get()
+            if frame is None:
+                break
+            #發生異常後只取出畫面，避免放入畫面時一直等待。
+            if self._error is not None:
+                continue
+            try:
+                if self._scale != 1.0:
+                    frame = cv2.resize(frame, None, fx = self._scale, fy = self._scale, interpolation = cv2.INTER_AREA)
+                #影片一律為彩色，灰階的畫面（例如讀取時就轉為灰階）先轉為BGR。
+                if frame.ndim == 2:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+                #依照第一幀的大小建立影片。
+                if self._writer is None:
+                    self._writer = cv2.VideoWriter(self._path, self._fourcc, self._fps, (frame.shape[1], frame.shape[0]))
+                    if not self._writer.isOpened():
+                        raise Exception('Can not open video writer: {}.'.format(self._path))
+                self._writer.write(frame)
+            except Exception as e:
+                self._error = e
+
+    #等待暫存中的畫面都寫入後關閉影片。背景執行緒中發生異常時在此拋出。
+    def close(self):
+        if self._thread is not None:
+            self._frameQueue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
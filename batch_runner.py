@@ -0,0 +1,93 @@
+import glob
+import hashlib
+import mimetypes
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from utils import Utils
+
+class BatchRunner:
+    #[runnerOptions]為傳給每個 Runner 的其他設定。
+    def __init__(self, inputs, outputRoot = 'Result', nProcesses = None, nThreads = None, **runnerOptions):
+        #要處理的影片，可以是影片路徑、資料夾或萬用字元（glob）。
+        self._inputFiles = self.expandInputs(inputs)
+        #所有影片結果的輸出資料夾，每部影片會有各自的子資料夾。
+        self._outputRoot = outputRoot
+        #同時處理影片的行程數量，預設為CPU核心數。
+        self._nProcesses = nProcesses if nProcesses is not None else (os.cpu_count() or 1)
+        #每個行程中偵測斜紋的執行緒數量，預設將CPU核心平均分給每個行程。
+        self._nThreads = nThreads if nThreads is not None else max(1, (os.cpu_count() or 1) // self._nProcesses)
+        #傳給每個 Runner 的其他設定。
+        self._runnerOptions = runnerOptions
+
+    #將[inputs]中的影片路徑、資料夾與萬用字元展開為不重複且依序排列的影片路徑。
+    @staticmethod
+    def expandInputs(inputs):
+        inputFiles = []
+        for i in inputs:
+            if os.path.isdir(i):
+                candidates = sorted(os.path.join(i, name) for name in os.listdir(i))
+            elif glob.has_magic(i):
+                candidates = sorted(glob.glob(i, recursive = True))
+            else:
+                candidates = [i]
+            for c in candidates:
+                mimeType = mimetypes.guess_type(c)[0]
+                if os.path.isfile(c) and mimeType is not None and mimeType.split('/')[0] == 'video' and c not in inputFiles:
+                    inputFiles.append(c)
+        return inputFiles
+
+    #每部影片的輸出資料夾。以影片檔名命名，若有檔名相同的影片，則再加上由影片完整路徑產生的短雜湊值，讓同一部影片每次都輸出到相同的資料夾。
+    def _outputFolders(self):
+        stems = [os.path.splitext(os.path.basename(f))[0] for f in self._inputFiles]
+        folders = []
+        for f, stem in zip(self._inputFiles, stems):
+            if stems.count(stem) > 1:
+                stem = '{}-{}'.format(stem, hashlib.md5(os.path.abspath(f).encode('utf-8')).hexdigest()[:8])
+            folders.append(os.path.join(self._outputRoot, stem))
+        return folders
+
+    #使用多個行程處理所有影片，並回傳每部影片的處理結果。
+    def run(self):
+        results = []
+        with ProcessPoolExecutor(max_workers = self._nProcesses) as executor:
+            futures = [executor.submit(_runVideo, f, folder, self._nThreads, self._runnerOptions) for f, folder in zip(self._inputFiles, self._outputFolders())]
+            for future in futures:
+                results.append(future.result())
+        return results
+
+    #將處理結果[results]整理成表格文字，包含每條鋼纜的斜紋數量、補償數量與處理速度。
+    @staticmethod
+    def summary(results):
+        header = ['影片', '斜紋數量', '補償數量', '幀數', '秒數', 'FPS']
+        rows = []
+        for r in results:
+            if r['error'] is not None:
+                rows.append([r['inputFile'], '錯誤：{}'.format(r['error']), '', '', '', ''])
+                continue
+            rows.append([
+                r['inputFile'],
+                '/'.join(str(c) for c in r['counts']),
+                '/'.join(str(c) for c in r['compensateCounts']),
+                str(r['nFrames']),
+                '{:.1f}'.format(r['seconds']),
+                '{:.1f}'.format(r['nFrames'] / r['seconds'] if r['seconds'] > 0 else 0.0),
+            ])
+        return Utils.formatTable(header, rows)
+
+#在行程中以無視窗模式處理影片[inputFile]，結果輸出到[outputFolder]。
+def _runVideo(inputFile, outputFolder, nThreads, runnerOptions):
+    #沒有視窗時，圖表使用不需顯示的後端繪製。只計數時不畫圖表，不需載入 matplotlib。
+    if not runnerOptions.get('countOnly', False):
+        import matplotlib
+        matplotlib.use('Agg')
+    from runner import Runner
+    result = {'inputFile': inputFile, 'outputFolder': outputFolder, 'counts': None, 'compensateCounts': None, 'nFrames': 0, 'seconds': 0.0, 'error': None}
+    start = time.monotonic()
+    try:
+        counts, compensateCounts, nFrames = Runner(inputFile, nWorkers = nThreads, headless = True, outputFolder = outputFolder, **runnerOptions).run()
+        result.update(counts = list(counts), compensateCounts = list(compensateCounts), nFrames = nFrames)
+    except Exception as e:
+        result['error'] = str(e) or type(e).__name__
+    result['seconds'] = time.monotonic() - start
+    return result
@@ -0,0 +1,2 @@
+from .synthetic_video import SyntheticVideo
+from .benchmark import Benchmark, SCENARIOS
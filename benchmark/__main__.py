@@ -0,0 +1,25 @@
+import argparse
+import json
+from benchmark import Benchmark
+
+parser = argparse.ArgumentParser(description = '以合成的鋼纜影片測試斜紋偵測、追蹤與計數的速度與正確性。')
+#要測試的場景（見 SCENARIOS），預設為全部。
+parser.add_argument('scenarios', nargs = '*')
+#每個場景的幀數。
+parser.add_argument('--frames', type = int, default = 300)
+#存放合成影片的資料夾，未指定時測試完即刪除。
+parser.add_argument('--output', default = None)
+#使用以等速度預測斜紋位置並以線性指派配對的追蹤器。
+parser.add_argument('--predictive-tracking', action = 'store_true')
+#將測試結果以JSON格式存到該檔案。
+parser.add_argument('--json', default = None)
+args = parser.parse_args()
+#判斷鋼纜移動方向至少需要追蹤兩幀。
+if args.frames < 2:
+    parser.error('--frames must be at least 2.')
+
+results = Benchmark(args.scenarios or None, nFrames = args.frames, folder = args.output, predictiveTracking = args.predictive_tracking).run()
+print(Benchmark.summary(results))
+if args.json is not None:
+    with open(args.json, 'w', encoding = 'utf-8') as f:
+        json.dump(results, f, ensure_ascii = False, indent = 2)
@@ -0,0 +1,130 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from utils import Utils
+from .synthetic_video import SyntheticVideo
+
+#預設的測試場景，每個場景為 SyntheticVideo 的參數。
+SCENARIOS = {
+    'baseline': {},
+    'slow': {'speed': 0.8},
+    'fast': {'speed': 6.0},
+    'downward': {'upward': False},
+    'dropouts': {'dropout': 0.15},
+    'hd': {'width': 1920, 'height': 1080, 'nCables': 8, 'cableWidth': 100, 'cableGap': 80, 'stripeSpacing': 40, 'speed': 4.0},
+}
+
+class Benchmark:
+    '''
+    以合成的鋼纜影片測試偵測、追蹤與計數的速度與正確性。[scenarios]為要測試的場景名稱（見 SCENARIOS），每個場景產生[nFrames]幀的影片。
+    影片與 Runner 的輸出寫入[folder]，未指定時寫入暫存資料夾並在測試完後刪除。每個場景在獨立的行程中以不顯示視窗的 Runner 執行，讓記憶體用量互不影響。
+    [predictiveTracking]為是否使用 PredictiveLineTracker。某個場景執行失敗時，其結果只包含錯誤訊息，不影響其他場景。
+    '''
+    def __init__(self, scenarios = None, nFrames = 300, folder = None, predictiveTracking = False):
+        #要測試的場景。
+        self._scenarios = scenarios if scenarios is not None else list(SCENARIOS.keys())
+        for name in self._scenarios:
+            if name not in SCENARIOS:
+                raise Exception('Unknown benchmark scenario: {}.'.format(name))
+        #每個場景的幀數。
+        self._nFrames = nFrames
+        #存放影片的資料夾。
+        self._folder = folder
+        #是否使用 PredictiveLineTracker。
+        self._predictiveTracking = predictiveTracking
+
+    #執行所有場景並回傳每個場景的結果。
+    def run(self):
+        folder = self._folder if self._folder is not None else tempfile.mkdtemp(prefix = 'benchmark-')
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        results = []
+        try:
+            for name in self._scenarios:
+                options = dict(SCENARIOS[name], nFrames = self._nFrames)
+                video = SyntheticVideo(**options)
+                path = video.write(os.path.join(folder, '{}.avi'.format(name)))
+                #界線的位置，與 Runner 相同。
+                borderY = int(round(0.35 * video.size()[1]))
+                counts, droppedCounts = video.groundTruth(borderY)
+                #以新的行程執行，避免前一個場景的記憶體用量影響結果。
+                try:
+                    with ProcessPoolExecutor(max_workers = 1, mp_context = multiprocessing.get_context('spawn')) as executor:
+                        result = executor.submit(_runScenario, path, os.path.join(folder, name), self._predictiveTracking).result()
+                    result['error'] = None
+                except Exception as e:
+                    result = {'error': str(e) or type(e).__name__}
+                result.update(scenario = name, truth = counts, truthDropped = droppedCounts)
+                results.append(result)
+        finally:
+            if self._folder is None:
+                shutil.rmtree(folder, ignore_errors = True)
+        return results
+
+    #將測試結果[results]整理成兩個表格文字：計數正確性與速度，以及斜紋偵測每個處理階段的耗時百分位數（毫秒）。
+    @staticmethod
+    def summary(results):
+        header = ['場景', '斜紋數量', '正確數量', '誤差', '補償數量', '消失數量', '幀數', 'FPS', '記憶體(MB)']
+        rows = []
+        for r in results:
+            if r['error'] is not None:
+                rows.append([r['scenario'], '錯誤：{}'.format(r['error']), '', '', '', '', '', '', ''])
+                continue
+            rows.append([
+                r['scenario'],
+                '/'.join(str(c) for c in r['counts']),
+                '/'.join(str(c) for c in r['truth']),
+                str(sum(abs(c - t) for c, t in zip(r['counts'], r['truth']))),
+                '/'.join(str(c) for c in r['compensateCounts']),
+                '/'.join(str(c) for c in r['truthDropped']),
+                str(r['nFrames']),
+                '{:.1f}'.format(r['fps']),
+                '{:.0f}'.format(r['peakMemoryMB']) if r['peakMemoryMB'] is not None else '-',
+            ])
+        #所有場景出現過的處理階段，依處理順序排列。
+        #執行失敗的場景沒有各處理階段的耗時。
+        succeeded = [r for r in results if r['error'] is None]
+        stages = list(dict.fromkeys(stage for r in succeeded for stage in r['stages']))
+        stageHeader = ['場景'] + ['{} p50/p95/p99'.format(stage) for stage in stages]
+        stageRows = [[r['scenario']] + ['/'.join('{:.2f}'.format(p) for p in r['stages'][stage]) if stage in r['stages'] else '-' for stage in stages] for r in succeeded]
+        return '{}\n\n{}'.format(Utils.formatTable(header, rows), Utils.formatTable(stageHeader, stageRows))
+
+#峰值記憶體用量（MB），無法取得時為None。
+def _peakMemoryMB():
+    try:
+        import resource
+    except ImportError:
+        return None
+    #Linux 的單位為KB，macOS 為位元組。
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if peak > 1 << 30 else peak / 1024
+
+'''
+在行程中以不顯示視窗、只計數並收集斜紋偵測器統計資料的 Runner 處理影片[path]，結果輸出到[folder]。鋼纜移動方向與分段讀取、偵測的流程都與實際執行時相同。
+回傳斜紋偵測每個處理階段每幀耗時的 50、95、99 百分位數（毫秒）、處理速度、峰值記憶體用量與計數結果。
+'''
+def _runScenario(path, folder, predictiveTracking):
+    from runner import Runner
+    start = time.perf_counter()
+    counts, compensateCounts, nFrames = Runner(path, headless = True, outputFolder = folder, predictiveTracking = predictiveTracking, stats = True, countOnly = True).run()
+    seconds = time.perf_counter() - start
+    #每一幀各處理階段的耗時（毫秒），由 Runner 輸出的每一幀統計資料取得。
+    with open(os.path.join(folder, 'detector_stats.jsonl'), encoding = 'utf-8') as f:
+        records = [json.loads(line)['stages'] for line in f]
+    #依處理順序排列，以經過最多處理階段的一幀為準（判斷鋼纜移動方向時已偵測過的幀只包含 detect 中的階段）。
+    stages = list(dict.fromkeys([*max(records, key = len, default = {}), *(stage for r in records for stage in r)]))
+    latencies = {stage: [r[stage] for r in records if stage in r] for stage in stages}
+    return {
+        'nFrames': nFrames,
+        'seconds': seconds,
+        'fps': nFrames / seconds if seconds > 0 else 0.0,
+        'stages': {stage: [float(np.percentile(ms, p)) for p in (50, 95, 99)] for stage, ms in latencies.items()},
+        'peakMemoryMB': _peakMemoryMB(),
+        'counts': list(counts),
+        'compensateCounts': list(compensateCounts),
+    }
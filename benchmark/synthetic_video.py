@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+
+class SyntheticVideo:
+    '''
+    以 OpenCV 繪製的電梯鋼纜影片，並提供已知的正確斜紋數量。
+    [nCables]條寬[cableWidth]、間隔[cableGap]像素的鋼纜，鋼纜上每隔[stripeSpacing]像素有一條斜率為[slope]的斜紋，鋼纜每幀移動[speed]像素且每幀再加快[acceleration]像素，[upward]為移動方向。
+    [noise]為雜訊強度，[dropout]為斜紋消失（不被繪製）的比例，用來測試補斜紋的功能。[seed]固定時每次產生的影片都相同。
+    '''
+    def __init__(self, nFrames = 300, width = 640, height = 480, nCables = 4, cableWidth = 50, cableGap = 30, stripeSpacing = 24, slope = 0.35, speed = 3.0, acceleration = 0.0, upward = True, noise = 8, dropout = 0.05, seed = 0, fps = 30):
+        #影片幀數、寬、高與每秒幀數。
+        self._nFrames = nFrames
+        self._width = width
+        self._height = height
+        self._fps = fps
+        #鋼纜數量、寬度與間隔。
+        self._nCables = nCables
+        self._cableWidth = cableWidth
+        self._cableGap = cableGap
+        #相鄰斜紋的間距與斜紋斜率。
+        self._stripeSpacing = stripeSpacing
+        self._slope = slope
+        #鋼纜每幀移動的像素、每幀加快的像素與移動方向。
+        self._speed = speed
+        self._acceleration = acceleration
+        self._upward = upward
+        #雜訊強度。
+        self._noise = noise
+        #亂數產生器的種子。
+        self._seed = seed
+        rng = np.random.default_rng(seed)
+        #斜紋編號的數量為2 * nStripes，足以涵蓋整部影片中出現在畫面內的所有斜紋。
+        self._nStripes = int(np.ceil((height + self._distance(nFrames)) / stripeSpacing)) + 8
+        #每條鋼纜上每條斜紋是否消失。
+        self._drops = rng.random((nCables, 2 * self._nStripes)) < dropout
+        #每條斜紋端點位置的微小偏移，讓斜紋的面積與角度不完全相同。
+        self._jitters = rng.normal(0, 1.5, (nCables, 2 * self._nStripes, 3))
+
+    #影片的寬與高。
+    def size(self):
+        return (self._width, self._height)
+
+    #依序產生影片的每一幀。
+    def frames(self):
+        rng = np.random.default_rng(self._seed + 1)
+        for f in range(0, self._nFrames):
+            frame = np.full((self._height, self._width, 3), 40, np.uint8)
+            stripes = self._visibleStripes(f)
+            for c in range(0, self._nCables):
+                x0 = self._cableLeft(c)
+                #繪製鋼纜。
+                cv2.rectangle(frame, (x0, 0), (x0 + self._cableWidth, self._height), (70, 70, 70), -1)
+                #繪製畫面內的斜紋。
+                for k in stripes:
+                    if self._drops[c, k]:
+                        continue
+                    y = self._stripeY(k, f)
+                    jitter = self._jitters[c, k]
+                    p1 = (x0 + 4 + int(round(jitter[0])), int(round(y + self._cableWidth * self._slope / 2 + jitter[2])))
+                    p2 = (x0 + self._cableWidth - 4 - int(round(jitter[1])), int(round(y - self._cableWidth * self._slope / 2 - jitter[2])))
+                    cv2.line(frame, p1, p2, (210, 210, 210), 5 + int(abs(jitter[2]) > 1))
+            if self._noise:
+                frame = cv2.add(frame, rng.integers(0, self._noise, frame.shape, dtype = np.uint8))
+            yield frame
+
+    #將影片寫入[path]，使用 MJPG 編碼。
+    def write(self, path):
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), self._fps, self.size())
+        if not writer.isOpened():
+            raise Exception('Can not open video writer.')
+        for frame in self.frames():
+            writer.write(frame)
+        writer.release()
+        return path
+
+    '''
+    以界線[borderY]計算每條鋼纜正確的斜紋數量與其中消失（需要補）的斜紋數量。
+    與 LineCounter 相同，只計算第一幀時還沒超過界線、最後一幀時已超過界線的斜紋。
+    '''
+    def groundTruth(self, borderY):
+        counts = [0] * self._nCables
+        droppedCounts = [0] * self._nCables
+        for k in range(0, 2 * self._nStripes):
+            firstY = self._stripeY(k, 0)
+            lastY = self._stripeY(k, self._nFrames - 1)
+            crossed = (firstY > borderY and lastY < borderY) if self._upward else (firstY < borderY and lastY > borderY)
+            if not crossed:
+                continue
+            for c in range(0, self._nCables):
+                counts[c] += 1
+                droppedCounts[c] += int(self._drops[c, k])
+        return (counts, droppedCounts)
+
+    #第[c]條鋼纜左側的X座標，所有鋼纜置中排列。
+    def _cableLeft(self, c):
+        left = (self._width - self._nCables * self._cableWidth - (self._nCables - 1) * self._cableGap) // 2
+        return left + c * (self._cableWidth + self._cableGap)
+
+    #第[k]條斜紋在第[f]幀中心點的Y座標。斜紋編號由鋼纜上方往下遞增。
+    def _stripeY(self, k, f):
+        offset = -self._distance(f) if self._upward else self._distance(f)
+        return (k - self._nStripes) * self._stripeSpacing + offset + (self._distance(self._nFrames) if self._upward else 0)
+
+    #鋼纜從第一幀到第[f]幀移動的距離。
+    def _distance(self, f):
+        return self._speed * f + self._acceleration * f * f / 2
+
+    #第[f]幀中可能出現在畫面內的斜紋編號。
+    def _visibleStripes(self, f):
+        margin = self._cableWidth * self._slope
+        return [k for k in range(0, 2 * self._nStripes) if -margin <= self._stripeY(k, f) <= self._height + margin]
@@ -0,0 +1,63 @@
+import cv2
+import time
+from frame_source import FrameSource
+
+class CaptureSource(FrameSource):
+    #以 cv2.VideoCapture 讀取影片檔或攝影機[device]。[live]為是否為即時來源（攝影機），即時來源的時間為開啟後經過的時間。
+    def __init__(self, device, live = False):
+        super().__init__()
+        self._capture = cv2.VideoCapture(device)
+        if not self._capture.isOpened():
+            raise Exception('Can not open video source: {}.'.format(device))
+        #是否為即時來源。
+        self._live = live
+        #開啟來源的時間。
+        self._startTime = time.monotonic()
+
+    def read(self):
+        ret, frame = self._capture.read()
+        if ret:
+            self._update()
+        return (ret, frame)
+
+    def grab(self):
+        ret = self._capture.grab()
+        if ret:
+            self._update()
+        return ret
+
+    #移到已讀過[position]幀的位置。影片無法直接定位到該幀時，改為從頭逐幀跳過。
+    def seek(self, position):
+        if self._live:
+            raise Exception('Can not seek in a live video source.')
+        self._capture.set(cv2.CAP_PROP_POS_FRAMES, position)
+        if int(self._capture.get(cv2.CAP_PROP_POS_FRAMES)) != position:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            for _ in range(position):
+                if not self._capture.grab():
+                    raise Exception('Can not seek to frame {}.'.format(position))
+        self._update()
+
+    #更新已讀過的幀數與最後讀取的幀的時間。影片檔使用影片本身的位置與時間。
+    def _update(self):
+        if self._live:
+            self._position += 1
+            self._msec = (time.monotonic() - self._startTime) * 1000
+        else:
+            self._position = int(self._capture.get(cv2.CAP_PROP_POS_FRAMES))
+            self._msec = self._capture.get(cv2.CAP_PROP_POS_MSEC)
+
+    def frameCount(self):
+        return 0 if self._live else int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    def isLive(self):
+        return self._live
+
+    def fps(self):
+        return self._capture.get(cv2.CAP_PROP_FPS)
+
+    def size(self):
+        return (int(self._capture.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self._capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def release(self):
+        self._capture.release()
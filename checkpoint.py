@@ -0,0 +1,33 @@
+import os
+import pickle
+
+class Checkpoint:
+    '''
+    將處理影片的進度存到檔案[path]：已處理到的幀的位置，以及偵測器、追蹤器、計數器等會影響之後結果的狀態。
+    從檢查點繼續處理時，移到該位置並載入這些狀態，最後的結果與不中斷處理相同。
+    '''
+    def __init__(self, path):
+        #檢查點檔案的路徑。
+        self._path = path
+
+    def exists(self):
+        return os.path.exists(self._path)
+
+    #將狀態[state]存到檢查點檔案。先寫到暫存檔再取代原檔，寫到一半中斷時不會破壞上一個檢查點。
+    def save(self, state):
+        tempPath = '{}.tmp'.format(self._path)
+        with open(tempPath, 'wb') as f:
+            pickle.dump(state, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tempPath, self._path)
+
+    #讀取檢查點檔案中的狀態，沒有檢查點時回傳None。
+    def load(self):
+        if not self.exists():
+            return None
+        with open(self._path, 'rb') as f:
+            return pickle.load(f)
+
+    #刪除檢查點檔案，處理完整部影片後不再需要。
+    def remove(self):
+        if self.exists():
+            os.remove(self._path)
@@ -0,0 +1,156 @@
+import json
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from frame_source import FrameSource
+from line_detector import LineDetector
+from runner import Runner
+
+class ChunkedRunner(Runner):
+    '''
+    將一部影片依照幀的範圍分成[nChunks]段，每段由一個行程分別偵測、追蹤與計數，最後合併每條鋼纜的斜紋數量、累積數量與平均斜率。
+    每段先從範圍開始前[overlap]幀開始處理，讓追蹤器與計數器在重疊的幀中先認得已存在的斜紋，重疊的幀中越過界線的斜紋歸前一段計數，因此每條斜紋只會被計數一次。
+    鋼纜移動方向與位置只在開始前判斷一次，再提供給每一段使用。[nThreads]為每個行程中偵測斜紋的執行緒數量，其餘設定與 Runner 相同，只能處理影片檔。
+    跨幀平滑（temporalSmoothing）的估計值取決於之前的每一幀，每段無法從範圍開始時的估計值開始處理，所以不支援。
+    '''
+    def __init__(self, inputFile, nChunks = None, overlap = 60, nThreads = None, **runnerOptions):
+        super().__init__(inputFile, headless = True, **runnerOptions)
+        if self._temporalSmoothing is not None:
+            raise Exception('Chunked processing does not support temporal smoothing.')
+        #分成幾段同時處理，預設為CPU核心數。
+        self._nChunks = nChunks if nChunks is not None else (os.cpu_count() or 1)
+        #每段開始前額外處理的幀數。
+        self._overlap = overlap
+        #每個行程中偵測斜紋的執行緒數量，預設將CPU核心平均分給每個行程。
+        self._nThreads = nThreads if nThreads is not None else max(1, (os.cpu_count() or 1) // self._nChunks)
+
+    #處理輸入為影片的情況。回傳每組的斜紋數量、每組的斜紋補償數量與處理過的幀數。
+    def _handleVideo(self):
+        if FrameSource.isStream(self._inputFile):
+            raise Exception('Chunked processing requires a video file.')
+        source = FrameSource.open(self._inputFile)
+        frameHeight = source.size()[1]
+        frameNumber = source.frameCount()
+        #判斷鋼纜移動方向時讀取過的幀。
+        bufferedFrames = []
+        upward = self._isUpward(source, bufferedFrames)
+        source.release()
+        borderY = int(round(0.35 * frameHeight))
+        #以與不分段處理時相同的斜紋偵測器偵測這些幀，得知鋼纜的位置。
+        detector = LineDetector(borderY, upward = upward, roiMode = self._roiMode, roiVerticalMargin = self._roiVerticalMargin, scale = self._detectionScale, refineMargin = self._refineMargin, ellipseFitting = self._ellipseFitting, temporalSmoothing = self._temporalSmoothing, reestimateInterval = self._reestimateInterval)
+        for frame, _, _, groupedEllipses in bufferedFrames:
+            detector.detect(frame, groupedEllipses)
+        lineRanges = [(int(round(0.35 * frameHeight)), int(round(0.55 * frameHeight))), (int(round(0.9 * frameHeight)), int(round(1.0 * frameHeight)))]
+        folder = self._resultFolder()
+        #每段的範圍 (開始前已讀過的幀數, 最後一幀的位置)。
+        bounds = np.linspace(0, frameNumber, min(self._nChunks, max(1, frameNumber)) + 1).round().astype(int)
+        options = {'roiMode': self._roiMode, 'roiVerticalMargin': self._roiVerticalMargin, 'adaptiveSampling': self._adaptiveSampling, 'predictiveTracking': self._predictiveTracking, 'detectionScale': self._detectionScale, 'refineMargin': self._refineMargin, 'ellipseFitting': self._ellipseFitting, 'temporalSmoothing': self._temporalSmoothing, 'reestimateInterval': self._reestimateInterval}
+        with ProcessPoolExecutor(max_workers = len(bounds) - 1) as executor:
+            #第一段從頭開始，與不分段處理相同，不需提供鋼纜位置。
+            futures = [executor.submit(_runChunk, self._inputFile, int(start), int(end), self._overlap, upward, borderY, lineRanges, None if i == 0 else detector.getState(), self._nThreads, '{}/chunk_{:03d}'.format(folder, i), options) for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))]
+            chunks = [future.result() for future in futures]
+        counts, compensateCounts, cumCounts, cumCompensateCounts, meanSlopes = self._merge([c for c in chunks if c['counts'] is not None])
+        nProcessedFrames = sum(c['nFrames'] for c in chunks)
+        with open('{}/counts.json'.format(folder), 'w', encoding = 'utf-8') as f:
+            json.dump({'counts': counts, 'compensateCounts': compensateCounts, 'nFrames': nProcessedFrames}, f, indent = 2)
+        if not self._countOnly:
+            #沒有視窗，圖表使用不需顯示的後端繪製。
+            import matplotlib
+            matplotlib.use('Agg')
+            from grapher import Grapher
+            grapher = Grapher()
+            grapher.plotCountsGraphAndTable(counts, compensateCounts, cumCounts, cumCompensateCounts, savePath = '{}/counts.png'.format(folder))
+            grapher.plotSlopesGraph(meanSlopes, savePath = '{}/slopes.png'.format(folder))
+        return (counts, compensateCounts, nProcessedFrames)
+
+    #依序合併每段的結果[chunks]：斜紋數量相加，累積數量加上前面各段的總數後接在一起，平均斜率依照幀的順序接在一起。
+    @staticmethod
+    def _merge(chunks):
+        if len(chunks) == 0:
+            raise Exception('No cable was detected in the video.')
+        if len({len(c['counts']) for c in chunks}) > 1:
+            raise Exception('Chunks detected different numbers of cables.')
+        counts = np.zeros(len(chunks[0]['counts']), dtype = np.int64)
+        compensateCounts = np.zeros(len(chunks[0]['counts']), dtype = np.int64)
+        cumCounts = []
+        cumCompensateCounts = []
+        for c in chunks:
+            cumCounts.append(c['cumCounts'] + counts)
+            cumCompensateCounts.append(c['cumCompensateCounts'] + compensateCounts)
+            counts += c['counts']
+            compensateCounts += c['compensateCounts']
+        meanSlopes = np.concatenate([c['meanSlopes'] for c in chunks], axis = 2)
+        return (counts.tolist(), compensateCounts.tolist(), np.vstack(cumCounts), np.vstack(cumCompensateCounts), meanSlopes)
+
+'''
+在行程中處理影片[inputFile]第[start] + 1幀到第[end]幀的範圍，並從範圍開始前[overlap]幀開始追蹤與計數。[detectorState]為 LineDetector.getState 回傳的鋼纜位置。
+只回傳範圍內的結果：斜紋數量與累積數量扣除重疊的幀中已計數的部分，斜紋表與平均斜率也只包含範圍內的幀。
+'''
+def _runChunk(inputFile, start, end, overlap, upward, borderY, lineRanges, detectorState, nThreads, folder, options):
+    from frame_pipeline import FramePipeline
+    from frame_sampler import FrameSampler
+    from line_counter import LineCounter
+    from line_store import LineStore
+    from line_tracker import LineTracker
+    from predictive_line_tracker import PredictiveLineTracker
+    from slope_aggregator import SlopeAggregator
+    source = FrameSource.open(inputFile)
+    source.seek(max(0, start - overlap))
+    detector = LineDetector(borderY, upward = upward, roiMode = options['roiMode'], roiVerticalMargin = options['roiVerticalMargin'], scale = options['detectionScale'], refineMargin = options['refineMargin'], ellipseFitting = options['ellipseFitting'], temporalSmoothing = options['temporalSmoothing'], reestimateInterval = options['reestimateInterval'])
+    if detectorState is not None:
+        detector.setState(detectorState)
+    tracker = None
+    counter = None
+    lineStore = LineStore('{}/lines'.format(folder))
+    slopeAggregator = None
+    sampler = FrameSampler() if options['adaptiveSampling'] else None
+    lastTrackedPosition = None
+    #重疊的幀處理完時的計數結果，範圍內的結果要扣除這些。
+    countsBefore, compensateCountsBefore, nCumBefore = (None, None, 0)
+    #範圍內處理過的幀數。
+    nProcessedFrames = 0
+    #分段處理時不需標記結果的畫面，讀取時就轉為灰階。跳幀時不會跳過範圍的最後一幀，也不會讀取範圍之後的幀。
+    with FramePipeline(source, detector, nWorkers = nThreads, sampler = sampler, grayscale = True, stopPosition = end) as pipeline:
+        for frame, framePosition, frameMsec, groupedEllipses in pipeline.frames():
+            inRange = framePosition > start
+            if inRange:
+                nProcessedFrames += 1
+            detectResult = detector.detect(frame, groupedEllipses)
+            if detectResult is not None:
+                groupedLines, _, _ = detectResult
+                if tracker is None:
+                    tracker = (PredictiveLineTracker if options['predictiveTracking'] else LineTracker)(len(groupedLines), borderY = borderY, upward = upward)
+                if counter is None:
+                    counter = LineCounter(len(groupedLines), borderY, upward = upward)
+                #重疊的幀只用來追蹤與計數，不寫入斜紋表。
+                if inRange:
+                    lineRows = lineStore.append(groupedLines)
+                    if slopeAggregator is None:
+                        slopeAggregator = SlopeAggregator(len(groupedLines), lineRanges)
+                    slopeAggregator.add(lineRows, lineStore.nFrames())
+                trackedFrames = framePosition - lastTrackedPosition if (sampler is not None or options['predictiveTracking']) and lastTrackedPosition is not None else 1
+                trackedLines = tracker.track(groupedLines, trackedFrames)
+                if sampler is not None and lastTrackedPosition is not None:
+                    sampler.update(tracker.getDisplacements(), trackedFrames, groupedLines)
+                lastTrackedPosition = framePosition
+                counts, cumCounts, compensateCounts, _ = counter.count(trackedLines)
+                if not inRange:
+                    countsBefore, compensateCountsBefore, nCumBefore = (list(counts), list(compensateCounts), len(cumCounts))
+            if framePosition >= end:
+                break
+    source.release()
+    lineStore.flush()
+    result = {'nFrames': nProcessedFrames, 'counts': None}
+    if counter is None or slopeAggregator is None:
+        return result
+    counts, cumCounts, compensateCounts, cumCompensateCounts = counter.results()
+    countsBefore = np.array(countsBefore if countsBefore is not None else [0] * len(counts))
+    compensateCountsBefore = np.array(compensateCountsBefore if compensateCountsBefore is not None else [0] * len(counts))
+    result.update(
+        counts = np.array(counts) - countsBefore,
+        compensateCounts = np.array(compensateCounts) - compensateCountsBefore,
+        cumCounts = cumCounts[nCumBefore:] - countsBefore,
+        cumCompensateCounts = cumCompensateCounts[nCumBefore:] - compensateCountsBefore,
+        meanSlopes = slopeAggregator.meanSlopes(),
+    )
+    return result
@@ -0,0 +1,65 @@
+import json
+from collections import Counter, deque
+import numpy as np
+
+class DetectorStats:
+    '''
+    收集 LineDetector 每一幀各處理階段的耗時（毫秒）、輪廓、橢圓與組的數量，以及該幀偵測結果被捨棄的原因。
+    最近[window]幀的資料用來計算摘要；[path]不為None時，每一幀的資料會依序以 JSON lines 格式寫入該檔案，[append]為是否接在該檔案原有的內容之後。
+    '''
+    def __init__(self, window = 1000, path = None, append = False):
+        #最近幾幀的資料。
+        self._records = deque(maxlen = window)
+        #已收集的幀數。
+        self._nFrames = 0
+        #每種被捨棄原因的幀數。
+        self._dropReasons = Counter()
+        #寫入每一幀資料的檔案。
+        self._file = open(path, 'a' if append else 'w', encoding = 'utf-8') if path is not None else None
+
+    #新的一幀的資料：各處理階段的耗時、各種數量與被捨棄的原因（未被捨棄時為None）。
+    @staticmethod
+    def newFrame():
+        return {'stages': {}, 'counts': {}, 'dropReason': None}
+
+    #收集一幀的資料[frameStats]。
+    def record(self, frameStats):
+        frameStats['index'] = self._nFrames
+        self._nFrames += 1
+        if frameStats['dropReason'] is not None:
+            self._dropReasons[frameStats['dropReason']] += 1
+        self._records.append(frameStats)
+        if self._file is not None:
+            self._file.write(json.dumps(frameStats) + '\n')
+
+    '''
+    回傳摘要：總幀數、被捨棄的幀數與原因，以及最近幾幀中每個處理階段耗時的平均值、50 與 95 百分位數和最大值（毫秒），與每種數量的平均值。
+    '''
+    def summary(self):
+        stages = {}
+        counts = {}
+        for record in self._records:
+            for stage, ms in record['stages'].items():
+                stages.setdefault(stage, []).append(ms)
+            for name, count in record['counts'].items():
+                counts.setdefault(name, []).append(count)
+        return {
+            'frames': self._nFrames,
+            'dropped': sum(self._dropReasons.values()),
+            'dropReasons': dict(self._dropReasons),
+            'window': len(self._records),
+            'stages': {stage: {'mean': float(np.mean(ms)), 'p50': float(np.percentile(ms, 50)), 'p95': float(np.percentile(ms, 95)), 'max': float(np.max(ms))} for stage, ms in stages.items()},
+            'counts': {name: float(np.mean(c)) for name, c in counts.items()},
+        }
+
+    #將最近幾幀的資料以 JSON lines 格式寫入[path]。
+    def exportJsonLines(self, path):
+        with open(path, 'w', encoding = 'utf-8') as f:
+            for record in self._records:
+                f.write(json.dumps(record) + '\n')
+
+    #關閉寫入每一幀資料的檔案。
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,193 @@
+import cv2
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class FramePipeline:
+    '''
+    從影格來源[source]（FrameSource）讀取畫面並以多個執行緒偵測斜紋。[sampler]不為None時，依照其決定的間隔跳過部分幀，被跳過的幀只會被 grab 而不會被解碼成影像。
+    跳幀的間隔由前一幀的追蹤結果決定，所以此時讀取影片的執行緒會等到前一幀回傳並處理完（下一次向 frames 取幀）才決定要跳過幾幀，一次只偵測一幀，跳過的幀與執行緒數量及 queueSize 無關。
+    [dropPolicy]為已讀取的幀已滿 queueSize 幀時的處理方式：'block' 等待偵測跟上，'drop-oldest' 捨棄最早讀取的幀，'drop-newest' 捨棄剛讀取的幀。
+    即時來源使用捨棄的方式可以讓延遲維持在 queueSize 幀內，但被捨棄的幀不會被偵測。
+    [grayscale]為是否在讀取時就將畫面轉為灰階，偵測時不需再轉換，暫存的幀也只佔三分之一的記憶體，但回傳的畫面也是灰階。
+    [stopPosition]不為None時，只讀取到該位置的幀為止，跳幀時也不會跳過該幀。
+    '''
+    def __init__(self, source, detector, nWorkers = None, queueSize = 32, sampler = None, dropPolicy = 'block', grayscale = False, stopPosition = None):
+        if dropPolicy not in ('block', 'drop-oldest', 'drop-newest'):
+            raise Exception('Unknown drop policy: {}.'.format(dropPolicy))
+        #影格來源。
+        self._source = source
+        #斜紋偵測器，以送出每一幀時的偵測狀態快照在多個執行緒中執行 findGroupedEllipses。
+        self._detector = detector
+        #偵測斜紋的執行緒數量。
+        self._nWorkers = nWorkers if nWorkers is not None else (os.cpu_count() or 1)
+        #已讀取但尚未偵測的幀，最多存放 queueSize 幀，避免讀取速度遠大於偵測速度時佔用過多記憶體。
+        self._frameQueue = queue.Queue(maxsize = queueSize)
+        #用來通知讀取影片的執行緒停止。
+        self._stopEvent = threading.Event()
+        self._decoder = None
+        self._executor = None
+        #正在偵測中的幀，依照幀的順序存放。
+        self._pending = deque()
+        #決定每隔幾幀偵測一次。
+        self._sampler = sampler
+        #已讀取的幀已滿時的處理方式。
+        self._dropPolicy = dropPolicy
+        #因偵測跟不上而被捨棄的幀數。
+        self._nDropped = 0
+        #是否在讀取時就將畫面轉為灰階。
+        self._grayscale = grayscale
+        #讀取到哪一幀為止，為None時讀到影片結束。
+        self._stopPosition = stopPosition
+        #是否已讀到 stopPosition。
+        self._reachedStop = False
+        #跳幀時，frames 每回傳並處理完一幀就通知讀取影片的執行緒依照更新後的間隔讀取下一幀。
+        self._nextRequested = threading.Semaphore(0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    '''
+    依序回傳影片的每一幀，先回傳已讀取過的[bufferedFrames]，再回傳讀取影片的執行緒讀到並經由多個執行緒偵測完的幀。
+    每一幀包含畫面、位置、時間與分組橢圓，回傳順序與影片中的順序相同，所以後續的追蹤與計數結果與逐幀處理相同。
+    偵測時使用送出該幀時的偵測狀態快照；回傳前若 detect 已改變狀態（例如重新找出要處理的區域），則以目前的狀態重新偵測該幀，結果與逐幀處理相同。
+    '''
+    def frames(self, bufferedFrames = ()):
+        for bufferedFrame in bufferedFrames:
+            yield bufferedFrame
+        self._decoder = threading.Thread(target = self._decode, daemon = True)
+        self._decoder.start()
+        self._executor = ThreadPoolExecutor(max_workers = self._nWorkers)
+        #讀取影片的執行緒是否已讀完。
+        decoded = False
+        #讓每個執行緒都有幀可以偵測，且多留一些幀避免執行緒閒置。跳幀時下一幀要等這一幀處理完才會讀取，一次只偵測一幀。
+        maxPending = 1 if self._sampler is not None else 2 * self._nWorkers
+        while True:
+            while not decoded and len(self._pending) < maxPending:
+                item = self._frameQueue.get()
+                if item is None or isinstance(item, Exception):
+                    decoded = True
+                    self._pending.append(item)
+                    break
+                frame, framePosition, frameMsec = item
+                detectionState = self._detector.detectionState()
+                self._pending.append((frame, framePosition, frameMsec, detectionState, self._executor.submit(self._detector.findGroupedEllipses, frame, detectionState)))
+            item = self._pending.popleft()
+            #影片已讀完或讀取異常。即時來源或有幀被捨棄時，無法得知是否已讀到最後一幀，直接結束。
+            if item is None:
+                if self._reachedStop or self._source.isLive() or self._nDropped > 0:
+                    return
+                raise Exception('Can not properly read video frame.')
+            if isinstance(item, Exception):
+                raise item
+            frame, framePosition, frameMsec, detectionState, future = item
+            groupedEllipses = future.result()
+            #送出該幀後偵測狀態已改變，以目前的狀態重新偵測。
+            if detectionState is not self._detector.detectionState():
+                groupedEllipses = self._detector.findGroupedEllipses(frame)
+            yield (frame, framePosition, frameMsec, groupedEllipses)
+            #這一幀已處理完，sampler 已依照其追蹤結果更新間隔。
+            if self._sampler is not None:
+                self._nextRequested.release()
+
+    #因偵測跟不上而被捨棄的幀數。
+    def droppedFrames(self):
+        return self._nDropped
+
+    #讀取影片的執行緒，將讀到的幀依序放入frameQueue，讀完或讀取異常時放入None。
+    def _decode(self):
+        #最後一幀的位置（影片幀數或 stopPosition），跳幀時用來確保這一幀一定會被讀取，為0時未知。
+        lastPosition = self._source.frameCount()
+        if self._stopPosition is not None:
+            lastPosition = min(lastPosition, self._stopPosition) if lastPosition > 0 else self._stopPosition
+        try:
+            #是否為讀取的第一幀。之前回傳的幀（bufferedFrames）在此執行緒開始前都已處理完。
+            first = True
+            while not self._stopEvent.is_set():
+                #跳過不需偵測的幀。間隔要等上一幀處理完才能決定。
+                if self._sampler is not None:
+                    if not first and not self._waitNextRequested():
+                        break
+                    if not self._skip(self._sampler.step() - 1, lastPosition):
+                        break
+                first = False
+                #讀取該幀。
+                ret, frame = self._source.read()
+                #如果該幀讀取異常，則終止讀取。
+                if not ret:
+                    break
+                if self._grayscale:
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                self._putFrame((frame, self._source.position(), self._source.msec()))
+                #已讀到 stopPosition，不再讀取之後的幀。
+                if self._stopPosition is not None and self._source.position() >= self._stopPosition:
+                    self._reachedStop = True
+                    break
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(None)
+
+    #等待 frames 處理完上一幀，若已被通知停止則回傳False。
+    def _waitNextRequested(self):
+        while not self._stopEvent.is_set():
+            if self._nextRequested.acquire(timeout = 0.1):
+                return True
+        return False
+
+    #跳過接下來的[nSkip]幀，但不跳過位置為[lastPosition]的最後一幀。跳過時讀取異常則回傳False。
+    def _skip(self, nSkip, lastPosition):
+        if lastPosition > 0:
+            nSkip = min(nSkip, lastPosition - self._source.position() - 1)
+        for _ in range(nSkip):
+            if not self._source.grab():
+                return False
+        return True
+
+    #依照 dropPolicy 將讀到的幀[item]放入frameQueue。
+    def _putFrame(self, item):
+        if self._dropPolicy == 'block':
+            self._put(item)
+            return
+        while True:
+            try:
+                self._frameQueue.put_nowait(item)
+                return
+            except queue.Full:
+                pass
+            self._nDropped += 1
+            if self._dropPolicy == 'drop-newest':
+                return
+            #捨棄最早讀取的幀後再放入，期間若偵測已取走一幀則不需捨棄。
+            try:
+                self._frameQueue.get_nowait()
+            except queue.Empty:
+                self._nDropped -= 1
+
+    #將[item]放入frameQueue，若已被通知停止則放棄。
+    def _put(self, item):
+        while not self._stopEvent.is_set():
+            try:
+                self._frameQueue.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                continue
+
+    #停止讀取影片與偵測斜紋，結束後才能釋放影格來源。
+    def close(self):
+        self._stopEvent.set()
+        if self._decoder is not None:
+            self._decoder.join()
+            self._decoder = None
+        if self._executor is not None:
+            for item in self._pending:
+                if isinstance(item, tuple):
+                    item[4].cancel()
+            self._executor.shutdown(wait = True)
+            self._executor = None
+        self._pending.clear()
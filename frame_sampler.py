@@ -0,0 +1,47 @@
+from collections import deque
+import numpy as np
+from utils import Utils
+
+class FrameSampler:
+    '''
+    依照斜紋移動的速度決定每隔幾幀偵測一次，讓斜紋在兩次偵測之間移動的距離不超過相鄰斜紋間距中位數的[safeFraction]倍，追蹤器才不會將斜紋對應錯。
+    [maxStep]為最多每隔幾幀偵測一次，[window]為估計速度時參考最近幾次的量測結果。
+    '''
+    def __init__(self, safeFraction = 0.15, maxStep = 3, window = 10):
+        #斜紋在兩次偵測之間最多能移動相鄰斜紋間距中位數的幾倍。
+        self._safeFraction = safeFraction
+        #最多每隔幾幀偵測一次。
+        self._maxStep = maxStep
+        #最近幾次量測到的斜紋速度（像素/幀）。
+        self._velocities = deque(maxlen = window)
+        #目前每隔幾幀偵測一次。
+        self._step = 1
+
+    #目前每隔幾幀偵測一次。
+    def step(self):
+        return self._step
+
+    '''
+    透過追蹤器量測到的斜紋位移[displacements]、這次與上次追蹤之間相隔的幀數[frameInterval]以及這一幀的斜紋[groupedLines]更新每隔幾幀偵測一次。
+    沒有量測結果時改回每幀偵測；間隔變大時一次最多只加一幀，變小時則立即生效。
+    '''
+    def update(self, displacements, frameInterval, groupedLines):
+        medianGap = self._medianGap(groupedLines)
+        if len(displacements) == 0 or frameInterval <= 0 or not np.isfinite(medianGap):
+            self._velocities.clear()
+            self._step = 1
+            return self._step
+        #所有斜紋隨鋼纜一起移動，使用位移的中位數估計速度，避免個別斜紋偵測誤差的影響。
+        self._velocities.append(np.median(displacements) / frameInterval)
+        maxVelocity = max(self._velocities)
+        targetStep = self._maxStep if maxVelocity <= 0 else int(self._safeFraction * medianGap / maxVelocity)
+        targetStep = max(1, min(self._maxStep, targetStep))
+        self._step = targetStep if targetStep < self._step else min(targetStep, self._step + 1)
+        return self._step
+
+    #每條鋼纜上相鄰斜紋中心點Y座標間距的中位數。
+    def _medianGap(self, groupedLines):
+        gaps = [np.diff(np.sort([Utils.getLineCentroid(l)[1] for l in lines])) for lines in groupedLines if len(lines) > 1]
+        gaps = np.concatenate(gaps) if len(gaps) > 0 else np.array([])
+        gaps = gaps[gaps > 0]
+        return np.median(gaps) if len(gaps) > 0 else np.nan
@@ -0,0 +1,75 @@
+import os
+
+class FrameSource:
+    '''
+    影格來源的共同介面。read 依序讀取下一幀並回傳 (是否成功, 畫面)，grab 跳過下一幀；position 為目前已讀過的幀數，msec 為最後讀取的幀的時間（毫秒）。
+    frameCount 為總幀數，未知時（例如攝影機）為0。isLive 為是否為即時來源，即時來源在偵測跟不上時可以捨棄部分幀，讀完時也不視為異常。
+    '''
+    def __init__(self):
+        #已讀過的幀數。
+        self._position = 0
+        #最後讀取的幀的時間（毫秒）。
+        self._msec = 0.0
+
+    '''
+    依照[inputFile]開啟影格來源：'-'為由標準輸入傳入的原始BGR畫面（需指定畫面大小[frameSize]）、數字為攝影機編號、資料夾為依檔名排序的圖片序列，其餘為影片檔。
+    [fps]為圖片序列與標準輸入每秒的幀數，用來計算每幀的時間；標準輸入未指定時使用讀取當下的時間。
+    '''
+    @staticmethod
+    def open(inputFile, frameSize = None, fps = None):
+        from capture_source import CaptureSource
+        from image_directory_source import ImageDirectorySource
+        from stdin_source import StdinSource
+        if inputFile == '-':
+            return StdinSource(frameSize, fps = fps)
+        if inputFile.isdigit():
+            return CaptureSource(int(inputFile), live = True)
+        if FrameSource.isStream(inputFile):
+            return ImageDirectorySource(inputFile, fps = fps)
+        return CaptureSource(inputFile)
+
+    #[inputFile]是否為影片檔以外的連續影格來源（標準輸入、攝影機或圖片序列）。只有圖片而沒有影片的資料夾才視為圖片序列。
+    @staticmethod
+    def isStream(inputFile):
+        if inputFile == '-' or inputFile.isdigit():
+            return True
+        if not os.path.isdir(inputFile):
+            return False
+        import mimetypes
+        fileTypes = {(mimetypes.guess_type(name)[0] or '').split('/')[0] for name in os.listdir(inputFile)}
+        return 'image' in fileTypes and 'video' not in fileTypes
+
+    def read(self):
+        raise NotImplementedError
+
+    #跳過下一幀，預設為讀取後捨棄。
+    def grab(self):
+        ret, _ = self.read()
+        return ret
+
+    #移到已讀過[position]幀的位置，下一次讀取的是第[position] + 1幀。只有影片檔與圖片序列可以移動。
+    def seek(self, position):
+        raise Exception('Can not seek in this frame source.')
+
+    def position(self):
+        return self._position
+
+    def msec(self):
+        return self._msec
+
+    def frameCount(self):
+        return 0
+
+    def isLive(self):
+        return False
+
+    #每秒的幀數，未知時為0。
+    def fps(self):
+        return 0.0
+
+    #畫面的寬與高。
+    def size(self):
+        raise NotImplementedError
+
+    def release(self):
+        pass
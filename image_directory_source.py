@@ -0,0 +1,56 @@
+import cv2
+import mimetypes
+import os
+from frame_source import FrameSource
+
+class ImageDirectorySource(FrameSource):
+    #依檔名順序讀取資料夾[folder]中的圖片，每幀的時間以每秒[fps]幀計算。
+    def __init__(self, folder, fps = None):
+        super().__init__()
+        #依檔名排序的圖片路徑。
+        self._files = [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if (mimetypes.guess_type(name)[0] or '').split('/')[0] == 'image']
+        if len(self._files) == 0:
+            raise Exception('No image found in directory: {}.'.format(folder))
+        #每秒的幀數。
+        self._fps = fps if fps is not None else 30.0
+        #畫面的寬與高，由第一張圖片得知。
+        firstImage = cv2.imread(self._files[0])
+        if firstImage is None:
+            raise Exception('Can not read image: {}.'.format(self._files[0]))
+        self._size = (firstImage.shape[1], firstImage.shape[0])
+
+    def read(self):
+        if self._position >= len(self._files):
+            return (False, None)
+        frame = cv2.imread(self._files[self._position])
+        if frame is None:
+            return (False, None)
+        self._advance()
+        return (True, frame)
+
+    #跳過下一張圖片，不讀取其內容。
+    def grab(self):
+        if self._position >= len(self._files):
+            return False
+        self._advance()
+        return True
+
+    def seek(self, position):
+        if position > len(self._files):
+            raise Exception('Can not seek to frame {}.'.format(position))
+        self._position = position
+        self._msec = max(0, position - 1) * 1000 / self._fps
+
+    #移到下一張圖片並更新其時間。
+    def _advance(self):
+        self._msec = self._position * 1000 / self._fps
+        self._position += 1
+
+    def fps(self):
+        return self._fps
+
+    def frameCount(self):
+        return len(self._files)
+
+    def size(self):
+        return self._size
@@ -1,7 +1,8 @@
-from utils import Utils
+import numpy as np
 
 class LineCounter:
-    def __init__(self, nGroup, borderY, upward = True):
+    #[initialCapacity]為累積數量一開始預留的列數，不足時會自動加倍。
+    def __init__(self, nGroup, borderY, upward = True, initialCapacity = 1024):
         #鋼纜數量。
         self._nGroup = nGroup
         #界線的位置。
@@ -10,32 +11,70 @@ class LineCounter:
         self._upward = upward
         #每組的斜紋數量。
         self._counts = [0] * self._nGroup
-        #每組的累積斜紋數量。
-        self._cumCounts = []
+        #每組的累積斜紋數量，每計數一條斜紋新增一列。
+        self._cumCounts = np.zeros((initialCapacity, self._nGroup), dtype = np.int64)
         #每組的斜紋補償數量。
         self._compensateCounts = [0] * self._nGroup
-        #每組的累積斜紋補償數量。
-        self._cumCompensateCounts = []
-        #存放已辨識過的斜紋的Id。
-        self._examinedLines = []
-    
+        #每組的累積斜紋補償數量，每計數一條斜紋新增一列。
+        self._cumCompensateCounts = np.zeros((initialCapacity, self._nGroup), dtype = np.int64)
+        #累積數量已使用的列數。
+        self._nCum = 0
+        #每組已辨識過且仍被追蹤中的斜紋的Id。追蹤器不會重複使用Id，所以斜紋不再被追蹤後即可移除，避免隨影片長度增加。
+        self._examinedIds = [set() for i in range(0, self._nGroup)]
+        #上一次計數時越過界線的斜紋 (第幾組, 斜紋Id, 是否為補的斜紋)。
+        self._crossings = []
+
     def count(self, groupedLines):
+        self._crossings = []
         for index, group in enumerate(groupedLines):
-            for lineId, line in group.items():
-                #用來在所有斜紋間區別的Id。
-                newId = '{}-{}'.format(index+1, lineId)
-                #如果該斜紋的中心超過界線且該斜紋不在examinedLines中，則需更新計數。
-                if ((self._upward and Utils.getLineCentroid(line)[1] < self._borderY) or (not self._upward and Utils.getLineCentroid(line)[1] > self._borderY)) and newId not in self._examinedLines:
-                    #該組斜紋數量加一。
-                    self._counts[index] += 1
-                    #新增目前的累積斜紋數量。
-                    self._cumCounts.append(self._counts.copy())
-                    #該斜紋是補的。
-                    if len(line) == 3:
-                        #該組斜紋補償數量加一。
-                        self._compensateCounts[index] += 1
-                    #新增目前的累積補償斜紋數量。
-                    self._cumCompensateCounts.append(self._compensateCounts.copy())
-                    #將該斜紋的Id加入examinedLines，避免重複辨識。
-                    self._examinedLines.append(newId)
-        return (self._counts, self._cumCounts, self._compensateCounts, self._cumCompensateCounts)
+            examinedIds = self._examinedIds[index]
+            #移除已不再被追蹤的斜紋的Id。
+            examinedIds.intersection_update(group.keys())
+            if len(group) == 0:
+                continue
+            lineIds = list(group.keys())
+            lines = list(group.values())
+            #一次計算該組所有斜紋中心點的Y座標，並判斷是否超過界線。
+            centroidYs = np.rint(np.array([line[0][1] + line[1][1] for line in lines]) / 2)
+            crossed = centroidYs < self._borderY if self._upward else centroidYs > self._borderY
+            for i in np.flatnonzero(crossed):
+                #如果該斜紋的中心超過界線且該斜紋尚未被辨識過，則需更新計數。
+                if lineIds[i] in examinedIds:
+                    continue
+                #該組斜紋數量加一。
+                self._counts[index] += 1
+                #該斜紋是補的。
+                if len(lines[i]) == 3:
+                    #該組斜紋補償數量加一。
+                    self._compensateCounts[index] += 1
+                #新增目前的累積斜紋數量與累積補償斜紋數量。
+                self._appendCumCounts()
+                #將該斜紋的Id加入examinedIds，避免重複辨識。
+                examinedIds.add(lineIds[i])
+                self._crossings.append((index, int(lineIds[i]), len(lines[i]) == 3))
+        return self.results()
+
+    #上一次計數時越過界線的斜紋，每個為 (第幾組, 斜紋Id, 是否為補的斜紋)。
+    def crossings(self):
+        return self._crossings
+
+    #目前每組的斜紋數量、每組的累積斜紋數量、每組的斜紋補償數量、每組的累積斜紋補償數量。
+    def results(self):
+        return (self._counts, self._cumCounts[:self._nCum], self._compensateCounts, self._cumCompensateCounts[:self._nCum])
+
+    #存成檢查點時只保留已使用的累積數量，載入後容量不足時會再加倍。
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_cumCounts'] = self._cumCounts[:self._nCum].copy()
+        state['_cumCompensateCounts'] = self._cumCompensateCounts[:self._nCum].copy()
+        return state
+
+    #將目前的斜紋數量與補償數量新增到累積數量的最後一列，容量不足時加倍。
+    def _appendCumCounts(self):
+        if self._nCum == len(self._cumCounts):
+            capacity = max(1, 2 * len(self._cumCounts))
+            self._cumCounts = np.resize(self._cumCounts, (capacity, self._nGroup))
+            self._cumCompensateCounts = np.resize(self._cumCompensateCounts, (capacity, self._nGroup))
+        self._cumCounts[self._nCum] = self._counts
+        self._cumCompensateCounts[self._nCum] = self._compensateCounts
+        self._nCum += 1
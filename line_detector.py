@@ -1,8 +1,46 @@
+import bisect
+import copy
 import cv2
+import time
 import numpy as np
+from detector_stats import DetectorStats
+from preprocessor import Preprocessor
+from robust_stats import RobustStats, RunningRobustStats, SmoothedRobustStats
+
+#橢圓表的欄位。每一列代表一個橢圓，包含其中心點、短軸與長軸長度、傾斜角度、面積、長軸起點與終點、斜紋斜率與角度，以及是否為補的斜紋。
+ELLIPSE_DTYPE = np.dtype([
+    ('centerX', np.float64),
+    ('centerY', np.float64),
+    ('minorAxis', np.float64),
+    ('majorAxis', np.float64),
+    ('angle', np.float64),
+    ('area', np.float64),
+    ('startX', np.int64),
+    ('startY', np.int64),
+    ('endX', np.int64),
+    ('endY', np.int64),
+    ('slope', np.float64),
+    ('lineAngle', np.float64),
+    ('compensated', np.bool_),
+])
 
 class LineDetector:
-    def __init__(self, borderY = None, isVideo = True, upward = True):
+    '''
+    [roiMode]為None時處理整張影像；為'union'時只處理涵蓋所有鋼纜的區域；為'lanes'時分別處理每條鋼纜所在的區域。鋼纜的位置由第一次正常偵測的結果得知。
+    [roiMargin]為鋼纜左右兩側額外保留的寬度。[roiVerticalMargin]不為None時，只處理界線上下[roiVerticalMargin]像素內的區域，需大於補斜紋使用的100像素。
+    此時區域上下各多留一個斜紋的高度並移除被區域切斷的斜紋，移除離群橢圓與補斜紋則使用找出區域那一幀整張影像的中位數與 MAD，計數才不會因範圍內的橢圓較少而偏差。
+    得知鋼纜位置後，每一幀的橢圓直接依照中心點X座標分到所在的鋼纜；落在鋼纜範圍內的橢圓比例低於[minLaneConfidence]時，才重新排序並分組。
+    [stats]不為None時，將每一幀各處理階段的耗時、數量與被捨棄的原因收集到該 DetectorStats。
+    [scale]不為1時，將影像縮放為該比例再找出輪廓與橢圓，橢圓再換回原始影像中的座標與大小，所以之後的處理與回傳的斜紋都與原始解析度相同。
+    [refineMargin]不為None時，界線上下[refineMargin]像素內的橢圓改以原始解析度偵測，讓計數依據的斜紋位置維持原本的精確度。
+    [ellipseFitting]為'contour'時，對邊緣檢測後的每一個輪廓適配橢圓；為'moments'時，直接以二值化影像中每個區塊的二階矩一次估計所有橢圓，雜訊多、輪廓數量多時較快。
+    以區塊估計的橢圓涵蓋整個斜紋而不是其輪廓，長軸會比適配輪廓的結果略短。
+    [temporalSmoothing]不為None時，移除離群橢圓、合併破碎橢圓與補斜紋使用的中位數與 MAD（面積、角度、斜率與間距）改為跨幀平滑的估計值，每幀微調的幅度為該值，每[reestimateInterval]幀重新計算一次，詳見 SmoothedRobustStats。合併破碎橢圓時斜率的上下界在一幀中固定，不會加入中心相連的直線的斜率。
+    此時 findGroupedEllipses 只移除面積過小的橢圓，面積與角度的離群值在 detect 中依序移除，因此 findGroupedEllipses 仍與狀態無關。
+    '''
+    def __init__(self, borderY = None, isVideo = True, upward = True, roiMode = None, roiMargin = 20, roiVerticalMargin = None, minLaneConfidence = 0.9, stats = None, scale = 1.0, refineMargin = None, ellipseFitting = 'contour', temporalSmoothing = None, reestimateInterval = 30):
+        if ellipseFitting not in ('contour', 'moments'):
+            raise Exception('Unknown ellipse fitting method: {}.'.format(ellipseFitting))
         #界線的位置。
         self._borderY = borderY
         #是否在偵測影片中的Frame，還是單純偵測一張圖片。
@@ -11,298 +49,588 @@ class LineDetector:
         self._upward = upward
         #用來儲存每條鋼纜上所有斜紋的平均中心點X座標。
         self._groupMeanCenterXs = []
-    
-    #偵測傳入的原始影像[frame]的斜紋。
-    def detect(self, frame):
+        #只處理鋼纜所在區域的模式。
+        self._roiMode = roiMode
+        #鋼纜左右兩側額外保留的寬度。
+        self._roiMargin = roiMargin
+        #界線上下要處理的範圍。
+        self._roiVerticalMargin = roiVerticalMargin
+        #要處理的區域 (x0, y0, x1, y1)，為None時處理整張影像。
+        self._regions = None
+        #每條鋼纜的左右範圍 (lefts, rights)，由左到右排列，為None時尚未得知鋼纜位置。
+        self._lanes = None
+        #只處理界線上下的範圍時，以找出區域那一幀的整張影像計算的參考中位數與 MAD：所有橢圓的面積與角度，以及每組的間距。為None時每幀以處理的區域重新計算。
+        self._referenceStats = None
+        #findGroupedEllipses 使用的偵測狀態（要處理的區域、鋼纜範圍與參考中位數與 MAD）的快照，只在其改變時換成新的物件，用來判斷在其他執行緒偵測的結果是否仍適用。
+        self._detectionState = (None, None, None)
+        #落在鋼纜範圍內的橢圓比例至少要有多少，才直接依照鋼纜位置分組。
+        self._minLaneConfidence = minLaneConfidence
+        #收集每一幀統計資料的 DetectorStats，為None時不收集。
+        self._stats = stats
+        #偵測時影像縮放的比例。
+        self._scale = scale
+        #界線上下以原始解析度偵測的範圍。
+        self._refineMargin = refineMargin
+        #影像預處理，重複使用每個執行緒預先配置好的緩衝區。
+        self._preprocessor = Preprocessor(scale = scale)
+        #界線附近以原始解析度偵測時使用的影像預處理。
+        self._refinePreprocessor = Preprocessor() if scale != 1.0 and refineMargin is not None else None
+        #估計橢圓的方式。
+        self._ellipseFitting = ellipseFitting
+        #每幀微調平滑估計值的幅度與每幾幀重新計算一次。
+        self._temporalSmoothing = temporalSmoothing
+        self._reestimateInterval = reestimateInterval
+        #跨幀平滑的中位數與 MAD：所有橢圓的面積與角度，以及每組的斜率與間距。為None時每幀重新計算。
+        self._smoothedStats = {'area': self._newSmoothedStats(), 'angle': self._newSmoothedStats(), 'slopes': [], 'gaps': []} if temporalSmoothing is not None else None
+
+    #與鋼纜位置有關、會影響之後每一幀偵測結果的狀態，用來存成檢查點。
+    def getState(self):
+        return {'groupMeanCenterXs': list(self._groupMeanCenterXs), 'regions': self._regions, 'referenceStats': self._referenceStats, 'lanes': self._lanes, 'smoothedStats': copy.deepcopy(self._smoothedStats)}
+
+    #載入 getState 回傳的狀態[state]。
+    def setState(self, state):
+        self._groupMeanCenterXs = list(state['groupMeanCenterXs'])
+        self._setRegions(state['regions'], state.get('referenceStats'))
+        self._setLanes(state['lanes'])
+        self._smoothedStats = copy.deepcopy(state['smoothedStats'])
+
+    #偵測傳入的原始影像[frame]的斜紋。若已有該幀的分組橢圓[groupedEllipses]（例如判斷鋼纜移動方向時已偵測過），則直接使用而不重新偵測。
+    def detect(self, frame, groupedEllipses = None):
         self._frame = frame
-        #將原始圖片進行預處理。
-        preprocessImg = self._preprocess(self._frame)
-        #使用Canny邊緣檢測找出斜紋的邊緣。
-        canny = cv2.Canny(preprocessImg, 100, 100, apertureSize = 3)
-        #找出圖片中的輪廓並對每一個輪廓都適配（Fit）一個橢圓。 
-        fittedEllipses = self._findContourAndFitEllipse(canny)
-        #移除屬於離群值的橢圓（面積異常小或大、角度異常小或大）。
-        fittedEllipses = self._removeOutliersEllipses(fittedEllipses, lowerFactor = 2.0, upperFactor = 3.0)
-        #找出橢圓長軸(以兩個端點表示)，用來表示鋼纜上的斜紋。
-        fittedEllipses = self._findEllipseMajorAxes(fittedEllipses)
-        #將橢圓照著長軸起點的X座標由小到大（圖片中由左到右）排序。
-        fittedEllipses = sorted(fittedEllipses, key = lambda fe: fe['majorAxe']['startPoint'][0])
-        #將橢圓分組，正常情況下鋼纜有幾條橢圓就有幾組。
-        groupedFittedEllipses = self._groupEllipses(fittedEllipses)
-        #如果分出來的組數異常，則不做後續處理，直接回傳None。
+        if groupedEllipses is None:
+            groupedEllipses = self.findGroupedEllipses(frame)
+        #該幀的統計資料，包含 findGroupedEllipses 中各階段的耗時。分組橢圓由沒有收集統計資料的偵測器產生時，只包含之後的階段。
+        frameStats = None
+        if self._stats is not None:
+            frameStats = getattr(groupedEllipses, 'stats', None) or DetectorStats.newFrame()
+        lap = time.perf_counter()
+        groupedFittedEllipses = list(groupedEllipses)
+        #以跨幀平滑的上下界移除面積與角度的離群值。更新後的估計值在該幀通過組數檢查後才存回。
+        smoothedUpdates = None
+        if self._smoothedStats is not None:
+            groupedFittedEllipses, smoothedUpdates = self._removeSmoothedOutliersEllipses(groupedFittedEllipses, lowerFactor = 2.0, upperFactor = 3.0)
+            lap = self._lap(frameStats, 'removeOutliersEllipses', lap)
+        #如果分出來的組數異常，則不做後續處理，直接回傳None。若只處理部分區域，則下一幀改回處理整張影像，重新找出鋼纜的位置。
         if len(groupedFittedEllipses) != len(self._groupMeanCenterXs) and len(self._groupMeanCenterXs) > 0:
+            self._setRegions(None)
+            if frameStats is not None:
+                frameStats['counts']['expectedGroups'] = len(self._groupMeanCenterXs)
+                frameStats['dropReason'] = 'noGroups' if len(groupedFittedEllipses) == 0 else 'groupCountMismatch'
+                self._stats.record(frameStats)
             return None
-        #使用分好組的橢圓來獲得代表斜紋的直線，與該線的斜率與角度。
-        self._lines, self._slopes, self._angles = self._computeSlopeAndAngle(groupedFittedEllipses)
-        #如果鋼纜移動方向為向上。
-        if self._upward:
-            #將每組橢圓照著長軸起點旋轉後的Y座標由小到大（圖片中由上到下）排序。
-            for i in range(0, len(groupedFittedEllipses)):
-                sortResult = sorted(zip(groupedFittedEllipses[i], self._lines[i], self._slopes[i], self._angles[i]), key = lambda x: self._rotatePointAroundImageCenter(x[0]['majorAxe']['startPoint'], np.mean(self._angles[i]))[1])
-                groupedFittedEllipses[i] = [x[0] for x in sortResult]
-                self._lines[i] = [x[1] for x in sortResult]
-                self._slopes[i] = [x[2] for x in sortResult]
-                self._angles[i] = [x[3] for x in sortResult]
-        #如果鋼纜移動方向為向下。
-        else:
-            #將每組橢圓照著長軸起點旋轉後的Y座標由大到小（圖片中由下到上）排序。
-            for i in range(0, len(groupedFittedEllipses)):
-                sortResult = sorted(zip(groupedFittedEllipses[i], self._lines[i], self._slopes[i], self._angles[i]), key = lambda x: self._rotatePointAroundImageCenter(x[0]['majorAxe']['startPoint'], np.mean(self._angles[i]))[1], reverse = True)
-                groupedFittedEllipses[i] = [x[0] for x in sortResult]
-                self._lines[i] = [x[1] for x in sortResult]
-                self._slopes[i] = [x[2] for x in sortResult]
-                self._angles[i] = [x[3] for x in sortResult]
+        if smoothedUpdates is not None:
+            self._smoothedStats.update(smoothedUpdates)
+        #透過第一次正常偵測到的斜紋位置得知每條鋼纜的左右範圍，之後的幀直接依照鋼纜位置分組。
+        if self._lanes is None and len(groupedFittedEllipses) > 0:
+            self._setLanes(self._findLanes(groupedFittedEllipses))
+        #將每組橢圓照著長軸起點旋轉後的Y座標排序。鋼纜為上行時由小到大（圖片中由上到下），鋼纜為下行時由大到小（圖片中由下到上）。
+        for i, group in enumerate(groupedFittedEllipses):
+            _, rotatedYs = self._rotatePointsAroundImageCenter(group['startX'], group['startY'], np.mean(group['lineAngle']))
+            groupedFittedEllipses[i] = group[np.argsort(rotatedYs if self._upward else -rotatedYs, kind = 'stable')]
+        lap = self._lap(frameStats, 'sortGroups', lap)
         #將代表同一個斜紋的破碎橢圓接在一起。
         groupedFittedEllipses = self._combineSmallEllipses(groupedFittedEllipses)
+        lap = self._lap(frameStats, 'combineSmallEllipses', lap)
+        #透過斜紋的位置得知之後要處理的區域。
+        if self._roiMode is not None and self._regions is None and len(groupedFittedEllipses) > 0:
+            self._setRegions(*self._findRegions(frame, groupedFittedEllipses))
         if self._isVideo:
             #平移所有橢圓，使同組的橢圓有相同的中心點X座標（這樣計數器在判別斜紋時會更精確）。
             groupedFittedEllipses = self._translateEllipses(groupedFittedEllipses)
+            lap = self._lap(frameStats, 'translateEllipses', lap)
             #補齊因光線、陰影等外部條件而沒有被辨識到的斜紋。只有界線之前的斜紋才需要補，因為過了界線有沒有補都不影響計數。
             groupedFittedEllipses = self._compensate(groupedFittedEllipses)
+            lap = self._lap(frameStats, 'compensate', lap)
+        #將橢圓表轉為斜紋、斜率與角度，提供給追蹤器與計數器使用。
+        self._lines, self._slopes, self._angles = self._toLinesSlopesAndAngles(groupedFittedEllipses)
+        if frameStats is not None:
+            self._lap(frameStats, 'toLines', lap)
+            frameStats['counts']['lines'] = sum(len(lines) for lines in self._lines)
+            self._stats.record(frameStats)
         return (self._lines, self._slopes, self._angles)
-    
-    #將原始影像[frame]進行預處理。
-    def _preprocess(self, frame):
-        #將原始圖片轉為灰階，以進行後續處理。
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        #使用高斯模糊消除圖片中的雜訊，避免其干擾後續辨識。
-        blur = cv2.GaussianBlur(gray, (5,5), 0)
-        #將圖片進行二值化，突顯出要辨識的斜紋。
-        _, threshold = cv2.threshold(blur, 90, 255, cv2.THRESH_BINARY)
-        #使用 Morphological Transformations 清楚分開每條斜紋。 
-        kernel = np.ones((3,3), np.uint8)
-        morph = cv2.morphologyEx(threshold, cv2.MORPH_OPEN, kernel)
-        return morph
-    
-    #找出影像[frame]中的輪廓並對每一個輪廓都適配（Fit）一個橢圓。
-    def _findContourAndFitEllipse(self, frame):
-        #找出圖片中的輪廓。 
+
+    '''
+    找出原始影像[frame]中代表斜紋的橢圓並分組，且計算斜紋的斜率與角度。這部分與界線位置及鋼纜移動方向無關，可在不同的偵測器間重複使用。
+    [detectionState]為 detectionState 回傳的快照，為None時使用目前的狀態。在其他執行緒中執行時，需傳入送出該幀時的快照，避免 detect 同時改變狀態。
+    '''
+    def findGroupedEllipses(self, frame, detectionState = None):
+        #該幀的統計資料，未收集時為None。此函式可能在多個執行緒中同時執行，所以統計資料隨回傳結果傳給 detect。
+        frameStats = DetectorStats.newFrame() if self._stats is not None else None
+        regions, lanes, referenceStats = detectionState if detectionState is not None else self._detectionState
+        #要處理的區域，尚未得知鋼纜位置時為整張影像。
+        regions = regions if regions is not None else [(0, 0, frame.shape[1], frame.shape[0])]
+        #找出每個區域中的輪廓並對每一個輪廓都適配（Fit）一個橢圓。
+        fittedEllipses = np.concatenate([self._findEllipsesInRegion(frame, region, frameStats) for region in regions])
+        lap = time.perf_counter()
+        #移除屬於離群值的橢圓（面積異常小或大、角度異常小或大）。
+        nFitted = len(fittedEllipses)
+        fittedEllipses = self._removeOutliersEllipses(fittedEllipses, lowerFactor = 2.0, upperFactor = 3.0, smoothed = self._smoothedStats is not None, referenceStats = referenceStats)
+        lap = self._lap(frameStats, 'removeOutliersEllipses', lap)
+        #縮放偵測時，界線附近改用以原始解析度偵測的橢圓。
+        if self._refinePreprocessor is not None and self._borderY is not None:
+            fittedEllipses, nRefined = self._refineNearBorder(frame, regions, fittedEllipses, frameStats)
+            nFitted += nRefined
+            lap = time.perf_counter()
+        #找出橢圓長軸(以兩個端點表示)，用來表示鋼纜上的斜紋。
+        fittedEllipses = self._findEllipseMajorAxes(fittedEllipses)
+        lap = self._lap(frameStats, 'findEllipseMajorAxes', lap)
+        #已得知鋼纜位置時，直接將橢圓分到所在的鋼纜。
+        groupedFittedEllipses = self._assignEllipsesToLanes(fittedEllipses, lanes) if lanes is not None else None
+        laneFastPath = groupedFittedEllipses is not None
+        #尚未得知鋼纜位置或無法可靠地分到鋼纜時，重新排序並分組。
+        if groupedFittedEllipses is None:
+            #將橢圓照著長軸起點的X座標由小到大（圖片中由左到右）排序。
+            fittedEllipses = fittedEllipses[np.argsort(fittedEllipses['startX'], kind = 'stable')]
+            #將橢圓分組，正常情況下鋼纜有幾條橢圓就有幾組。
+            groupedFittedEllipses = self._groupEllipses(fittedEllipses)
+        lap = self._lap(frameStats, 'groupEllipses', lap)
+        #使用分好組的橢圓來獲得代表斜紋的直線，與該線的斜率與角度。
+        groupedFittedEllipses = self._computeSlopeAndAngle(groupedFittedEllipses)
+        if frameStats is None:
+            return groupedFittedEllipses
+        self._lap(frameStats, 'computeSlopeAndAngle', lap)
+        frameStats['counts'].update(ellipses = nFitted, inlierEllipses = len(fittedEllipses), groups = len(groupedFittedEllipses), laneFastPath = int(laneFastPath))
+        return _GroupedEllipses(groupedFittedEllipses, frameStats)
+
+    #目前 findGroupedEllipses 使用的偵測狀態的快照。狀態改變時會換成新的物件，所以可用 is 比較兩個快照是否相同。
+    def detectionState(self):
+        return self._detectionState
+
+    #更新要處理的區域[regions]與其參考中位數與 MAD [referenceStats]，有改變時產生新的快照。
+    def _setRegions(self, regions, referenceStats = None):
+        if regions is not self._regions:
+            self._regions = regions
+            self._referenceStats = referenceStats
+            self._detectionState = (self._regions, self._lanes, self._referenceStats)
+
+    #更新每條鋼纜的左右範圍[lanes]，有改變時產生新的快照。
+    def _setLanes(self, lanes):
+        if lanes is not self._lanes:
+            self._lanes = lanes
+            self._detectionState = (self._regions, self._lanes, self._referenceStats)
+
+    '''
+    以原始解析度重新偵測原始影像[frame]中每個區域[regions]內界線附近的橢圓，取代縮放後偵測到的橢圓[ellipses]中界線附近的部分，回傳取代後的橢圓與重新偵測到的橢圓數量。
+    不同解析度量到的橢圓大小略有差異，混在一起會讓其中一邊被當成離群值，所以重新偵測到的橢圓另外移除離群值。
+    '''
+    def _refineNearBorder(self, frame, regions, ellipses, frameStats = None):
+        refined = []
+        for x0, y0, x1, y1 in regions:
+            #以原始解析度偵測的區域上下多留 refineMargin，被區域切斷的斜紋中心點才不會落在界線附近。
+            refineY0, refineY1 = max(y0, self._borderY - 2 * self._refineMargin), min(y1, self._borderY + 2 * self._refineMargin)
+            if refineY0 < refineY1:
+                refined.append(self._findEllipsesInRegion(frame, (x0, refineY0, x1, refineY1), frameStats, self._refinePreprocessor))
+        if len(refined) == 0:
+            return (ellipses, 0)
+        refined = np.concatenate(refined)
+        nRefined = len(refined)
+        lap = time.perf_counter()
+        refined = self._removeOutliersEllipses(refined, lowerFactor = 2.0, upperFactor = 3.0, smoothed = self._smoothedStats is not None)
+        self._lap(frameStats, 'removeOutliersEllipses', lap)
+        #界線附近的橢圓以原始解析度的結果取代。
+        nearBorder = np.abs(ellipses['centerY'] - self._borderY) <= self._refineMargin
+        refinedNearBorder = np.abs(refined['centerY'] - self._borderY) <= self._refineMargin
+        return (np.concatenate([ellipses[~nearBorder], refined[refinedNearBorder]]), nRefined)
+
+    '''
+    找出原始影像[frame]中區域[region]內的輪廓並對每一個輪廓都適配（Fit）一個橢圓，橢圓座標為整張影像中的座標。各階段的耗時與輪廓數量累加到[frameStats]。
+    [preprocessor]為使用的影像預處理，預設為依照 scale 縮放影像的 Preprocessor。影像有縮放時，橢圓的座標與大小會換回原始影像中的值。
+    '''
+    def _findEllipsesInRegion(self, frame, region, frameStats = None, preprocessor = None):
+        preprocessor = preprocessor if preprocessor is not None else self._preprocessor
+        x0, y0, x1, y1 = region
+        #區域的上下緣不是影像的上下緣時，碰到該邊緣的斜紋被區域切斷，只剩一部分，其橢圓會影響離群值與合併的判斷，所以移除。
+        cutEdges = (y0 > 0, y1 < frame.shape[0])
+        lap = time.perf_counter()
+        #將原始圖片進行預處理。
+        preprocessImg = preprocessor.preprocess(frame[y0:y1, x0:x1])
+        lap = self._lap(frameStats, 'preprocess', lap)
+        if self._ellipseFitting == 'moments':
+            #以每個區塊的二階矩一次估計所有橢圓，不需邊緣檢測。
+            ellipses = self._findBlobsAndFitEllipse(preprocessImg, frameStats, cutEdges = cutEdges)
+            self._lap(frameStats, 'findBlobsAndFitEllipse', lap)
+        else:
+            #使用Canny邊緣檢測找出斜紋的邊緣。
+            canny = preprocessor.canny(preprocessImg)
+            lap = self._lap(frameStats, 'canny', lap)
+            #找出圖片中的輪廓並對每一個輪廓都適配（Fit）一個橢圓。
+            ellipses = self._findContourAndFitEllipse(canny, frameStats, cutEdges)
+            self._lap(frameStats, 'findContourAndFitEllipse', lap)
+        if preprocessImg.shape[:2] != (y1 - y0, x1 - x0):
+            #縮放後的影像中每個像素對應原始影像中的大小。以像素中心對齊，換回原始影像中的座標。
+            scaleX = (x1 - x0) / preprocessImg.shape[1]
+            scaleY = (y1 - y0) / preprocessImg.shape[0]
+            ellipses['centerX'] = (ellipses['centerX'] + 0.5) * scaleX - 0.5
+            ellipses['centerY'] = (ellipses['centerY'] + 0.5) * scaleY - 0.5
+            ellipses['minorAxis'] *= (scaleX + scaleY) / 2
+            ellipses['majorAxis'] *= (scaleX + scaleY) / 2
+            ellipses['area'] = (ellipses['minorAxis'] / 2) * (ellipses['majorAxis'] / 2) * np.pi
+        ellipses['centerX'] += x0
+        ellipses['centerY'] += y0
+        return ellipses
+
+    '''
+    透過[groupedEllipses]中每條鋼纜上斜紋的左右範圍，找出原始影像[frame]中之後要處理的區域，回傳區域與其參考中位數與 MAD。
+    只處理界線上下的範圍時，區域上下各多留一個斜紋的高度，並以整張影像的橢圓計算面積、角度與每組間距的中位數與 MAD 作為參考，之後每幀移除離群橢圓與補斜紋時使用，
+    範圍內橢圓較少時中位數與 MAD 才不會與處理整張影像時不同。其餘情況參考中位數與 MAD 為None。
+    '''
+    def _findRegions(self, frame, groupedEllipses):
+        frameHeight, frameWidth = frame.shape[:2]
+        #每條鋼纜的左右範圍（包含額外保留的寬度）。
+        lanes = sorted((max(0, int(min(group['startX'].min(), group['endX'].min())) - self._roiMargin), min(frameWidth, int(max(group['startX'].max(), group['endX'].max())) + self._roiMargin)) for group in groupedEllipses if len(group) > 0)
+        if len(lanes) == 0:
+            return (None, None)
+        #合併重疊的範圍，避免同一個斜紋被偵測兩次。只處理一個區域時則合併所有範圍。
+        xRanges = [list(lanes[0])]
+        for x0, x1 in lanes[1:]:
+            if self._roiMode == 'union' or x0 <= xRanges[-1][1]:
+                xRanges[-1][1] = max(xRanges[-1][1], x1)
+            else:
+                xRanges.append([x0, x1])
+        if self._roiVerticalMargin is None or self._borderY is None:
+            return ([(x0, 0, x1, frameHeight) for x0, x1 in xRanges], None)
+        #界線上下要處理的範圍。再往外多留一個斜紋的高度，中心點在範圍內的斜紋才會完整地被偵測到，碰到邊緣而被切斷的斜紋則會被移除。
+        stripeHeight = int(np.ceil(max(np.abs(group['endY'] - group['startY']).max() for group in groupedEllipses if len(group) > 0))) + 1
+        y0, y1 = max(0, self._borderY - self._roiVerticalMargin - stripeHeight), min(frameHeight, self._borderY + self._roiVerticalMargin + stripeHeight)
+        #該幀已以整張影像偵測過，但偵測結果只有移除離群值後的橢圓，所以重新找出整張影像的橢圓來計算面積與角度的中位數與 MAD。
+        areaStats, angleStats = self._areaAndAngleStats(self._findEllipsesInRegion(frame, (0, 0, frameWidth, frameHeight)))
+        referenceStats = {'area': areaStats, 'angle': angleStats, 'gaps': [RobustStats.medianAndMad(np.abs(group['centerY'][1:] - group['centerY'][:-1])) for group in groupedEllipses]}
+        return ([(x0, y0, x1, y1) for x0, x1 in xRanges], referenceStats)
+
+    #找出影像[frame]中的輪廓並對每一個輪廓都適配（Fit）一個橢圓，回傳橢圓表。輪廓數量累加到[frameStats]。
+    def _findContourAndFitEllipse(self, frame, frameStats = None, cutEdges = (False, False)):
+        #找出圖片中的輪廓。
         contours = cv2.findContours(frame, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         contours = contours[0] if len(contours) == 2 else contours[1]
-        #存放適配輪廓的橢圓及其他相關資訊。
-        fittedEllipse = []
-        for c in contours:
-            #輪廓至少要由5個以上的點組成，才能用橢圓適配。
-            if len(c) > 5:
-                #橢圓本身，裡面包含橢圓的中心點，長短軸長度以及傾斜角度。
-                ellipse = cv2.fitEllipse(c)
-                #利用橢圓的長軸與短軸來計算橢圓面積。
-                a, b = ellipse[1]
-                #短軸長度。
-                minorLength = min(a,b)
-                #長軸長度。
-                majorLength = max(a,b)
-                #計算橢圓的面積。
-                area = (minorLength / 2) * (majorLength / 2) * np.pi
-                #新增橢圓本身及其面積。
-                fittedEllipse.append({'ellipse':ellipse, 'area':area})
-        return fittedEllipse
-    
+        if frameStats is not None:
+            frameStats['counts']['contours'] = frameStats['counts'].get('contours', 0) + len(contours)
+        #移除碰到被切斷的上緣或下緣（[cutEdges]）的輪廓。
+        if cutEdges[0] or cutEdges[1]:
+            contours = [c for c in contours if not self._touchesCutEdges(*cv2.boundingRect(c)[1::2], frame.shape[0], cutEdges)]
+        #輪廓至少要由5個以上的點組成，才能用橢圓適配。每個橢圓包含中心點，兩軸長度以及傾斜角度。
+        fitted = [(x0, y0, a, b, angle) for (x0, y0), (a, b), angle in (cv2.fitEllipse(c) for c in contours if len(c) > 5)]
+        return self._toEllipses(np.array(fitted, dtype = np.float64).reshape(-1, 5))
+
+    '''
+    以二值化影像[image]中每個區塊（斜紋）的二階矩估計橢圓，回傳橢圓表。區塊數量累加到[frameStats]的輪廓數量。
+    所有區塊的矩由每個像素所屬的區塊一次累加算出，不需逐一處理每個區塊。像素數不大於[minPixels]與碰到被切斷的上緣或下緣[cutEdges]的區塊先被移除，不會計算其矩。
+    '''
+    def _findBlobsAndFitEllipse(self, image, frameStats = None, minPixels = 5, cutEdges = (False, False)):
+        nLabels, labels, blobStats, centroids = cv2.connectedComponentsWithStats(image, connectivity = 8)
+        if frameStats is not None:
+            frameStats['counts']['contours'] = frameStats['counts'].get('contours', 0) + nLabels - 1
+        #留下的區塊，標籤0為背景。
+        areas = blobStats[:, cv2.CC_STAT_AREA]
+        keptLabels = np.flatnonzero((areas > minPixels) & ~self._touchesCutEdges(blobStats[:, cv2.CC_STAT_TOP], blobStats[:, cv2.CC_STAT_HEIGHT], image.shape[0], cutEdges))
+        keptLabels = keptLabels[keptLabels > 0]
+        #每個標籤對應到留下的第幾個區塊，被移除的區塊與背景為-1。
+        blobIndexes = np.full(nLabels, -1, dtype = np.intp)
+        blobIndexes[keptLabels] = np.arange(len(keptLabels))
+        #屬於留下的區塊的像素。
+        labels = labels.ravel()
+        pixels = np.flatnonzero(labels)
+        pixelBlobs = blobIndexes[labels[pixels]]
+        pixels = pixels[pixelBlobs >= 0]
+        pixelBlobs = pixelBlobs[pixelBlobs >= 0]
+        #像素相對於區塊中心的座標。
+        centerXs = centroids[keptLabels, 0]
+        centerYs = centroids[keptLabels, 1]
+        dxs = pixels % image.shape[1] - centerXs[pixelBlobs]
+        dys = pixels // image.shape[1] - centerYs[pixelBlobs]
+        #每個區塊的二階中心矩。
+        nPixels = areas[keptLabels].astype(np.float64)
+        mu20 = np.bincount(pixelBlobs, dxs * dxs, len(keptLabels)) / nPixels
+        mu02 = np.bincount(pixelBlobs, dys * dys, len(keptLabels)) / nPixels
+        mu11 = np.bincount(pixelBlobs, dxs * dys, len(keptLabels)) / nPixels
+        #共變異矩陣的兩個特徵值，實心橢圓的軸長為其平方根的4倍。
+        common = np.sqrt(((mu20 - mu02) / 2) ** 2 + mu11 ** 2)
+        majorAxes = 4 * np.sqrt((mu20 + mu02) / 2 + common)
+        minorAxes = 4 * np.sqrt(np.maximum((mu20 + mu02) / 2 - common, 0))
+        #與 cv2.fitEllipse 相同，角度為短軸的方向，也就是長軸的方向加90度。
+        angles = np.mod(np.degrees(0.5 * np.arctan2(2 * mu11, mu20 - mu02)) + 90, 180)
+        return self._toEllipses(np.column_stack((centerXs, centerYs, minorAxes, majorAxes, angles)))
+
+    #上緣為[top]、高為[height]的範圍是否碰到高為[rows]的影像中被切斷的上緣或下緣[cutEdges]。
+    @staticmethod
+    def _touchesCutEdges(top, height, rows, cutEdges):
+        cutTop, cutBottom = cutEdges
+        return (cutTop & (top <= 0)) | (cutBottom & (top + height >= rows))
+
+    #將每列為 (中心點X座標, 中心點Y座標, 軸長, 軸長, 角度) 的陣列[fitted]轉為橢圓表。
+    def _toEllipses(self, fitted):
+        #存放橢圓及其他相關資訊。
+        ellipses = np.zeros(len(fitted), dtype = ELLIPSE_DTYPE)
+        ellipses['centerX'] = fitted[:, 0]
+        ellipses['centerY'] = fitted[:, 1]
+        #短軸長度。
+        ellipses['minorAxis'] = np.minimum(fitted[:, 2], fitted[:, 3])
+        #長軸長度。
+        ellipses['majorAxis'] = np.maximum(fitted[:, 2], fitted[:, 3])
+        ellipses['angle'] = fitted[:, 4]
+        #利用橢圓的長軸與短軸來計算橢圓的面積。
+        ellipses['area'] = (ellipses['minorAxis'] / 2) * (ellipses['majorAxis'] / 2) * np.pi
+        return ellipses
+
     '''
     移除[ellipses]中屬於離群值的橢圓（面積異常小或大、角度異常小或大），[minArea]代表接受的最小橢圓面積，面積小於[minArea]的橢圓會直接被移除。
     [lowerFactor]與[upperFactor]用來設定移除標準的嚴格程度。[lowerFactor]與[upperFactor]越大，被移除的橢圓越少，[lowerFactor]與[upperFactor]越小，被移除的橢圓越多。
+    [smoothed]為True時只移除面積小於[minArea]的橢圓，離群值由 detect 以跨幀平滑的上下界移除。[referenceStats]不為None時，以其中面積與角度的中位數與 MAD 取代這些橢圓的中位數與 MAD。
     '''
-    def _removeOutliersEllipses(slef, ellipses, minArea = 80, lowerFactor = 1.0, upperFactor = 1.0):
+    def _removeOutliersEllipses(self, ellipses, minArea = 80, lowerFactor = 1.0, upperFactor = 1.0, smoothed = False, referenceStats = None):
         #使用 Median Absolute Deviation(MAD) 方法來檢測橢圓面積與角度的離群值，移除面積異常小或大、角度異常小或大的橢圓。
         #先將面積小於 minArea 的橢圓直接移除，避免其影響中位數（Median）的大小，使得正常面積的橢圓反而被當成離群值。
-        ellipses = list(filter(lambda e: e['area'] > minArea, ellipses))
-        areas = [e['area'] for e in ellipses]
-        angles = [e['ellipse'][2] for e in ellipses]
-        medianAreas = np.median(areas)
-        medianAngles = np.median(angles)
-        diffAreas = np.abs(areas - medianAreas)
-        diffAngles = np.abs(angles - medianAngles)
-        scalingFactorAreas = np.median(diffAreas)
-        scalingFactorAngles = np.median(diffAngles)
-        lowerAreas = medianAreas - lowerFactor * scalingFactorAreas
-        upperAreas = medianAreas + upperFactor * scalingFactorAreas
-        lowerAngles = medianAngles - lowerFactor * scalingFactorAngles
-        upperAngles = medianAngles + upperFactor * scalingFactorAngles
+        ellipses = ellipses[ellipses['area'] > minArea]
+        if len(ellipses) == 0 or smoothed:
+            return ellipses
+        areas = ellipses['area']
+        angles = ellipses['angle']
+        (medianAreas, madAreas), (medianAngles, madAngles) = (referenceStats['area'], referenceStats['angle']) if referenceStats is not None else self._areaAndAngleStats(ellipses, minArea)
+        lowerAreas, upperAreas = medianAreas - lowerFactor * madAreas, medianAreas + upperFactor * madAreas
+        lowerAngles, upperAngles = medianAngles - lowerFactor * madAngles, medianAngles + upperFactor * madAngles
         #移除面積異常小或大、角度異常小或大的橢圓。
-        ellipses = list(filter(lambda e: (e['area'] < upperAreas and e['area'] > lowerAreas and e['ellipse'][2] < upperAngles and e['ellipse'][2] > lowerAngles), ellipses))
-        #橢圓面積之後用不到，先移除。
-        ellipses = [{k: v for k, v in e.items() if k != 'area'} for e in ellipses]
-        return ellipses
-    
+        return ellipses[(areas < upperAreas) & (areas > lowerAreas) & (angles < upperAngles) & (angles > lowerAngles)]
+
+    #[ellipses]中面積大於[minArea]的橢圓的面積與角度的中位數與 MAD。
+    @staticmethod
+    def _areaAndAngleStats(ellipses, minArea = 80):
+        ellipses = ellipses[ellipses['area'] > minArea]
+        return (RobustStats.medianAndMad(ellipses['area']), RobustStats.medianAndMad(ellipses['angle']))
+
+    '''
+    以跨幀平滑的上下界移除[groupedEllipses]中面積異常小或大、角度異常小或大的橢圓，[lowerFactor]與[upperFactor]與 _removeOutliersEllipses 相同。
+    以該幀所有橢圓的面積與角度更新估計值的複本，再以其上下界移除。移除後橢圓數量不大於5的組與分組時相同，直接移除。
+    回傳移除後的分組橢圓與更新後的估計值（沒有任何橢圓時為空的），由 detect 在該幀沒有被捨棄時才存回，被捨棄的幀不會改變之後的上下界。
+    '''
+    def _removeSmoothedOutliersEllipses(self, groupedEllipses, lowerFactor = 1.0, upperFactor = 1.0):
+        if len(groupedEllipses) == 0:
+            return (groupedEllipses, {})
+        ellipses = np.concatenate(groupedEllipses)
+        updates = {kind: copy.copy(self._smoothedStats[kind]) for kind in ('area', 'angle')}
+        updates['area'].update(ellipses['area'])
+        updates['angle'].update(ellipses['angle'])
+        lowerAreas, upperAreas = updates['area'].bounds(lowerFactor, upperFactor)
+        lowerAngles, upperAngles = updates['angle'].bounds(lowerFactor, upperFactor)
+        groupedEllipses = [group[(group['area'] < upperAreas) & (group['area'] > lowerAreas) & (group['angle'] < upperAngles) & (group['angle'] > lowerAngles)] for group in groupedEllipses]
+        return ([group for group in groupedEllipses if len(group) > 5], updates)
+
+    #建立一個跨幀平滑的中位數與 MAD 估計值。
+    def _newSmoothedStats(self):
+        return SmoothedRobustStats(alpha = self._temporalSmoothing, reestimateInterval = self._reestimateInterval)
+
+    #第[index]組的[kind]（'slopes'或'gaps'）跨幀平滑的估計值，尚未建立時建立。
+    def _groupSmoothedStats(self, kind, index):
+        groupStats = self._smoothedStats[kind]
+        while len(groupStats) <= index:
+            groupStats.append(self._newSmoothedStats())
+        return groupStats[index]
+
     #找出[ellipses]橢圓的長軸(以兩個端點表示)，用來表示鋼纜上的斜紋。
     def _findEllipseMajorAxes(self, ellipses):
-        for e in ellipses:
-            #橢圓的中心、長短軸與角度。
-            (x0, y0), (a, b), angle = e['ellipse']
-            majorLength = max(a,b) / 2
-            if angle > 90:
-                angle = angle - 90
-            else:
-                angle = angle + 90
-            #橢圓長軸的起點。
-            startPoint = (int(round(x0 + majorLength * np.cos(np.radians(angle)))), int(round(y0 + majorLength * np.sin(np.radians(angle)))))
-            #橢圓長軸的終點。
-            endPoint = (int(round(x0 + majorLength * np.cos(np.radians(angle + 180)))), int(round(y0 + majorLength * np.sin(np.radians(angle + 180)))))
-            #新增橢圓長軸。
-            e['majorAxe'] = {'startPoint': startPoint, 'endPoint': endPoint}
+        majorLength = ellipses['majorAxis'] / 2
+        angle = np.where(ellipses['angle'] > 90, ellipses['angle'] - 90, ellipses['angle'] + 90)
+        #橢圓長軸的起點。
+        ellipses['startX'] = np.rint(ellipses['centerX'] + majorLength * np.cos(np.radians(angle)))
+        ellipses['startY'] = np.rint(ellipses['centerY'] + majorLength * np.sin(np.radians(angle)))
+        #橢圓長軸的終點。
+        ellipses['endX'] = np.rint(ellipses['centerX'] + majorLength * np.cos(np.radians(angle + 180)))
+        ellipses['endY'] = np.rint(ellipses['centerY'] + majorLength * np.sin(np.radians(angle + 180)))
         return ellipses
-    
-    #將橢圓[ellipses]分組，正常情況下鋼纜有幾條橢圓就有幾組。
+
+    '''
+    將已依長軸起點X座標排序的橢圓表[ellipses]分組，正常情況下鋼纜有幾條橢圓就有幾組。每組都是橢圓表中連續的一段。
+    橢圓與該組任一個現有橢圓的長軸在X方向上有交錯，且其長軸起點的X座標小於該組平均長軸終點的X座標時，才會被分到該組。
+    因為橢圓已依起點X座標排序，該組現有橢圓的起點都不大於目前橢圓的起點，所以只需以二分搜尋找出起點小於某個值的現有橢圓，再比較它們終點X座標的最大值，整體為 O(n log n)。
+    '''
     def _groupEllipses(self, ellipses):
-        #存放已分組的橢圓，並將第一個橢圓直接先放到第一組。
-        groupedEllipses = [[ellipses[0]]]
-        for index, MA in enumerate([e['majorAxe'] for e in ellipses[1:]]):
+        if len(ellipses) == 0:
+            return []
+        startXs = ellipses['startX'].tolist()
+        endXs = ellipses['endX'].tolist()
+        #每組在橢圓表中的起始位置，第一個橢圓直接先放到第一組。
+        groupStarts = [0]
+        #該組現有橢圓起點的X座標（已排序）。
+        groupStartXs = [startXs[0]]
+        #該組前幾個現有橢圓終點X座標的最大值。
+        groupMaxEndXs = [endXs[0]]
+        #該組現有橢圓終點X座標的總和，用來計算平均長軸終點的X座標。
+        groupSumEndX = endXs[0]
+        for index in range(1, len(ellipses)):
             #該橢圓起點的X座標。
-            currentStartPointX = MA['startPoint'][0]
+            currentStartPointX = startXs[index]
             #該橢圓終點的X座標。
-            currentEndPointX = MA['endPoint'][0]
-            #該組平均長軸終點的X座標。
-            meanGroupEndPointX = np.mean([e['majorAxe']['endPoint'][0] for e in groupedEllipses[-1]])
-            #用來判斷該組是否已分完。
-            inNextGroup = True
-            #將該橢圓與該組所有現有橢圓的位置進行比較，判斷該橢圓是否應被分到該組。
-            for previousMA in [e['majorAxe'] for e in groupedEllipses[-1]]:
-                previousStartPointX = previousMA['startPoint'][0]
-                previousEndPointX = previousMA['endPoint'][0]
-                #如果該橢圓與該組任一個現有橢圓有交錯，且其長軸起點的X座標小於該組平均長軸終點的X座標，則將它分到該組。
-                if ((currentStartPointX < previousStartPointX and currentEndPointX > previousStartPointX) or (currentEndPointX > previousStartPointX and currentStartPointX < previousEndPointX) or (currentStartPointX > previousStartPointX and currentEndPointX < previousEndPointX) or (currentStartPointX < previousStartPointX and currentEndPointX > previousEndPointX)) and (currentStartPointX < meanGroupEndPointX):
-                    groupedEllipses[-1].append(ellipses[index + 1])
-                    inNextGroup = False
-                    break
-            #該橢圓不屬於該組，代表該組已分完。
+            currentEndPointX = endXs[index]
+            #該橢圓起點的X座標需小於該組平均長軸終點的X座標（以整數運算比較，避免除法誤差）。
+            inNextGroup = currentStartPointX * len(groupStartXs) >= groupSumEndX
+            if not inNextGroup:
+                #該組中起點在該橢圓終點左側的橢圓，只要有一個終點在該橢圓起點右側就有交錯。
+                nBefore = bisect.bisect_left(groupStartXs, currentEndPointX)
+                overlapped = nBefore > 0 and groupMaxEndXs[nBefore - 1] > currentStartPointX
+                #該組中起點在該橢圓起點左側的橢圓，只要有一個終點在該橢圓終點右側就包含該橢圓。
+                if not overlapped:
+                    nBefore = bisect.bisect_left(groupStartXs, currentStartPointX)
+                    overlapped = nBefore > 0 and groupMaxEndXs[nBefore - 1] > currentEndPointX
+                inNextGroup = not overlapped
+            #該橢圓不屬於該組，代表該組已分完，將該橢圓分到下一組。
             if inNextGroup:
-                #將該橢圓分到下一組。
-                groupedEllipses.append([ellipses[index+1]])
+                groupStarts.append(index)
+                groupStartXs = [currentStartPointX]
+                groupMaxEndXs = [currentEndPointX]
+                groupSumEndX = currentEndPointX
+            else:
+                groupStartXs.append(currentStartPointX)
+                groupMaxEndXs.append(max(groupMaxEndXs[-1], currentEndPointX))
+                groupSumEndX += currentEndPointX
+        groupEnds = groupStarts[1:] + [len(ellipses)]
         #少數破碎的橢圓會被演算法單獨分成一組，造成組數異常，所以將橢圓數量極少的組移除（這裡只將橢圓數量大於5的組留下）。
-        groupedEllipses = list(filter(lambda g: len(g) > 5 , groupedEllipses))
-        return groupedEllipses
-    
-    #透過[groupedEllipses]來獲得代表斜紋的直線，與該線的斜率與角度。
+        return [ellipses[start:end] for start, end in zip(groupStarts, groupEnds) if end - start > 5]
+
+    #透過[groupedEllipses]中每條鋼纜上斜紋長軸的左右範圍，得知每條鋼纜的左右範圍。鋼纜範圍有重疊時無法單靠X座標分組，回傳None。
+    def _findLanes(self, groupedEllipses):
+        lanes = sorted((min(group['startX'].min(), group['endX'].min()), max(group['startX'].max(), group['endX'].max())) for group in groupedEllipses)
+        lefts = np.array([l for l, _ in lanes], dtype = np.float64)
+        rights = np.array([r for _, r in lanes], dtype = np.float64)
+        if np.any(lefts[1:] <= rights[:-1]):
+            return None
+        return (lefts, rights)
+
+    '''
+    依照橢圓中心點的X座標，將橢圓表[ellipses]中的橢圓分到鋼纜範圍[lanes]中所在的鋼纜，每組內依長軸起點的X座標排序，與重新分組的結果順序相同。
+    落在鋼纜範圍外的橢圓會被移除。落在鋼纜範圍內的橢圓比例過低，或有鋼纜的橢圓數量不大於5時，代表無法可靠地分組，回傳None。
+    '''
+    def _assignEllipsesToLanes(self, ellipses, lanes):
+        lefts, rights = lanes
+        if len(ellipses) == 0:
+            return None
+        #中心點X座標左側最近的鋼纜左界。
+        laneIndexes = np.searchsorted(lefts, ellipses['centerX'], side = 'right') - 1
+        inLane = (laneIndexes >= 0) & (ellipses['centerX'] <= rights[np.maximum(laneIndexes, 0)])
+        if np.mean(inLane) < self._minLaneConfidence:
+            return None
+        ellipses = ellipses[inLane]
+        laneIndexes = laneIndexes[inLane]
+        counts = np.bincount(laneIndexes, minlength = len(lefts))
+        if np.any(counts <= 5):
+            return None
+        ellipses = ellipses[np.lexsort((ellipses['startX'], laneIndexes))]
+        return np.split(ellipses, np.cumsum(counts)[:-1])
+
+    #計算[groupedEllipses]中代表斜紋的直線（橢圓長軸）的斜率與角度。
     def _computeSlopeAndAngle(self, groupedEllipses):
-        #存放已分組的橢圓長軸。
-        groupedLines = [[0] * len(group) for group in groupedEllipses]
-        #存放已分組的斜紋斜率。
-        groupedSlopes = [[0] * len(group) for group in groupedEllipses]
-        #存放已分組的斜紋角度。
-        groupedAngles = [[0] * len(group) for group in groupedEllipses]
-        for index1, group in enumerate(groupedEllipses):
-            for index2, e in enumerate(group):
-                #橢圓長軸起點。
-                startPoint = e['majorAxe']['startPoint']
-                #橢圓長軸終點。
-                endPoint = e['majorAxe']['endPoint']
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            for group in groupedEllipses:
                 #斜紋斜率。
-                slope = (startPoint[1] - endPoint[1]) / (endPoint[0] - startPoint[0])
+                group['slope'] = (group['startY'] - group['endY']) / (group['endX'] - group['startX'])
                 #斜紋角度。
-                angle = np.arctan(slope) * 180 / np.pi
-                groupedLines[index1][index2] = (startPoint, endPoint)
-                groupedSlopes[index1][index2] = slope
-                groupedAngles[index1][index2] = angle
-        return (groupedLines, groupedSlopes, groupedAngles)
-    
+                group['lineAngle'] = np.arctan(group['slope']) * 180 / np.pi
+        return groupedEllipses
+
     #將[groupedEllipses]中代表同一個斜紋的破碎橢圓接在一起。
     def _combineSmallEllipses(self, groupedEllipses):
         #存放新的已分組的橢圓。
         newGroupedEllipses = []
-        #存放新的已分組的橢圓長軸。
-        newGroupedLines = []
-        #存放新的已分組的斜紋斜率。
-        newGroupedSlopes = []
-        #存放新的已分組的斜紋角度。
-        newGroupedAngles = []
-        for index1, group in enumerate(groupedEllipses):
-            newEllipses = []
-            newLines = []
-            newSlopes = []
-            newAngles = []
-            #用來判斷上個橢圓是否有跟目前這個橢圓合併。
-            previousCombined = False
-            for index2, e in enumerate(group[:-1]):
-                #上個橢圓已跟目前這個橢圓合併，不用再將這個橢圓與其他橢圓合併。
-                if previousCombined:
-                    previousCombined = False
-                    continue
-                #目前這個橢圓的中心與長短軸長度。
-                (x1, y1), (a1, b1), _ = e['ellipse']
-                #下個橢圓的中心與長短軸長度。
-                (x2, y2), (a2, b2), _ = group[index2 + 1]['ellipse']
-                #兩個橢圓的中心相連為一垂直線，代表它們不代表同一個斜紋，不用合併。
-                if x2 - x1 == 0:
-                    #新增目前這個橢圓。
-                    newEllipses.append(e)
-                    #新增目前這個橢圓的長軸。
-                    newLines.append(self._lines[index1][index2])
-                    #新增目前這個橢圓的長軸斜率（斜紋斜率）。
-                    newSlopes.append(self._slopes[index1][index2])
-                    #新增目前這個橢圓的長軸角度（斜紋角度）。
-                    newAngles.append(self._angles[index1][index2])
-                    previousCombined = False
-                    continue
-                #兩個橢圓中心相連的直線的斜率。
-                combinedSlope = (y1 - y2) / (x2 - x1)
-                #使用 Median Absolute Deviation(MAD) 方法來檢測 combinedSlope 是否比該組其他橢圓的長軸斜率顯著大或小。
-                groupSlopes = self._slopes[index1]
-                groupSlopes.append(combinedSlope)
-                medianSlopes = np.median(groupSlopes)
-                diffSlopes = np.abs(groupSlopes - medianSlopes)
-                scalingFactorSlopes = np.median(diffSlopes)
-                lowerSlopes = medianSlopes - 2.0 * scalingFactorSlopes
-                upperSlopes = medianSlopes + 2.0 * scalingFactorSlopes
-                #combinedSlope 與該組其他橢圓的長軸斜率沒有顯著差異，代表兩個橢圓原本代表同一個斜紋，需將它們合併。
-                if not (combinedSlope < lowerSlopes or combinedSlope > upperSlopes):
-                    #合併後的新橢圓、新長軸、新斜率與新角度。
-                    newEllipse, newLine, newSlope, newAngle = self._createCombinedEllipse(e, group[index2 + 1])
-                    #新增合併後的橢圓。
-                    newEllipses.append(newEllipse)
-                    #新增合併後的橢圓長軸。
-                    newLines.append(newLine)
-                    #新增合併後的橢圓長軸斜率（斜紋斜率）。
-                    newSlopes.append(newSlope)
-                    #新增合併後的橢圓長軸角度（斜紋角度）。
-                    newAngles.append(newAngle)
-                    previousCombined = True
-                #combinedSlope 與該組其他橢圓的長軸斜率有顯著差異，代表兩個橢圓原本代表不同斜紋，不需將它們合併。
-                else:
-                    #新增目前這個橢圓。
-                    newEllipses.append(e)
-                    #新增目前這個橢圓的長軸。
-                    newLines.append(self._lines[index1][index2])
-                    #新增目前這個橢圓的長軸斜率（斜紋斜率）。
-                    newSlopes.append(self._slopes[index1][index2])
-                    #新增目前這個橢圓的長軸角度（斜紋角度）。
-                    newAngles.append(self._angles[index1][index2])
-                    previousCombined = False
+        for groupIndex, group in enumerate(groupedEllipses):
+            nPairs = len(group) - 1
+            if nPairs < 1:
+                newGroupedEllipses.append(group[:0].copy())
+                continue
+            #每個橢圓與下個橢圓合併後的結果。
+            combined = self._createCombinedEllipses(group[:-1], group[1:])
+            #兩個橢圓中心點X座標的差。
+            diffXs = group['centerX'][1:] - group['centerX'][:-1]
+            #兩個橢圓中心相連的直線的斜率。
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                combinedSlopes = (group['centerY'][:-1] - group['centerY'][1:]) / diffXs
+            if self._smoothedStats is not None:
+                #以跨幀平滑的斜率上下界判斷，上下界在這一幀中固定不變。
+                groupSlopes = self._groupSmoothedStats('slopes', groupIndex)
+                groupSlopes.update(group['slope'])
+                keptIndices, keptCombined = self._findFixedBoundsCombinedPairs(diffXs, combinedSlopes, *groupSlopes.bounds(2.0, 2.0))
+            else:
+                #該組橢圓的長軸斜率的中位數與 MAD，每次判斷是否合併時都會加入兩個橢圓中心相連的直線的斜率。
+                keptIndices, keptCombined = self._findCombinedPairs(diffXs, combinedSlopes, RunningRobustStats(group['slope']))
+            #新增留下的橢圓，需合併的則以合併後的橢圓取代。
+            newEllipses = group[keptIndices]
+            newEllipses[keptCombined] = combined[keptIndices[keptCombined]]
             newGroupedEllipses.append(newEllipses)
-            newGroupedLines.append(newLines)
-            newGroupedSlopes.append(newSlopes)
-            newGroupedAngles.append(newAngles)
-        self._lines = newGroupedLines
-        self._slopes = newGroupedSlopes
-        self._angles = newGroupedAngles
         return newGroupedEllipses
-    
+
+    '''
+    依序判斷一組橢圓中每個橢圓是否要與下個橢圓合併，[diffXs]與[combinedSlopes]為兩個橢圓中心點X座標的差與中心相連的直線的斜率。
+    [groupSlopes]為該組長軸斜率的統計量（例如 RunningRobustStats），每次判斷前以 add 加入中心相連的直線的斜率，再以 bounds 取得上下界。
+    回傳留下的橢圓在該組中的位置，與留下的橢圓是否為合併後的橢圓。與下個橢圓合併的橢圓不會再與其他橢圓合併，最後一個橢圓只會以合併的方式留下。
+    '''
+    def _findCombinedPairs(self, diffXs, combinedSlopes, groupSlopes):
+        #留下的橢圓在該組中的位置。
+        keptIndices = []
+        #留下的橢圓是否為合併後的橢圓。
+        keptCombined = []
+        #用來判斷上個橢圓是否有跟目前這個橢圓合併。
+        previousCombined = False
+        for index in range(len(diffXs)):
+            #上個橢圓已跟目前這個橢圓合併，不用再將這個橢圓與其他橢圓合併。
+            if previousCombined:
+                previousCombined = False
+                continue
+            keptIndices.append(index)
+            #兩個橢圓的中心相連為一垂直線，代表它們不代表同一個斜紋，不用合併。
+            if diffXs[index] == 0:
+                keptCombined.append(False)
+                continue
+            #使用 Median Absolute Deviation(MAD) 方法來檢測 combinedSlope 是否比該組其他橢圓的長軸斜率顯著大或小。
+            combinedSlope = combinedSlopes[index]
+            groupSlopes.add(combinedSlope)
+            lowerSlopes, upperSlopes = groupSlopes.bounds(2.0, 2.0)
+            #combinedSlope 與該組其他橢圓的長軸斜率沒有顯著差異，代表兩個橢圓原本代表同一個斜紋，需將它們合併。
+            previousCombined = not (combinedSlope < lowerSlopes or combinedSlope > upperSlopes)
+            keptCombined.append(previousCombined)
+        return (np.array(keptIndices, dtype = np.intp), np.array(keptCombined, dtype = bool))
+
+    '''
+    以固定的斜率上下界[lowerSlopes]與[upperSlopes]一次判斷所有相鄰的兩個橢圓是否可以合併，其餘與 _findCombinedPairs 相同。
+    結果與上下界不隨加入的斜率改變（add 不做任何事）時的 _findCombinedPairs 相同，而不是與逐一加入斜率的 _findCombinedPairs 相同，用於跨幀平滑時上下界在一幀中固定的情況。
+    連續可以合併的幾對橢圓中，依序每隔一對合併（合併過的橢圓不會再與下個橢圓合併）。
+    '''
+    def _findFixedBoundsCombinedPairs(self, diffXs, combinedSlopes, lowerSlopes, upperSlopes):
+        #兩個橢圓的中心相連不為垂直線，且 combinedSlope 與該組長軸斜率沒有顯著差異。
+        with np.errstate(invalid = 'ignore'):
+            combinable = (diffXs != 0) & ~((combinedSlopes < lowerSlopes) | (combinedSlopes > upperSlopes))
+        #每對橢圓在連續可以合併的幾對中的位置，位置為偶數的才會合併。
+        indices = np.arange(len(combinable))
+        runStarts = np.maximum.accumulate(np.where(combinable, 0, indices + 1))
+        isCombined = combinable & ((indices - runStarts) % 2 == 0)
+        #與上個橢圓合併的橢圓不會留下。
+        kept = np.ones(len(combinable), dtype = bool)
+        kept[1:] = ~isCombined[:-1]
+        return (indices[kept], isCombined[kept])
+
     #平移[groupedEllipses]中的所有橢圓，使同組的橢圓有相同的中心點X座標（這樣計數器在判別斜紋時會更精確）。
     def _translateEllipses(self, groupedEllipses):
         #初始情況，groupMeanCenterXs 尚未有任何值。
         if len(self._groupMeanCenterXs) == 0:
             #計算每條鋼纜上所有斜紋的平均中心點X座標。
-            self._groupMeanCenterXs = [np.mean([e['ellipse'][0][0] for e in group]) for group in groupedEllipses]
-        for index1, group in enumerate(groupedEllipses):
+            self._groupMeanCenterXs = [np.mean(group['centerX']) for group in groupedEllipses]
+        for index, group in enumerate(groupedEllipses):
             #該組橢圓的平均中心點X座標，也就是要平移到的位置。
-            groupMeanCenterX = self._groupMeanCenterXs[index1]
-            for index2, e in enumerate(group):
-                #該橢圓的中心點座標。
-                centerX, centerY = e['ellipse'][0]
-                #該橢圓的長軸斜率。
-                slope = self._slopes[index1][index2]
-                #長軸的直線方程式的常數項（設 y = ax + b，再將 centerX, centerY 代入 x 與 y，slope 代入 a）。
-                b = centerY + slope * centerX
-                #平移後的橢圓中心點 Y 座標。
-                newCenterY = -slope * groupMeanCenterX + b
-                #更新橢圓的中心點座標。
-                e['ellipse'] = ((groupMeanCenterX, newCenterY), e['ellipse'][1], e['ellipse'][2])
-                #更新橢圓的長軸。
-                newStartPointX = int(round(e['majorAxe']['startPoint'][0] + (groupMeanCenterX - centerX)))
-                newStartPointY = int(round(-slope * newStartPointX + b))
-                newEndPointX = int(round(e['majorAxe']['endPoint'][0] + (groupMeanCenterX - centerX)))
-                newEndPointY = int(round(-slope * newEndPointX + b))
-                self._lines[index1][index2] = ((newStartPointX, newStartPointY), (newEndPointX, newEndPointY))
+            groupMeanCenterX = self._groupMeanCenterXs[index]
+            #橢圓的中心點座標。
+            centerXs = group['centerX']
+            centerYs = group['centerY']
+            #橢圓的長軸斜率。
+            slopes = group['slope']
+            #長軸的直線方程式的常數項（設 y = ax + b，再將 centerX, centerY 代入 x 與 y，slope 代入 a）。
+            b = centerYs + slopes * centerXs
+            #更新橢圓的長軸。
+            newStartPointXs = np.rint(group['startX'] + (groupMeanCenterX - centerXs))
+            newEndPointXs = np.rint(group['endX'] + (groupMeanCenterX - centerXs))
+            group['startX'] = newStartPointXs
+            group['startY'] = np.rint(-slopes * newStartPointXs + b)
+            group['endX'] = newEndPointXs
+            group['endY'] = np.rint(-slopes * newEndPointXs + b)
+            #更新橢圓的中心點座標。
+            group['centerY'] = -slopes * groupMeanCenterX + b
+            group['centerX'] = groupMeanCenterX
         return groupedEllipses
+
     '''
     透過[groupedEllipses]找出因光線、陰影等外部條件而沒有被辨識到的斜紋，並補齊斜紋。只有界線之前的斜紋才需要補，因為過了界線有沒有補都不影響計數。
     補斜紋其實就是在補橢圓。
@@ -310,129 +638,144 @@ class LineDetector:
     def _compensate(self, groupedEllipses):
         #存放新的已分組的橢圓。
         newGroupedEllipses = []
-        #存放新的已分組的橢圓長軸。
-        newGroupedLines = []
-        #存放新的已分組的斜紋斜率。
-        newGroupedSlopes = []
-        #存放新的已分組的斜紋角度。
-        newGroupedAngles = []
-        for index1, group in enumerate(groupedEllipses):
+        for index, group in enumerate(groupedEllipses):
+            centerYs = group['centerY']
             #使用 Median Absolute Deviation(MAD) 方法來判斷組內相鄰兩橢圓的間距是否異常大，是的話代表兩橢圓間有斜紋沒被辨識到。
-            groupGaps = [np.abs(group[i + 1]['ellipse'][0][1] - e['ellipse'][0][1]) for i, e in enumerate(group[:-1])]
-            medianGroupGaps = np.median(groupGaps)
-            diffGroupGaps = np.abs(groupGaps - medianGroupGaps)
-            scalingFactorGroupGaps = np.median(diffGroupGaps)
+            groupGaps = np.abs(centerYs[1:] - centerYs[:-1])
+            if self._smoothedStats is not None:
+                #以跨幀平滑的間距中位數與 MAD 判斷。
+                smoothedGaps = self._groupSmoothedStats('gaps', index)
+                smoothedGaps.update(groupGaps)
+                medianGroupGaps, scalingFactorGroupGaps = smoothedGaps.medianAndMad()
+            elif self._referenceStats is not None:
+                #只處理界線上下的範圍時，以找出區域那一幀整張影像的間距中位數與 MAD 判斷。
+                medianGroupGaps, scalingFactorGroupGaps = self._referenceStats['gaps'][index]
+            else:
+                medianGroupGaps, scalingFactorGroupGaps = RobustStats.medianAndMad(groupGaps)
             upperGroupGaps = medianGroupGaps + 30.0 * scalingFactorGroupGaps
-            try:
-                #找出要從第幾個橢圓開始補斜紋。鋼纜為上行時，則從界線上方100像素開始往下補。鋼纜為下行時，則從界線下方100像素開始往上補。
-                first = 0 if self._borderY is None else next(i for i, e in enumerate(group) if e['ellipse'][0][1] > (self._borderY - 100)) if self._upward else next(i for i, e in enumerate(group) if e['ellipse'][0][1] < (self._borderY + 100))
-                newEllipses = group[:first]
-                newLines = self._lines[index1][:first]
-                newSlopes = self._slopes[index1][:first]
-                newAngles = self._angles[index1][:first]
-                for index2, e in enumerate(group[first:-1]):
-                    newEllipses.append(e)
-                    newLines.append(self._lines[index1][first + index2])
-                    newSlopes.append(self._slopes[index1][first + index2])
-                    newAngles.append(self._angles[index1][first + index2])
-                    #目前這個橢圓與下一個橢圓的間距。
-                    gap = np.abs(group[first + index2 + 1]['ellipse'][0][1] - e['ellipse'][0][1])
-                    #如果間距過大則要補斜紋。
-                    if gap > upperGroupGaps:
-                        #計算需要補幾個斜紋。
-                        nCompensate = int(round(gap / medianGroupGaps)) - 1
-                        #從目前這個橢圓開始算，每隔多遠要補一個斜紋。
-                        newGap = gap / (nCompensate + 1)
-                        #補斜紋（補橢圓）。
-                        for i in range(1, nCompensate + 1):
-                            #補的橢圓的中心點座標。X座標為該組橢圓的平均中心點X座標，Y座標 = (目前這個橢圓的中心點Y座標) ＋ newGap * i 。
-                            center = (self._groupMeanCenterXs[index1], e['ellipse'][0][1] + newGap * i) if self._upward else (self._groupMeanCenterXs[index1], e['ellipse'][0][1] - newGap * i)
-                            #補的橢圓的短軸長度，為該組橢圓的平均短軸長度。
-                            maLength = np.mean([min(e['ellipse'][1]) for e in group])
-                            #補的橢圓的長軸長度，為該組橢圓的平均長軸長度。
-                            MALength = np.mean([max(e['ellipse'][1]) for e in group])
-                            #補的橢圓的斜率。
-                            slope = np.mean(self._slopes[index1])
-                            #補的橢圓的角度。
-                            angle = np.mean(self._angles[index1])
-                            newAngle = 90 - angle
-                            if newAngle > 90:
-                                newAngle = newAngle - 90
-                            else:
-                                newAngle = newAngle + 90
-                            #補的橢圓的長軸起點。
-                            startPoint = (int(round(center[0] + (MALength / 2) * np.cos(np.radians(newAngle)))), int(round(center[1] + (MALength / 2) * np.sin(np.radians(newAngle)))))
-                            #補的橢圓的長軸終點。
-                            endPoint = (int(round(center[0] + (MALength / 2) * np.cos(np.radians(newAngle + 180)))), int(round(center[1] + (MALength / 2) * np.sin(np.radians(newAngle + 180)))))
-                            #補的橢圓的長軸。
-                            majorAxe = {'startPoint': startPoint, 'endPoint': endPoint}
-                            #補的橢圓本身。
-                            ellipse = (center, (maLength, MALength), 90 - angle)
-                            newEllipses.append({'ellipse': ellipse, 'majorAxe': majorAxe})
-                            newLines.append((startPoint, endPoint, True))
-                            newSlopes.append(slope)
-                            newAngles.append(angle)
-                    #補到該組倒數第二個果園則不用繼續補，直接新增該組最後一個橢圓。
-                    if index2 == len(group[first:-1]) - 1:
-                        newEllipses.append(group[first + index2 + 1])
-                        newLines.append(self._lines[index1][first + index2 + 1])
-                        newSlopes.append(self._slopes[index1][first + index2 + 1])
-                        newAngles.append(self._angles[index1][first + index2 + 1])
-            #沒有需要補的斜紋（界線之前沒有辨識到任何斜紋）。
-            except StopIteration:
-                newGroupedEllipses.append(group)
-                newGroupedLines.append(self._lines[index1])
-                newGroupedSlopes.append(self._slopes[index1])
-                newGroupedAngles.append(self._angles[index1])
+            #找出要從第幾個橢圓開始補斜紋。鋼纜為上行時，則從界線上方100像素開始往下補。鋼纜為下行時，則從界線下方100像素開始往上補。
+            if self._borderY is None:
+                first = 0
+            else:
+                candidates = np.flatnonzero(centerYs > (self._borderY - 100) if self._upward else centerYs < (self._borderY + 100))
+                #沒有需要補的斜紋（界線之前沒有辨識到任何斜紋）。
+                if len(candidates) == 0:
+                    newGroupedEllipses.append(group)
+                    continue
+                first = candidates[0]
+            #補到該組倒數第二個橢圓則不用繼續補，直接新增該組最後一個橢圓。若從最後一個橢圓才開始補，則該橢圓不會被新增。
+            if first >= len(group) - 1:
+                newGroupedEllipses.append(group[:first])
                 continue
+            #每個橢圓與下一個橢圓之間需要補幾個斜紋，只有間距過大時才要補。
+            nCompensates = np.zeros(len(group), dtype = np.intp)
+            gaps = groupGaps[first:]
+            needCompensate = gaps > upperGroupGaps
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                nCompensates[first:-1][needCompensate] = np.rint(gaps[needCompensate] / medianGroupGaps) - 1
+            nCompensates = np.maximum(nCompensates, 0)
+            #原有的橢圓在新的一組中的位置。
+            positions = np.arange(len(group)) + np.concatenate(([0], np.cumsum(nCompensates)[:-1]))
+            newEllipses = np.empty(len(group) + nCompensates.sum(), dtype = ELLIPSE_DTYPE)
+            newEllipses[positions] = group
+            if nCompensates.sum() > 0:
+                #每個補的橢圓來自哪個橢圓之後，以及是其後的第幾個。
+                sources = np.repeat(np.arange(len(group)), nCompensates)
+                orders = np.arange(len(sources)) - np.repeat(np.cumsum(nCompensates) - nCompensates, nCompensates) + 1
+                #從目前這個橢圓開始算，每隔多遠要補一個斜紋。
+                newGaps = groupGaps[sources] / (nCompensates[sources] + 1)
+                newEllipses[positions[sources] + orders] = self._createCompensatedEllipses(group, index, centerYs[sources] + newGaps * orders if self._upward else centerYs[sources] - newGaps * orders)
             newGroupedEllipses.append(newEllipses)
-            newGroupedLines.append(newLines)
-            newGroupedSlopes.append(newSlopes)
-            newGroupedAngles.append(newAngles)
-        self._lines = newGroupedLines
-        self._slopes = newGroupedSlopes
-        self._angles = newGroupedAngles
         return newGroupedEllipses
-    
-    #合併兩個橢圓[e1]與[e2]。
-    def _createCombinedEllipse(self, e1, e2):
-        center = None
-        maLength = (min(e1['ellipse'][1]) + min(e2['ellipse'][1])) / 2
-        MALength = None
-        slope = None
-        angle = None
-        majorAxe = None
-        MALength1 = np.sqrt((e1['majorAxe']['startPoint'][0] - e2['majorAxe']['endPoint'][0]) ** 2 + (e1['majorAxe']['startPoint'][1] - e2['majorAxe']['endPoint'][1]) ** 2)
-        MALength2 = np.sqrt((e1['majorAxe']['endPoint'][0] - e2['majorAxe']['startPoint'][0]) ** 2 + (e1['majorAxe']['endPoint'][1] - e2['majorAxe']['startPoint'][1]) ** 2)
-        if MALength1 > MALength2:
-            center = (int(round((e1['majorAxe']['startPoint'][0] + e2['majorAxe']['endPoint'][0]) / 2)), int(round((e1['majorAxe']['startPoint'][1] + e2['majorAxe']['endPoint'][1]) / 2)))
-            MALength = MALength1
-            slope = (e1['majorAxe']['startPoint'][1] - e2['majorAxe']['endPoint'][1]) / (e2['majorAxe']['endPoint'][0] - e1['majorAxe']['startPoint'][0])
-            angle = np.arctan(slope) * 180 / np.pi
-            majorAxe = {'startPoint': e1['majorAxe']['startPoint'], 'endPoint': e2['majorAxe']['endPoint']}
+
+    #為第[index]組的橢圓[group]建立中心點Y座標為[centerYs]的補的橢圓。
+    def _createCompensatedEllipses(self, group, index, centerYs):
+        ellipses = np.zeros(len(centerYs), dtype = ELLIPSE_DTYPE)
+        #補的橢圓的中心點座標。X座標為該組橢圓的平均中心點X座標。
+        ellipses['centerX'] = self._groupMeanCenterXs[index]
+        ellipses['centerY'] = centerYs
+        #補的橢圓的短軸長度，為該組橢圓的平均短軸長度。
+        maLength = np.mean(group['minorAxis'])
+        #補的橢圓的長軸長度，為該組橢圓的平均長軸長度。
+        MALength = np.mean(group['majorAxis'])
+        ellipses['minorAxis'] = min(maLength, MALength)
+        ellipses['majorAxis'] = max(maLength, MALength)
+        #補的橢圓的斜率。
+        ellipses['slope'] = np.mean(group['slope'])
+        #補的橢圓的角度。
+        angle = np.mean(group['lineAngle'])
+        ellipses['lineAngle'] = angle
+        ellipses['angle'] = 90 - angle
+        newAngle = 90 - angle
+        if newAngle > 90:
+            newAngle = newAngle - 90
         else:
-            center = (int(round((e1['majorAxe']['endPoint'][0] + e2['majorAxe']['startPoint'][0]) / 2)), int(round((e1['majorAxe']['endPoint'][1] + e2['majorAxe']['startPoint'][1]) / 2)))
-            MALength = MALength2
-            slope = (e2['majorAxe']['startPoint'][1] - e1['majorAxe']['endPoint'][1]) / (e1['majorAxe']['endPoint'][0] - e2['majorAxe']['startPoint'][0])
-            angle = np.arctan(slope) * 180 / np.pi
-            majorAxe = {'startPoint': e2['majorAxe']['startPoint'], 'endPoint': e1['majorAxe']['endPoint']}
-        return ({'ellipse': (center, (maLength, MALength), 90 - angle), 'majorAxe': majorAxe}, (majorAxe['startPoint'], majorAxe['endPoint']), slope, angle)
-    
-    #計算將圖片上的一點[point]以影像中心為錨點旋轉[angle]角度後的新座標。
-    def _rotatePointAroundImageCenter(self, point, angle):
-        originalX, originalY = point
+            newAngle = newAngle + 90
+        #補的橢圓的長軸起點。
+        ellipses['startX'] = np.rint(ellipses['centerX'] + (MALength / 2) * np.cos(np.radians(newAngle)))
+        ellipses['startY'] = np.rint(ellipses['centerY'] + (MALength / 2) * np.sin(np.radians(newAngle)))
+        #補的橢圓的長軸終點。
+        ellipses['endX'] = np.rint(ellipses['centerX'] + (MALength / 2) * np.cos(np.radians(newAngle + 180)))
+        ellipses['endY'] = np.rint(ellipses['centerY'] + (MALength / 2) * np.sin(np.radians(newAngle + 180)))
+        ellipses['compensated'] = True
+        return ellipses
+
+    #將橢圓表[e1]與[e2]中位置相同的兩個橢圓合併。
+    def _createCombinedEllipses(self, e1, e2):
+        combined = np.zeros(len(e1), dtype = ELLIPSE_DTYPE)
+        maLength = (e1['minorAxis'] + e2['minorAxis']) / 2
+        MALength1 = np.sqrt((e1['startX'] - e2['endX']) ** 2 + (e1['startY'] - e2['endY']) ** 2)
+        MALength2 = np.sqrt((e1['endX'] - e2['startX']) ** 2 + (e1['endY'] - e2['startY']) ** 2)
+        #以e1的長軸起點與e2的長軸終點相連，或以e2的長軸起點與e1的長軸終點相連，取較長者為新的長軸。
+        useFirst = MALength1 > MALength2
+        combined['startX'] = np.where(useFirst, e1['startX'], e2['startX'])
+        combined['startY'] = np.where(useFirst, e1['startY'], e2['startY'])
+        combined['endX'] = np.where(useFirst, e2['endX'], e1['endX'])
+        combined['endY'] = np.where(useFirst, e2['endY'], e1['endY'])
+        MALength = np.where(useFirst, MALength1, MALength2)
+        combined['centerX'] = np.rint((combined['startX'] + combined['endX']) / 2)
+        combined['centerY'] = np.rint((combined['startY'] + combined['endY']) / 2)
+        combined['minorAxis'] = np.minimum(maLength, MALength)
+        combined['majorAxis'] = np.maximum(maLength, MALength)
+        combined['area'] = (combined['minorAxis'] / 2) * (combined['majorAxis'] / 2) * np.pi
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            combined['slope'] = (combined['startY'] - combined['endY']) / (combined['endX'] - combined['startX'])
+        combined['lineAngle'] = np.arctan(combined['slope']) * 180 / np.pi
+        combined['angle'] = 90 - combined['lineAngle']
+        return combined
+
+    #將[groupedEllipses]橢圓表轉為代表斜紋的直線（補的斜紋會多帶一個True），與該線的斜率與角度。
+    def _toLinesSlopesAndAngles(self, groupedEllipses):
+        groupedLines = []
+        groupedSlopes = []
+        groupedAngles = []
+        for group in groupedEllipses:
+            groupedLines.append([((sx, sy), (ex, ey), True) if compensated else ((sx, sy), (ex, ey)) for sx, sy, ex, ey, compensated in zip(group['startX'].tolist(), group['startY'].tolist(), group['endX'].tolist(), group['endY'].tolist(), group['compensated'].tolist())])
+            groupedSlopes.append(group['slope'].tolist())
+            groupedAngles.append(group['lineAngle'].tolist())
+        return (groupedLines, groupedSlopes, groupedAngles)
+
+    #計算將圖片上的點[xs], [ys]以影像中心為錨點旋轉[angle]角度後的新座標。
+    def _rotatePointsAroundImageCenter(self, xs, ys, angle):
         imageCenterX = int(round(self._frame.shape[1] / 2))
         imageCenterY = int(round(self._frame.shape[0] / 2))
-        originalX -= imageCenterX
-        originalY -= imageCenterY
+        originalXs = xs - imageCenterX
+        originalYs = ys - imageCenterY
         angle = angle * np.pi / 180
-        rotatedX = int(round(originalX * np.cos(angle) - originalY * np.sin(angle))) + imageCenterX
-        rotatedY = int(round(originalX * np.sin(angle) + originalY * np.cos(angle))) + imageCenterY
-        return (rotatedX, rotatedY)
-        
-        
-        
-        
-        
-        
-        
+        rotatedXs = np.rint(originalXs * np.cos(angle) - originalYs * np.sin(angle)).astype(np.int64) + imageCenterX
+        rotatedYs = np.rint(originalXs * np.sin(angle) + originalYs * np.cos(angle)).astype(np.int64) + imageCenterY
+        return (rotatedXs, rotatedYs)
+
+    #將從[start]到現在的耗時（毫秒）累加到[frameStats]中的[stage]階段，並回傳現在的時間。未收集統計資料時不做任何事。
+    def _lap(self, frameStats, stage, start):
+        if frameStats is None:
+            return start
+        now = time.perf_counter()
+        frameStats['stages'][stage] = frameStats['stages'].get(stage, 0.0) + (now - start) * 1000
+        return now
+
+#findGroupedEllipses 收集統計資料時的回傳結果，為分組橢圓的list，並帶有該幀的統計資料[stats]。
+class _GroupedEllipses(list):
+    def __init__(self, groupedEllipses, stats):
+        super().__init__(groupedEllipses)
+        self.stats = stats
@@ -0,0 +1,95 @@
+import glob
+import os
+import numpy as np
+
+#斜紋表的欄位。每一列代表一幀中的一條斜紋，包含第幾幀、第幾條鋼纜、斜紋起點與終點，以及是否為補的斜紋。
+LINE_DTYPE = np.dtype([
+    ('frame', np.int32),
+    ('cable', np.uint8),
+    ('startX', np.int16),
+    ('startY', np.int16),
+    ('endX', np.int16),
+    ('endY', np.int16),
+    ('compensated', np.bool_),
+])
+
+class LineStore:
+    '''
+    將每一幀的斜紋依序寫入資料夾[folder]中的斜紋表，每[chunkSize]列存成一個 .npy 檔，記憶體中最多只保留一個區塊。
+    讀取時以記憶體映射（memory map）開啟各區塊，不需將整份斜紋表載入記憶體。
+    '''
+    def __init__(self, folder, chunkSize = 1 << 16):
+        #存放斜紋表的資料夾。
+        self._folder = folder
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        #清除資料夾中之前留下的斜紋表。
+        for path in glob.glob(os.path.join(folder, 'lines_*.npy')):
+            os.remove(path)
+        #尚未寫入檔案的斜紋。
+        self._buffer = np.zeros(chunkSize, dtype = LINE_DTYPE)
+        #尚未寫入檔案的斜紋數量。
+        self._nBuffered = 0
+        #已寫入的區塊數量。
+        self._nChunks = 0
+        #已加入的幀數。
+        self._nFrames = 0
+        #鋼纜數量。
+        self._nGroup = 0
+
+    #已加入的幀數。
+    def nFrames(self):
+        return self._nFrames
+
+    #鋼纜數量。
+    def nGroup(self):
+        return self._nGroup
+
+    #加入一幀的斜紋[groupedLines]，每組為一條鋼纜上的斜紋，補的斜紋多一個元素。回傳該幀在斜紋表中的列。
+    def append(self, groupedLines):
+        self._nGroup = max(self._nGroup, len(groupedLines))
+        rows = [(self._nFrames, index, line[0][0], line[0][1], line[1][0], line[1][1], len(line) == 3) for index, group in enumerate(groupedLines) for line in group]
+        self._nFrames += 1
+        rows = np.array(rows, dtype = LINE_DTYPE)
+        remaining = rows
+        while len(remaining) > 0:
+            n = min(len(remaining), len(self._buffer) - self._nBuffered)
+            self._buffer[self._nBuffered:self._nBuffered + n] = remaining[:n]
+            self._nBuffered += n
+            remaining = remaining[n:]
+            if self._nBuffered == len(self._buffer):
+                self.flush()
+        return rows
+
+    #將尚未寫入檔案的斜紋寫成一個區塊。
+    def flush(self):
+        if self._nBuffered == 0:
+            return
+        np.save(self._chunkPath(self._nChunks), self._buffer[:self._nBuffered])
+        self._nChunks += 1
+        self._nBuffered = 0
+
+    #依序回傳斜紋表的每個區塊。已寫入檔案的區塊以記憶體映射開啟，尚未寫入的部分則直接回傳。
+    def chunks(self):
+        for i in range(0, self._nChunks):
+            yield np.load(self._chunkPath(i), mmap_mode = 'r')
+        if self._nBuffered > 0:
+            yield self._buffer[:self._nBuffered]
+
+    #存成檢查點時只保留尚未寫入檔案的斜紋，不保留整個緩衝區。之後寫入的區塊會從檢查點當時的區塊編號繼續，覆蓋中斷前多寫的區塊。
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_buffer'] = self._buffer[:self._nBuffered].copy()
+        state['_chunkSize'] = len(self._buffer)
+        return state
+
+    def __setstate__(self, state):
+        buffered = state.pop('_buffer')
+        chunkSize = state.pop('_chunkSize')
+        self.__dict__.update(state)
+        self._buffer = np.zeros(chunkSize, dtype = LINE_DTYPE)
+        self._buffer[:len(buffered)] = buffered
+
+    #第[i]個區塊的檔案路徑。
+    def _chunkPath(self, i):
+        return os.path.join(self._folder, 'lines_{:06d}.npy'.format(i))
@@ -1,5 +1,4 @@
 from collections import OrderedDict
-from scipy.spatial import distance as dist
 import numpy as np
 from utils import Utils
 
@@ -19,6 +18,8 @@ class LineTracker:
         self._groupedLines = [OrderedDict() for i in range(0, self._nGroup)]   
         #每組被追蹤中的斜紋已消失了幾幀。
         self._groupedDisappears = [OrderedDict() for i in range(0, self._nGroup)] 
+        #上一次追蹤時，每個被對應到的斜紋中心點在Y方向上的位移量。
+        self._displacements = []
     
     #將斜紋[line]註冊到第[index]組，開始追蹤它。
     def _register(self, index, line):
@@ -31,13 +32,14 @@ class LineTracker:
         del self._groupedLines[index][lineId]
         del self._groupedDisappears[index][lineId]
         
-    #透過斜紋的中心點在幀與幀間的變化來追蹤斜紋。
-    def track(self, groupedLines):
+    #透過斜紋的中心點在幀與幀間的變化來追蹤斜紋。[nFrames]為距離上次追蹤經過的幀數，跳幀偵測時斜紋已消失的幀數以實際經過的幀數計算。
+    def track(self, groupedLines, nFrames = 1):
+        self._displacements = []
         #沒有辨識到任何斜紋的情況，將所有現有斜紋的disappear加一，加完後若超過maxDisappear則取消註冊該斜紋。
         if sum([len(group) for group in groupedLines]) == 0:
             for index, lineIds in enumerate([list(d.keys()) for d in self._groupedDisappears]):
                 for lineId in lineIds:
-                    self._groupedDisappears[index][lineId] += 1
+                    self._groupedDisappears[index][lineId] += nFrames
                     if self._groupedDisappears[index][lineId] > self._maxDisappear:
                         self._deregister(index ,lineId)
             return self._groupedLines
@@ -70,8 +72,9 @@ class LineTracker:
             #如沒有辨識到任何屬於這組的新斜紋，則不處理這組。
             if len(centroids) == 0:
                 continue
-            #計算舊斜紋與新斜紋中心點之間的距離矩陣。
-            D = dist.cdist(np.array(centroids), [Utils.getLineCentroid(l) for l in groupedLines[index]])
+            #計算舊斜紋與新斜紋中心點之間的距離矩陣。中心點只有兩個維度，直接以 numpy 計算，不需載入 scipy。
+            D = np.array(centroids, dtype = np.float64)[:, None, :] - np.array([Utils.getLineCentroid(l) for l in groupedLines[index]], dtype = np.float64).reshape(-1, 2)[None, :, :]
+            D = np.sqrt((D * D).sum(axis = 2))
             #將距離矩陣從左至右，由距離小到大排序。
             rows = D.min(axis = 1).argsort()
             cols = D.argmin(axis = 1)[rows]
@@ -82,6 +85,7 @@ class LineTracker:
                 if row in usedRows or col in usedCols:
                     continue
                 lineId = lineIds[row]
+                self._displacements.append(abs(Utils.getLineCentroid(groupedLines[index][col])[1] - centroids[row][1]))
                 self._groupedLines[index][lineId] = groupedLines[index][col]
                 self._groupedDisappears[index][lineId] = 0
                 usedRows.add(row)
@@ -91,8 +95,8 @@ class LineTracker:
             #尚未處理到的舊斜紋（沒有新斜紋與其對應）。
             for row in unusedRows:
                 lineId = lineIds[row]
-                #將該斜紋已消失的幀數加一。
-                self._groupedDisappears[index][lineId] += 1
+                #將該斜紋已消失的幀數加上經過的幀數。
+                self._groupedDisappears[index][lineId] += nFrames
                 #如果該斜紋已消失的幀數超過maxDisappear，則取消追蹤它。
                 if self._groupedDisappears[index][lineId] > self._maxDisappear:
                     self._deregister(index, lineId)
@@ -104,4 +108,8 @@ class LineTracker:
                 for col in unusedCols:
                     if (self._upward and Utils.getLineCentroid(groupedLines[index][col])[1] > self._borderY) or (not self._upward and Utils.getLineCentroid(groupedLines[index][col])[1] < self._borderY): 
                         self._register(index, groupedLines[index][col])
-        return self._groupedLines
\ No newline at end of file
+        return self._groupedLines
+
+    #上一次追蹤時，每個被對應到的斜紋中心點在Y方向上的位移量。
+    def getDisplacements(self):
+        return self._displacements
@@ -1,13 +1,102 @@
-from runner import Runner
-
-inputFile = '/Users/mac/Desktop/01(U).avi'
-runner = Runner(inputFile)
-runner.run()
-
-
-
-
-
-
+import argparse
+import os
+import time
+from frame_source import FrameSource
 
+parser = argparse.ArgumentParser(description = '辨識鋼纜上的斜紋並計數。')
+#要處理的影片或圖片，可以是檔案路徑、資料夾或萬用字元（glob），也可以是攝影機編號、只有圖片的資料夾（圖片序列）或代表標準輸入的'-'。
+parser.add_argument('inputs', nargs = '+')
+#不顯示視窗，使用多個行程批次處理所有影片。
+parser.add_argument('--headless', action = 'store_true')
+#批次處理時同時處理影片的行程數量。
+parser.add_argument('--processes', type = int, default = None)
+#每個行程中偵測斜紋的執行緒數量。
+parser.add_argument('--threads', type = int, default = None)
+#批次處理時結果的輸出資料夾。
+parser.add_argument('--output', default = 'Result')
+#只處理鋼纜所在的區域：union 為涵蓋所有鋼纜的區域，lanes 為每條鋼纜各自的區域。
+parser.add_argument('--roi', choices = ['union', 'lanes'], default = None)
+#只處理界線上下多少像素內的區域。
+parser.add_argument('--roi-vertical-margin', type = int, default = None)
+#依照斜紋移動的速度跳過部分幀不偵測。跳過幾幀由前一幀的追蹤結果決定，所以一次只偵測一幀，--threads 不會加快偵測。
+parser.add_argument('--adaptive-sampling', action = 'store_true')
+#以等速度預測斜紋位置，並以線性指派配對新舊斜紋。
+parser.add_argument('--predictive-tracking', action = 'store_true')
+#將斜紋偵測每一幀各處理階段的耗時、數量與被捨棄的原因輸出到結果資料夾。
+parser.add_argument('--stats', action = 'store_true')
+#最多暫存幾幀已讀取但尚未偵測的幀。
+parser.add_argument('--buffer-size', type = int, default = 32)
+#暫存的幀已滿時的處理方式，未指定時攝影機為 drop-oldest，其餘（包含標準輸入）為 block。
+parser.add_argument('--drop-policy', choices = ['block', 'drop-oldest', 'drop-newest'], default = None)
+#標準輸入的畫面大小，格式為 寬x高，例如 1920x1080。
+parser.add_argument('--frame-size', type = lambda s: tuple(int(v) for v in s.lower().split('x')), default = None)
+#圖片序列與標準輸入每秒的幀數。
+parser.add_argument('--fps', type = float, default = None)
+#每處理幾幀就將進度存到結果資料夾的檢查點。
+parser.add_argument('--checkpoint-interval', type = int, default = None)
+#從結果資料夾中的檢查點繼續處理，沒有檢查點時從頭開始。
+parser.add_argument('--resume', action = 'store_true')
+#在讀取時就將畫面轉為灰階，減少記憶體用量，但標記結果的畫面也會是灰階。
+parser.add_argument('--grayscale', action = 'store_true')
+#將標記好的畫面寫成結果資料夾中的影片 annotated.mp4。
+parser.add_argument('--annotated-video', action = 'store_true')
+#寫成影片時畫面縮放的比例。
+parser.add_argument('--video-scale', type = float, default = 1.0)
+#寫成影片時每幾幀寫入一幀。
+parser.add_argument('--video-every', type = int, default = 1)
+#邊處理邊將每一幀的平均斜率、角度與越過界線的斜紋輸出到結果資料夾。
+parser.add_argument('--export', choices = ['csv', 'parquet'], default = None)
+#只計數，不累計平均斜率也不畫圖表，不載入 matplotlib。
+parser.add_argument('--count-only', action = 'store_true')
+#偵測斜紋時影像縮放的比例，例如 4K 影片使用 0.5 可大幅減少偵測時間。
+parser.add_argument('--detection-scale', type = float, default = 1.0)
+#縮放偵測時，界線上下仍以原始解析度偵測的範圍（像素）。
+parser.add_argument('--refine-margin', type = int, default = None)
+#估計橢圓的方式：對每個輪廓適配橢圓，或以每個區塊的二階矩一次估計所有橢圓。
+parser.add_argument('--ellipse-fitting', choices = ['contour', 'moments'], default = 'contour')
+#偵測斜紋使用的離群值上下界改為跨幀平滑的估計值，值為每幀微調的幅度。
+parser.add_argument('--temporal-smoothing', type = float, default = None)
+#跨幀平滑時，每幾幀重新計算一次離群值上下界。
+parser.add_argument('--reestimate-interval', type = int, default = 30)
+#將每部影片分成幾段，由多個行程同時處理後再合併結果。
+parser.add_argument('--chunks', type = int, default = None)
+#分段處理時，每段開始前額外處理的幀數。
+parser.add_argument('--chunk-overlap', type = int, default = 60)
+args = parser.parse_args()
+#分段處理時不會輸出統計資料、每一幀的結果與標記好的影片，也不支援檢查點與跨幀平滑。讀取時固定轉為灰階，所以可以指定 --grayscale。
+if args.chunks is not None:
+    unsupported = [flag for flag, used in [('--stats', args.stats), ('--export', args.export is not None), ('--annotated-video', args.annotated_video), ('--checkpoint-interval', args.checkpoint_interval is not None), ('--resume', args.resume), ('--temporal-smoothing', args.temporal_smoothing is not None)] if used]
+    if len(unsupported) > 0:
+        parser.error('{} can not be used with --chunks.'.format(', '.join(unsupported)))
 
+runnerOptions = dict(roiMode = args.roi, roiVerticalMargin = args.roi_vertical_margin, adaptiveSampling = args.adaptive_sampling, predictiveTracking = args.predictive_tracking, stats = args.stats, checkpointInterval = args.checkpoint_interval, resume = args.resume, grayscale = args.grayscale, annotatedVideo = args.annotated_video, videoScale = args.video_scale, videoEveryNth = args.video_every, exportFormat = args.export, countOnly = args.count_only, detectionScale = args.detection_scale, refineMargin = args.refine_margin, ellipseFitting = args.ellipse_fitting, temporalSmoothing = args.temporal_smoothing, reestimateInterval = args.reestimate_interval)
+streamOptions = dict(bufferSize = args.buffer_size, dropPolicy = args.drop_policy, frameSize = args.frame_size, fps = args.fps)
+if args.chunks is not None:
+    from batch_runner import BatchRunner
+    from chunked_runner import ChunkedRunner
+    results = []
+    for inputFile in BatchRunner.expandInputs(args.inputs):
+        start = time.monotonic()
+        outputFolder = os.path.join(args.output, os.path.splitext(os.path.basename(inputFile))[0])
+        counts, compensateCounts, nFrames = ChunkedRunner(inputFile, nChunks = args.chunks, overlap = args.chunk_overlap, nThreads = args.threads, outputFolder = outputFolder, roiMode = args.roi, roiVerticalMargin = args.roi_vertical_margin, adaptiveSampling = args.adaptive_sampling, predictiveTracking = args.predictive_tracking, countOnly = args.count_only, detectionScale = args.detection_scale, refineMargin = args.refine_margin, ellipseFitting = args.ellipse_fitting, temporalSmoothing = args.temporal_smoothing, reestimateInterval = args.reestimate_interval).run()
+        results.append({'inputFile': inputFile, 'counts': counts, 'compensateCounts': compensateCounts, 'nFrames': nFrames, 'seconds': time.monotonic() - start, 'error': None})
+    print(BatchRunner.summary(results))
+elif args.headless:
+    from runner import Runner
+    from batch_runner import BatchRunner
+    #攝影機、圖片序列與標準輸入在目前的行程中依序處理，結果輸出到以其命名的資料夾。
+    for inputFile in [i for i in args.inputs if FrameSource.isStream(i)]:
+        name = 'stdin' if inputFile == '-' else ('camera{}'.format(inputFile) if inputFile.isdigit() else os.path.basename(os.path.normpath(inputFile)))
+        counts, compensateCounts, nFrames = Runner(inputFile, nWorkers = args.threads, headless = True, outputFolder = os.path.join(args.output, name), **runnerOptions, **streamOptions).run()
+        print('{}: {} ({} frames)'.format(inputFile, '/'.join(str(c) for c in counts), nFrames))
+    videoInputs = [i for i in args.inputs if not FrameSource.isStream(i)]
+    if len(videoInputs) > 0:
+        batchRunner = BatchRunner(videoInputs, outputRoot = args.output, nProcesses = args.processes, nThreads = args.threads, **runnerOptions, bufferSize = args.buffer_size, dropPolicy = args.drop_policy)
+        print(BatchRunner.summary(batchRunner.run()))
+else:
+    from runner import Runner
+    for inputFile in args.inputs:
+        #使用檢查點時，結果固定輸出到以影片檔名命名的資料夾，才能從同一個資料夾繼續處理。
+        outputFolder = os.path.join(args.output, os.path.splitext(os.path.basename(inputFile))[0]) if args.checkpoint_interval is not None or args.resume else None
+        runner = Runner(inputFile, nWorkers = args.threads, outputFolder = outputFolder, **runnerOptions, **streamOptions)
+        runner.run()
@@ -0,0 +1,154 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial import distance as dist
+
+class PredictiveLineTracker:
+    '''
+    與 LineTracker 介面相同的斜紋追蹤器。每條斜紋以等速度預測其在這一幀的位置，再以線性指派（Linear Assignment）找出與預測位置總距離最小的對應方式。
+    距離超過門檻的配對不會被採用；門檻為[gateDistance]像素，為None時為這一幀同組相鄰斜紋間距中位數的[gateFraction]倍。
+    [smoothing]為更新速度時新量測結果所佔的比重。斜紋狀態以陣列儲存，每組一份。
+    鋼纜速度尚未得知時，以鋼纜移動方向上新舊斜紋Y座標差最多斜紋一致的值作為初始速度，所以相隔幾幀間的移動距離只要小於相鄰斜紋間距即可正確配對。
+    '''
+    def __init__(self, nGroup, borderY = None, upward = True, maxDisappear = 5, gateDistance = None, gateFraction = 0.5, smoothing = 0.5):
+        #鋼纜數量。
+        self._nGroup = nGroup
+        #界線的位置。
+        self._borderY = borderY
+        #鋼纜移動方向。
+        self._upward = upward
+        #斜紋最多能消失幾幀還能繼續被追蹤。
+        self._maxDisappear = maxDisappear
+        #配對距離的固定門檻。
+        self._gateDistance = gateDistance
+        #配對距離的門檻為相鄰斜紋間距中位數的幾倍。
+        self._gateFraction = gateFraction
+        #更新速度時新量測結果所佔的比重。
+        self._smoothing = smoothing
+        #每組提供給新被追蹤的斜紋的Id。
+        self._nextLineIds = [0] * self._nGroup
+        #每組被追蹤中的斜紋的Id。
+        self._ids = [np.zeros(0, dtype = np.int64) for i in range(0, self._nGroup)]
+        #每組被追蹤中的斜紋。
+        self._lines = [[] for i in range(0, self._nGroup)]
+        #每組被追蹤中的斜紋最後一次被看到時的中心點。
+        self._centroids = [np.zeros((0, 2)) for i in range(0, self._nGroup)]
+        #每組被追蹤中的斜紋的速度（像素/幀）。
+        self._velocities = [np.zeros((0, 2)) for i in range(0, self._nGroup)]
+        #每組被追蹤中的斜紋已消失了幾幀。
+        self._disappears = [np.zeros(0, dtype = np.int64) for i in range(0, self._nGroup)]
+        #每組鋼纜的速度，給新註冊的斜紋作為初始速度。
+        self._groupVelocities = np.zeros((self._nGroup, 2))
+        #每組鋼纜的速度是否已得知。
+        self._hasGroupVelocities = [False] * self._nGroup
+        #上一次追蹤時，每個被對應到的斜紋中心點在Y方向上的位移量。
+        self._displacements = []
+
+    '''
+    追蹤這一幀的斜紋[groupedLines]，[nFrames]為距離上次追蹤經過的幀數。
+    回傳每組被追蹤中的斜紋，每組為以Id對應斜紋的dict。
+    '''
+    def track(self, groupedLines, nFrames = 1):
+        self._displacements = []
+        for index, lines in enumerate(groupedLines):
+            self._trackGroup(index, list(lines), nFrames)
+        return [dict(zip(self._ids[index].tolist(), self._lines[index])) for index in range(0, self._nGroup)]
+
+    #上一次追蹤時，每個被對應到的斜紋中心點在Y方向上的位移量。
+    def getDisplacements(self):
+        return self._displacements
+
+    #追蹤第[index]組的新斜紋[lines]。
+    def _trackGroup(self, index, lines, nFrames):
+        #新斜紋的中心點。
+        centroids = self._centroidsOf(lines)
+        nOld = len(self._ids[index])
+        rows = cols = np.zeros(0, dtype = np.int64)
+        if nOld > 0 and len(lines) > 0:
+            gate = self._gate(centroids)
+            #鋼纜速度尚未得知時，先估計鋼纜的速度作為所有斜紋的速度。
+            if not self._hasGroupVelocities[index]:
+                self._velocities[index][:, 1] = self._estimateShift(self._centroids[index][:, 1], centroids[:, 1], gate) / nFrames
+            #以等速度預測舊斜紋在這一幀的位置。已消失的斜紋從最後一次被看到後已經過更多幀。
+            elapsed = (self._disappears[index] + nFrames)[:, None]
+            predicted = self._centroids[index] + self._velocities[index] * elapsed
+            #計算預測位置與新斜紋中心點之間的距離矩陣，超過門檻的配對視為不可能。
+            D = dist.cdist(predicted, centroids)
+            rows, cols = linear_sum_assignment(np.where(D > gate, gate * 1e3 + D, D))
+            valid = D[rows, cols] <= gate
+            rows, cols = rows[valid], cols[valid]
+            #更新被對應到的舊斜紋。
+            if len(rows) > 0:
+                seen = self._disappears[index][rows] == 0
+                self._displacements.extend(np.abs(centroids[cols[seen], 1] - self._centroids[index][rows[seen], 1]).tolist())
+                velocities = (centroids[cols] - self._centroids[index][rows]) / elapsed[rows]
+                self._velocities[index][rows] = self._smoothing * velocities + (1 - self._smoothing) * self._velocities[index][rows]
+                self._groupVelocities[index] = np.median(self._velocities[index][rows], axis = 0)
+                self._hasGroupVelocities[index] = True
+                self._centroids[index][rows] = centroids[cols]
+                self._disappears[index][rows] = 0
+                for row, col in zip(rows, cols):
+                    self._lines[index][row] = lines[col]
+        #尚未處理到的舊斜紋（沒有新斜紋與其對應）的消失幀數加上經過的幀數，超過maxDisappear則取消追蹤它。
+        unusedRows = np.ones(nOld, dtype = bool)
+        unusedRows[rows] = False
+        self._disappears[index][unusedRows] += nFrames
+        self._keep(index, self._disappears[index] <= self._maxDisappear)
+        #尚未處理到的新斜紋（沒有舊斜紋與其對應），只註冊尚未超過界線的斜紋。
+        unusedCols = np.ones(len(lines), dtype = bool)
+        unusedCols[cols] = False
+        if self._borderY is not None and len(lines) > 0:
+            unusedCols &= (centroids[:, 1] > self._borderY) if self._upward else (centroids[:, 1] < self._borderY)
+        self._register(index, [lines[col] for col in np.flatnonzero(unusedCols)], centroids[unusedCols])
+
+    #將斜紋[lines]與其中心點[centroids]註冊到第[index]組，初始速度為該組鋼纜的速度。
+    def _register(self, index, lines, centroids):
+        if len(lines) == 0:
+            return
+        self._ids[index] = np.concatenate([self._ids[index], np.arange(self._nextLineIds[index], self._nextLineIds[index] + len(lines))])
+        self._nextLineIds[index] += len(lines)
+        self._lines[index].extend(lines)
+        self._centroids[index] = np.concatenate([self._centroids[index], centroids])
+        self._velocities[index] = np.concatenate([self._velocities[index], np.tile(self._groupVelocities[index], (len(lines), 1))])
+        self._disappears[index] = np.concatenate([self._disappears[index], np.zeros(len(lines), dtype = np.int64)])
+
+    #只保留第[index]組中[mask]為True的斜紋，其餘取消註冊。
+    def _keep(self, index, mask):
+        if mask.all():
+            return
+        self._ids[index] = self._ids[index][mask]
+        self._lines[index] = [l for l, m in zip(self._lines[index], mask) if m]
+        self._centroids[index] = self._centroids[index][mask]
+        self._velocities[index] = self._velocities[index][mask]
+        self._disappears[index] = self._disappears[index][mask]
+
+    '''
+    估計舊斜紋中心點Y座標[oldYs]到新斜紋中心點Y座標[newYs]的位移量。候選位移為所有新舊斜紋的Y座標差中，朝鋼纜移動方向且小於相鄰斜紋間距（門檻[gate]的兩倍）者，
+    取與最多其他候選位移相差不超過門檻一半的位移，相同時取移動距離較小者，再以與其相近的候選位移的中位數作為結果。
+    '''
+    def _estimateShift(self, oldYs, newYs, gate):
+        if not np.isfinite(gate):
+            return 0.0
+        shifts = (newYs[None, :] - oldYs[:, None]).ravel()
+        tolerance = gate / 2
+        shifts = shifts[(shifts > -2 * gate) & (shifts <= tolerance)] if self._upward else shifts[(shifts < 2 * gate) & (shifts >= -tolerance)]
+        if len(shifts) == 0:
+            return 0.0
+        shifts = shifts[np.argsort(np.abs(shifts), kind = 'stable')]
+        nInliers = (np.abs(shifts[:, None] - shifts[None, :]) <= tolerance).sum(axis = 1)
+        best = shifts[np.argmax(nInliers)]
+        return float(np.median(shifts[np.abs(shifts - best) <= tolerance]))
+
+    #配對距離的門檻。未指定固定門檻時，為新斜紋[centroids]中相鄰斜紋間距中位數的gateFraction倍；斜紋少於兩條時不設門檻。
+    def _gate(self, centroids):
+        if self._gateDistance is not None:
+            return self._gateDistance
+        gaps = np.diff(np.sort(centroids[:, 1]))
+        gaps = gaps[gaps > 0]
+        return self._gateFraction * np.median(gaps) if len(gaps) > 0 else np.inf
+
+    #斜紋[lines]的中心點，與 Utils.getLineCentroid 的結果相同。
+    def _centroidsOf(self, lines):
+        if len(lines) == 0:
+            return np.zeros((0, 2))
+        endPoints = np.array([(line[0][0], line[0][1], line[1][0], line[1][1]) for line in lines], dtype = np.float64)
+        return np.rint((endPoints[:, :2] + endPoints[:, 2:]) / 2)
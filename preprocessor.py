@@ -0,0 +1,78 @@
+import threading
+import cv2
+import numpy as np
+
+class Preprocessor:
+    '''
+    斜紋偵測的影像預處理：灰階、高斯模糊、二值化、Morphological Transformations 與 Canny 邊緣檢測。
+    每一步的輸出都寫入預先配置好的緩衝區，不需每一幀重新配置影像。緩衝區依照影像大小配置，且每個執行緒各自擁有一份，可在多個執行緒中同時使用。
+    回傳的影像為緩衝區本身，同一個執行緒下一次處理相同大小的影像時會被覆寫。[maxShapes]為每個執行緒最多保留幾種影像大小的緩衝區。
+    [scale]不為1時，先將影像縮放為該比例再處理，高斯模糊與 Morphological Transformations 的大小也依比例縮放，回傳的是縮放後的影像。
+    '''
+    def __init__(self, scale = 1.0, maxShapes = 8):
+        #影像縮放的比例。
+        self._scale = scale
+        #高斯模糊的大小，需為奇數。
+        blurSize = max(1, int(round(5 * scale)) | 1)
+        self._blurSize = (blurSize, blurSize)
+        #Morphological Transformations 使用的結構元素，只需建立一次。大小為偶數時結果會偏移半個像素，所以也需為奇數。
+        kernelSize = max(1, int(round(3 * scale)) | 1)
+        self._kernel = np.ones((kernelSize, kernelSize), np.uint8)
+        #每個執行緒各自的緩衝區。
+        self._local = threading.local()
+        #每個執行緒最多保留幾種影像大小的緩衝區。
+        self._maxShapes = maxShapes
+
+    #將原始影像[frame]進行預處理，[frame]可為BGR或已轉為灰階的影像。
+    def preprocess(self, frame):
+        if self._scale != 1.0:
+            frame = self._resize(frame)
+        gray, blur, threshold, morph, _ = self._buffers(frame.shape[:2])
+        #將原始圖片轉為灰階，以進行後續處理。已是灰階時直接使用。
+        if frame.ndim == 3:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst = gray)
+        else:
+            gray = frame
+        #使用高斯模糊消除圖片中的雜訊，避免其干擾後續辨識。
+        cv2.GaussianBlur(gray, self._blurSize, 0, dst = blur)
+        #將圖片進行二值化，突顯出要辨識的斜紋。
+        cv2.threshold(blur, 90, 255, cv2.THRESH_BINARY, dst = threshold)
+        #使用 Morphological Transformations 清楚分開每條斜紋。
+        cv2.morphologyEx(threshold, cv2.MORPH_OPEN, self._kernel, dst = morph)
+        return morph
+
+    #使用Canny邊緣檢測找出預處理後的影像[image]中斜紋的邊緣。
+    def canny(self, image):
+        edges = self._buffers(image.shape[:2])[4]
+        cv2.Canny(image, 100, 100, edges = edges, apertureSize = 3)
+        return edges
+
+    #將影像[frame]縮放為 scale 的比例，寫入目前執行緒的緩衝區。縮小時使用 INTER_AREA，細的斜紋不會因為取樣而斷掉。
+    def _resize(self, frame):
+        height = max(1, int(round(frame.shape[0] * self._scale)))
+        width = max(1, int(round(frame.shape[1] * self._scale)))
+        shape = (height, width) + frame.shape[2:]
+        resized = self._localBuffers(('resized',) + shape)
+        if resized is None:
+            resized = self._local.buffers[('resized',) + shape] = np.empty(shape, dtype = frame.dtype)
+        cv2.resize(frame, (width, height), dst = resized, interpolation = cv2.INTER_AREA)
+        return resized
+
+    #目前執行緒中大小為[shape]的緩衝區：灰階、模糊、二值化、Morphological Transformations 與邊緣的影像。
+    def _buffers(self, shape):
+        buffers = self._localBuffers(shape)
+        if buffers is None:
+            buffers = self._local.buffers[shape] = tuple(np.empty(shape, dtype = np.uint8) for i in range(0, 5))
+        return buffers
+
+    #目前執行緒中以[key]存放的緩衝區，尚未配置時回傳None。
+    def _localBuffers(self, key):
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        if key not in buffers:
+            #影像大小經常改變時（例如處理區域重新計算），清掉舊的緩衝區避免佔用過多記憶體。
+            if len(buffers) >= self._maxShapes:
+                buffers.clear()
+            return None
+        return buffers[key]
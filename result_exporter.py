@@ -0,0 +1,103 @@
+import csv
+import importlib.util
+import os
+import numpy as np
+
+#每一幀每條鋼纜的斜紋結果：第幾幀、時間（毫秒）、第幾條鋼纜、斜紋數量、平均斜率與平均角度。
+FRAME_COLUMNS = [('frame', 'int64'), ('msec', 'float64'), ('cable', 'int64'), ('nLines', 'int64'), ('meanSlope', 'float64'), ('meanAngle', 'float64')]
+#每條越過界線的斜紋：第幾幀、時間（毫秒）、第幾條鋼纜、斜紋Id與是否為補的斜紋。
+CROSSING_COLUMNS = [('frame', 'int64'), ('msec', 'float64'), ('cable', 'int64'), ('lineId', 'int64'), ('compensated', 'bool')]
+
+class ResultExporter:
+    '''
+    處理影片的同時，將每一幀每條鋼纜的平均斜率與角度，以及每條越過界線的斜紋依序寫入資料夾[folder]中的 frames 與 crossings 兩個表。
+    [fileFormat]為'csv'或'parquet'（需安裝 pyarrow），每累積[batchSize]列寫入一次，記憶體用量與影片長度無關。[suffix]會加在檔名之後，例如從檢查點繼續時另存一份。
+    '''
+    def __init__(self, folder, fileFormat = 'csv', batchSize = 4096, suffix = ''):
+        if fileFormat not in ('csv', 'parquet'):
+            raise Exception('Unknown export format: {}.'.format(fileFormat))
+        #只有輸出 Parquet 時才需要 pyarrow。
+        if fileFormat == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+            raise Exception('Exporting to Parquet requires pyarrow.')
+        #每一幀每條鋼纜的斜紋結果。
+        self._frames = _TableWriter(os.path.join(folder, 'frames{}.{}'.format(suffix, fileFormat)), FRAME_COLUMNS, fileFormat, batchSize)
+        #每條越過界線的斜紋。
+        self._crossings = _TableWriter(os.path.join(folder, 'crossings{}.{}'.format(suffix, fileFormat)), CROSSING_COLUMNS, fileFormat, batchSize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    #加入第[framePosition]幀（時間為[frameMsec]）每組斜紋的斜率[groupedSlopes]與角度[groupedAngles]。
+    def addFrame(self, framePosition, frameMsec, groupedSlopes, groupedAngles):
+        for index, (slopes, angles) in enumerate(zip(groupedSlopes, groupedAngles)):
+            meanSlope = float(np.mean(slopes)) if len(slopes) > 0 else float('nan')
+            meanAngle = float(np.mean(angles)) if len(angles) > 0 else float('nan')
+            self._frames.add((framePosition, frameMsec, index, len(slopes), meanSlope, meanAngle))
+
+    #加入第[framePosition]幀（時間為[frameMsec]）越過界線的斜紋[crossings]，為 LineCounter.crossings 的回傳結果。
+    def addCrossings(self, framePosition, frameMsec, crossings):
+        for index, lineId, compensated in crossings:
+            self._crossings.add((framePosition, frameMsec, index, lineId, compensated))
+
+    #寫入尚未寫入的列並關閉檔案。
+    def close(self):
+        self._frames.close()
+        self._crossings.close()
+
+class _TableWriter:
+    #將欄位為[columns]的列分批寫入檔案[path]，每累積[batchSize]列寫入一次。
+    def __init__(self, path, columns, fileFormat, batchSize):
+        #欄位名稱與型別。
+        self._columns = columns
+        #檔案格式。
+        self._fileFormat = fileFormat
+        #每累積幾列寫入一次。
+        self._batchSize = batchSize
+        #尚未寫入的列。
+        self._rows = []
+        #CSV 的檔案。
+        self._file = None
+        #寫入檔案的 csv.writer 或 ParquetWriter，關閉後為None。
+        self._writer = None
+        if fileFormat == 'csv':
+            self._file = open(path, 'w', encoding = 'utf-8', newline = '')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow([name for name, _ in columns])
+        else:
+            #只有輸出 Parquet 時才載入 pyarrow。
+            import pyarrow
+            import pyarrow.parquet
+            self._pyarrow = pyarrow
+            self._schema = pyarrow.schema([(name, pyarrow.from_numpy_dtype(np.dtype(dtype))) for name, dtype in columns])
+            self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def add(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self._batchSize:
+            self.flush()
+
+    #寫入尚未寫入的列。Parquet 每次寫入為一個 row group，讀取時可以只讀需要的欄位。
+    def flush(self):
+        if len(self._rows) == 0:
+            return
+        if self._fileFormat == 'csv':
+            self._writer.writerows(self._rows)
+            self._file.flush()
+        else:
+            columns = list(zip(*self._rows))
+            arrays = [self._pyarrow.array(np.array(values, dtype = dtype)) for (_, dtype), values in zip(self._columns, columns)]
+            self._writer.write_table(self._pyarrow.Table.from_arrays(arrays, schema = self._schema))
+        self._rows = []
+
+    def close(self):
+        if self._writer is None:
+            return
+        self.flush()
+        if self._fileFormat == 'csv':
+            self._file.close()
+        else:
+            self._writer.close()
+        self._writer = None
@@ -0,0 +1,123 @@
+import bisect
+import numpy as np
+
+class RobustStats:
+    '''
+    使用 Median Absolute Deviation(MAD) 方法檢測離群值時需要的中位數、MAD 與上下界。
+    '''
+    #[values]的中位數與 MAD，沒有任何值時皆為NaN。
+    @staticmethod
+    def medianAndMad(values):
+        if len(values) == 0:
+            return (np.nan, np.nan)
+        median = np.median(values)
+        return (median, np.median(np.abs(values - median)))
+
+    #[values]中不屬於離群值的上下界，為中位數減去[lowerFactor]倍的 MAD 與中位數加上[upperFactor]倍的 MAD。
+    @staticmethod
+    def bounds(values, lowerFactor, upperFactor):
+        median, mad = RobustStats.medianAndMad(values)
+        return (median - lowerFactor * mad, median + upperFactor * mad)
+
+class RunningRobustStats:
+    '''
+    會不斷加入新的值時，維持所有值的中位數與 MAD，結果與每次對所有值呼叫 RobustStats 相同。
+    值以排序好的方式存放，加入一個值只需二分搜尋與移動記憶體，中位數直接取中間的值，MAD 則由中位數兩側與中位數的差（兩個已排序的序列）以二分搜尋找出，不需每次重新排序。
+    '''
+    def __init__(self, values = ()):
+        #排序好的值，不包含NaN。
+        self._values = sorted(v for v in map(float, values) if v == v)
+        #NaN的數量。有NaN時中位數與 MAD 皆為NaN，與 np.median 相同。
+        self._nNan = len(values) - len(self._values)
+
+    #加入一個值[value]。
+    def add(self, value):
+        value = float(value)
+        if value != value:
+            self._nNan += 1
+            return
+        bisect.insort(self._values, value)
+
+    #目前所有值的中位數與 MAD，沒有任何值時皆為NaN。
+    def medianAndMad(self):
+        values = self._values
+        n = len(values)
+        if self._nNan > 0 or n == 0:
+            return (np.nan, np.nan)
+        median = values[n // 2] if n % 2 == 1 else (values[n // 2 - 1] + values[n // 2]) / 2
+        #中位數為無限大時，與中位數的差會出現NaN。
+        if median - median != 0:
+            return (median, np.nan)
+        #小於中位數的值與中位數的差，由近到遠為 median - values[split - 1 - i]；其餘的為 values[split + j] - median。
+        split = bisect.bisect_left(values, median)
+        nLeft = split
+        nRight = n - split
+        left = lambda i: median - values[split - 1 - i]
+        right = lambda j: values[split + j] - median
+        mad = self._kthSmallest(left, nLeft, right, nRight, (n - 1) // 2)
+        if n % 2 == 0:
+            mad = (mad + self._kthSmallest(left, nLeft, right, nRight, n // 2)) / 2
+        return (median, mad)
+
+    #目前所有值中不屬於離群值的上下界，詳見 RobustStats.bounds。
+    def bounds(self, lowerFactor, upperFactor):
+        median, mad = self.medianAndMad()
+        return (median - lowerFactor * mad, median + upperFactor * mad)
+
+    #兩個已排序的序列[left]（長度[nLeft]）與[right]（長度[nRight]）合併後第[k]小（從0開始）的值。二分搜尋要從[left]取幾個值。
+    @staticmethod
+    def _kthSmallest(left, nLeft, right, nRight, k):
+        lo, hi = max(0, k + 1 - nRight), min(k + 1, nLeft)
+        while lo < hi:
+            i = (lo + hi) // 2
+            #從 left 取 i 個時，left 的下一個值仍比 right 取到的最後一個值小，代表需要從 left 取更多。
+            if left(i) < right(k - i):
+                lo = i + 1
+            else:
+                hi = i
+        i = lo
+        j = k + 1 - i
+        return max(left(i - 1) if i > 0 else -np.inf, right(j - 1) if j > 0 else -np.inf)
+
+class SmoothedRobustStats:
+    '''
+    跨幀維持的中位數與 MAD 估計值，用於同一條鋼纜在相鄰幀間幾乎相同的統計量（例如橢圓面積、斜紋斜率與間距）。
+    每一幀只將估計值往該幀的值的方向微調：中位數依照大於與小於估計值的比例移動，MAD 依照與中位數的差大於與小於估計值的比例移動，不需排序。
+    每次移動的幅度為[alpha]倍的 MAD，所以單一幀的雜訊不會讓上下界大幅改變。第一次與每[reestimateInterval]幀以 RobustStats 重新計算一次，避免估計值偏移。
+    只使用有限的值，NaN與無限大會被忽略。
+    '''
+    def __init__(self, alpha = 0.1, reestimateInterval = 30):
+        #每幀微調的幅度。
+        self._alpha = alpha
+        #每幾幀重新計算一次。
+        self._reestimateInterval = reestimateInterval
+        #中位數與 MAD 的估計值，尚未有任何值時為None。
+        self._median = None
+        self._mad = None
+        #已更新的幀數。
+        self._nUpdates = 0
+
+    #以一幀的值[values]更新估計值。沒有任何值時不更新。
+    def update(self, values):
+        values = np.asarray(values, dtype = np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+        if self._median is None or self._nUpdates % self._reestimateInterval == 0:
+            self._median, self._mad = RobustStats.medianAndMad(values)
+        else:
+            step = self._alpha * self._mad
+            self._median += step * np.mean(np.sign(values - self._median))
+            self._mad += step * np.mean(np.sign(np.abs(values - self._median) - self._mad))
+        self._nUpdates += 1
+
+    #目前的中位數與 MAD，尚未有任何值時皆為NaN。
+    def medianAndMad(self):
+        if self._median is None:
+            return (np.nan, np.nan)
+        return (self._median, self._mad)
+
+    #目前不屬於離群值的上下界，詳見 RobustStats.bounds。
+    def bounds(self, lowerFactor, upperFactor):
+        median, mad = self.medianAndMad()
+        return (median - lowerFactor * mad, median + upperFactor * mad)
@@ -1,29 +1,96 @@
 import cv2
-import mimetypes
+import json
 import copy
-import xlsxwriter
 import os
-import string
+import sys
 import numpy as np
 from line_detector import LineDetector
+from detector_stats import DetectorStats
 from line_tracker import LineTracker
 from line_counter import LineCounter
+from frame_pipeline import FramePipeline
+from frame_source import FrameSource
+from checkpoint import Checkpoint
+from annotated_video_writer import AnnotatedVideoWriter
+from result_exporter import ResultExporter
+from frame_sampler import FrameSampler
+from line_store import LineStore
+from slope_aggregator import SlopeAggregator
 from utils import Utils
-from grapher import Grapher
 from datetime import datetime
 
 class Runner:
-    def __init__(self, inputFile):
+    '''
+    [inputFile]為影片或圖片路徑，也可以是攝影機編號、圖片序列的資料夾或代表標準輸入的'-'，詳見 FrameSource.open。
+    [frameSize]與[fps]為標準輸入的畫面大小 (寬, 高) 與圖片序列、標準輸入每秒的幀數。
+    [checkpointInterval]不為None時，每處理這麼多幀就將進度存到結果資料夾的檢查點，按下Q中途停止時也會存。[resume]為是否從結果資料夾中的檢查點繼續處理，需指定[outputFolder]。
+    [annotatedVideo]為是否將標記好的畫面寫成結果資料夾中的影片，[videoScale]與[videoEveryNth]為畫面縮放的比例與每幾幀寫入一幀，詳見 AnnotatedVideoWriter。
+    [exportFormat]不為None時，邊處理邊將每一幀的平均斜率、角度與越過界線的斜紋以該格式（'csv'或'parquet'）寫入結果資料夾，詳見 ResultExporter。
+    [countOnly]為是否只計數：不累計平均斜率也不畫圖表，不需載入 matplotlib，斜紋數量只輸出到結果資料夾的 counts.json。
+    [detectionScale]與[refineMargin]為偵測斜紋時影像縮放的比例，與界線上下仍以原始解析度偵測的範圍，[ellipseFitting]為估計橢圓的方式，詳見 LineDetector。
+    [temporalSmoothing]不為None時，偵測斜紋使用的離群值上下界改為跨幀平滑的估計值，每[reestimateInterval]幀重新計算一次，詳見 LineDetector。
+    '''
+    def __init__(self, inputFile, nWorkers = None, headless = False, outputFolder = None, roiMode = None, roiVerticalMargin = None, adaptiveSampling = False, predictiveTracking = False, stats = False, bufferSize = 32, dropPolicy = None, frameSize = None, fps = None, checkpointInterval = None, resume = False, grayscale = False, annotatedVideo = False, videoScale = 1.0, videoEveryNth = 1, exportFormat = None, countOnly = False, detectionScale = 1.0, refineMargin = None, ellipseFitting = 'contour', temporalSmoothing = None, reestimateInterval = 30):
         self._inputFile = inputFile
-            
+        #偵測斜紋的執行緒數量，預設為CPU核心數。
+        self._nWorkers = nWorkers
+        #是否在沒有視窗的情況下執行（不顯示畫面，圖表直接存檔）。
+        self._headless = headless
+        #輸出結果的資料夾，未指定時為 Result/<目前時間>。
+        self._outputFolder = outputFolder
+        #只處理鋼纜所在區域的模式與界線上下要處理的範圍，詳見 LineDetector。
+        self._roiMode = roiMode
+        self._roiVerticalMargin = roiVerticalMargin
+        #是否依照斜紋移動的速度跳過部分幀不偵測。
+        self._adaptiveSampling = adaptiveSampling
+        #是否使用以等速度預測斜紋位置並以線性指派配對的追蹤器。
+        self._predictiveTracking = predictiveTracking
+        #是否收集斜紋偵測器每一幀各處理階段的耗時與數量，並輸出到結果資料夾。
+        self._stats = stats
+        #最多暫存幾幀已讀取但尚未偵測的幀。
+        self._bufferSize = bufferSize
+        #暫存的幀已滿時的處理方式，詳見 FramePipeline。未指定時，攝影機捨棄最早讀取的幀，其餘（包含標準輸入）等待偵測跟上。
+        self._dropPolicy = dropPolicy
+        #標準輸入的畫面大小與每秒的幀數。
+        self._frameSize = frameSize
+        self._fps = fps
+        #每處理幾幀存一次檢查點，為None時不定期存。
+        self._checkpointInterval = checkpointInterval
+        #是否從檢查點繼續處理。
+        self._resume = resume
+        #是否在讀取時就將畫面轉為灰階，標記結果的畫面也會是灰階。
+        self._grayscale = grayscale
+        #是否將標記好的畫面寫成影片，以及畫面縮放的比例與每幾幀寫入一幀。
+        self._annotatedVideo = annotatedVideo
+        self._videoScale = videoScale
+        self._videoEveryNth = videoEveryNth
+        #輸出每一幀結果與越過界線的斜紋的格式，為None時不輸出。
+        self._exportFormat = exportFormat
+        #是否只計數，不累計平均斜率也不畫圖表。
+        self._countOnly = countOnly
+        #偵測斜紋時影像縮放的比例，與界線上下仍以原始解析度偵測的範圍。
+        self._detectionScale = detectionScale
+        self._refineMargin = refineMargin
+        #估計橢圓的方式。
+        self._ellipseFitting = ellipseFitting
+        #離群值上下界跨幀平滑的幅度與每幾幀重新計算一次。
+        self._temporalSmoothing = temporalSmoothing
+        self._reestimateInterval = reestimateInterval
+        if resume and outputFolder is None:
+            raise Exception('An output folder is required to resume from a checkpoint.')
+
+    #執行辨識。輸入為影片時回傳每組的斜紋數量、每組的斜紋補償數量與處理過的幀數。
     def run(self):
         if self._isVideo():
-            self._handleVideo()
+            return self._handleVideo()
         else:
             self._handleImage()
     
     #判斷輸入是否為影片。
     def _isVideo(self):
+        if FrameSource.isStream(self._inputFile):
+            return True
+        import mimetypes
         mimeType = mimetypes.guess_type(self._inputFile)[0]
         if mimeType is None:
             raise Exception('Can not identify input file type.')
@@ -35,28 +102,36 @@ class Runner:
         else:
             raise Exception('Input file must be image or video.')
     
-    #判斷影片為上行或下行。
-    def _isUpward(self):
+    #判斷影格來源[source]為上行或下行。讀取過的幀與其分組橢圓會依序存入[bufferedFrames]，讓後續處理直接重複使用，不需再讀取與偵測一次。
+    def _isUpward(self, source, bufferedFrames):
         #追蹤影片前十幀的斜紋，透過斜紋位置的改變得知為上行或下行。
-        #讀入影片。
-        video = cv2.VideoCapture(self._inputFile)
         nFrames = 10
-        #斜紋偵測器。
-        detector = LineDetector()
+        #斜紋偵測器。分組橢圓會被之後的偵測器重複使用，所以界線位置（界線附近以原始解析度偵測）與影像縮放等設定都與之後的偵測器相同。
+        #鋼纜移動方向此時未知，但其只影響 detect 中排序與補斜紋的方向，不影響 findGroupedEllipses 的結果。
+        #只處理部分區域的設定則不使用：判斷方向需要在整張影像中追蹤斜紋十幀，只處理界線附近時斜紋很快就會離開該區域。這十幀以整張影像偵測，與組數異常後重新找出鋼纜位置時相同，之後的偵測器再由這些幀得知要處理的區域。
+        detector = LineDetector(int(round(0.35 * source.size()[1])), scale = self._detectionScale, refineMargin = self._refineMargin, ellipseFitting = self._ellipseFitting, temporalSmoothing = self._temporalSmoothing, reestimateInterval = self._reestimateInterval)
         #斜紋追蹤器。
         tracker = None
         #第一幀的斜紋追蹤結果。
         firstFrameTrackedLines = None
-        #斜紋位置在Y方向上的變化量。
-        yOffset = None
+        #最後一幀的斜紋追蹤結果。
+        trackedLines = None
+        #有追蹤結果的幀數。
+        nTrackedFrames = 0
         while True:
             #讀取該幀。
-            ret, frame = video.read()
+            ret, frame = source.read()
             #如果該幀讀取異常，則終止迴圈。
             if not ret:
                 break
+            #該幀的位置與時間。
+            framePosition = source.position()
+            frameMsec = source.msec()
+            #找出該幀中分組好的橢圓，並暫存起來。
+            groupedEllipses = detector.findGroupedEllipses(frame)
+            bufferedFrames.append((frame, framePosition, frameMsec, groupedEllipses))
             #獲得斜紋偵測結果。
-            detectResult = detector.detect(frame)
+            detectResult = detector.detect(frame, groupedEllipses)
             if detectResult is not None:
                 #獲得斜紋、斜率、角度。
                 lines, _, _ = detectResult
@@ -65,99 +140,236 @@ class Runner:
                     tracker = LineTracker(len(lines))
                 #獲得斜紋追蹤器正在追蹤的斜紋。
                 trackedLines = tracker.track(lines)
-                if int(video.get(cv2.CAP_PROP_POS_FRAMES)) == 1:
+                nTrackedFrames += 1
+                if firstFrameTrackedLines is None:
                     firstFrameTrackedLines = copy.deepcopy(trackedLines)
-            if int(video.get(cv2.CAP_PROP_POS_FRAMES)) == nFrames + 1:
-                yOffset = Utils.getLineCentroid((trackedLines[0][0][0], trackedLines[0][0][1]))[1] - Utils.getLineCentroid((firstFrameTrackedLines[0][0][0], firstFrameTrackedLines[0][0][1]))[1]
+            if framePosition == nFrames + 1:
                 break
-        return yOffset < 0
+        #第一幀與最後一幀中都有追蹤到的斜紋在Y方向上的變化量。斜紋可能在這幾幀中離開畫面或暫時沒被偵測到，所以使用所有共同斜紋的中位數，而不是固定某一條斜紋。
+        yOffsets = []
+        if nTrackedFrames > 1:
+            for firstLines, lastLines in zip(firstFrameTrackedLines, trackedLines):
+                for lineId in firstLines.keys() & lastLines.keys():
+                    yOffsets.append(Utils.getLineCentroid(lastLines[lineId])[1] - Utils.getLineCentroid(firstLines[lineId])[1])
+        if len(yOffsets) == 0:
+            raise Exception('Can not determine the direction of the cables.')
+        return bool(np.median(yOffsets) < 0)
 
     #處理輸入為影片的情況。
     def _handleVideo(self):
-        #讀入影片。
-        video = cv2.VideoCapture(self._inputFile)
+        #開啟影格來源。
+        source = FrameSource.open(self._inputFile, frameSize = self._frameSize, fps = self._fps)
         #影片高。
-        frameHeight = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        #影片幀數。
-        frameNumber = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-        #鋼纜移動方向。
-        upward = self._isUpward()
+        frameHeight = source.size()[1]
+        #影片幀數，即時來源為0。
+        frameNumber = source.frameCount()
+        #暫存的幀已滿時的處理方式。標準輸入也可能是以管線傳入的檔案，捨棄幀會使計數錯誤，所以只有攝影機預設捨棄。
+        dropPolicy = self._dropPolicy if self._dropPolicy is not None else ('drop-oldest' if source.isLive() and self._inputFile != '-' else 'block')
+        #輸出結果的資料夾。
+        folder = self._resultFolder()
+        #處理進度的檢查點。
+        checkpoint = Checkpoint('{}/checkpoint.pkl'.format(folder)) if self._checkpointInterval is not None or self._resume else None
+        #檢查點中的狀態，不從檢查點繼續或沒有檢查點時為None。
+        state = checkpoint.load() if self._resume else None
+        if state is not None and (state['inputFile'] != os.path.basename(self._inputFile) or state['options'] != self._checkpointOptions()):
+            raise Exception('Checkpoint does not match the input file or options.')
+        #判斷鋼纜移動方向時讀取過的幀。
+        bufferedFrames = []
+        #鋼纜移動方向。從檢查點繼續時直接移到檢查點的位置。
+        if state is not None:
+            upward = state['upward']
+            source.seek(state['framePosition'])
+        else:
+            upward = self._isUpward(source, bufferedFrames)
         #界線的位置，為影片最上方往下 (0.35 * 影片高度)。
         borderY = int(round(0.35 * frameHeight))
+        #斜紋偵測器每一幀的統計資料，逐幀寫入結果資料夾。
+        detectorStats = DetectorStats(path = '{}/detector_stats.jsonl'.format(folder), append = state is not None) if self._stats else None
         #斜紋偵測器。
-        detector = LineDetector(borderY, upward = upward)
+        detector = LineDetector(borderY, upward = upward, roiMode = self._roiMode, roiVerticalMargin = self._roiVerticalMargin, stats = detectorStats, scale = self._detectionScale, refineMargin = self._refineMargin, ellipseFitting = self._ellipseFitting, temporalSmoothing = self._temporalSmoothing, reestimateInterval = self._reestimateInterval)
         #斜紋追蹤器。
         tracker = None
         #斜紋計數器。
         counter = None
         #每組的斜紋數量、每組的累積斜紋數量、每組的斜紋補償數量、每組的累積斜紋補償數量。
         counts, cumCounts, compensateCounts, cumCompensateCounts = (None, None, None, None)
-        #每組每一幀的斜紋。
-        cumLines = []
-        #一幀一幀的讀取影片。
-        while True:
-            #讀取該幀。
-            ret, frame = video.read()
-            #如果該幀讀取異常，則終止迴圈。
-            if not ret:
-                raise Exception('Can not properly read video frame.')
-                break
-            #獲得斜紋偵測結果。
-            detectResult = detector.detect(frame)
-            #如果能正常偵測，則進行後續的追蹤與計數，否則跳過這一幀。
-            if detectResult is not None:
-                #獲得斜紋、斜率、角度。
-                groupedLines, groupedSlopes, groupedAngles = detectResult
-                cumLines.append(groupedLines)
-                #初始化斜紋追蹤器。
-                if tracker is None:
-                    tracker = LineTracker(len(groupedLines), borderY = borderY, upward = upward)
-                #初始化斜紋計數器。
-                if counter is None:
-                    counter = LineCounter(len(groupedLines), borderY, upward = upward) 
-                #獲得斜紋追蹤器正在追蹤的斜紋。
-                trackedLines = tracker.track(groupedLines)
-                #透過斜紋計數器計算每組的斜紋數量、每組的累積斜紋數量、每組的斜紋補償數量、每組的累積斜紋補償數量。
-                counts, cumCounts, compensateCounts, cumCompensateCounts = counter.count(trackedLines) 
-                #分別用不同顏色標記每條鋼纜上的斜紋。
-                for index, group in enumerate(trackedLines):   
-                    for _, l in group.items():
-                        cv2.line(frame, l[0], l[1], Utils.groupColors()[index], 1)
-                #畫出界線。
-                cv2.line(frame, (0, borderY), (frame.shape[1], borderY), (0, 0, 0), 2)
-                #標示影片時間軸。
-                h, m, s = Utils.milliseconds2HMS(video.get(cv2.CAP_PROP_POS_MSEC))
-                cv2.putText(frame, '{}:{}:{}'.format(h, m, s), (10 , frameHeight - 100), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
-                #標示每條鋼纜的斜紋數量。
-                for index, c in enumerate(counts):
-                    cv2.putText(frame, str(c), (10 + 100 * index, frameHeight - 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, Utils.groupColors()[index], 2)
-                cv2.namedWindow('Frame', cv2.WINDOW_NORMAL)
-                cv2.imshow('Frame', frame)
-            #如果影片已結束或是按下鍵盤Q中途停止影片，則輸出最後一幀的畫面。
-            if int(video.get(cv2.CAP_PROP_POS_FRAMES)) == frameNumber or cv2.waitKey(1) == ord('q'):
-                folderName = datetime.now().strftime('%Y%m%d%H%M%S')
-                if not os.path.exists('Result/{}'.format(folderName)):
-                    os.makedirs('Result/{}'.format(folderName))
-                cv2.imwrite('Result/{}/last_frame.png'.format(folderName), frame)
-                break
-        video.release()
-        #初始化圖表繪圖器。
-        grapher = Grapher()
-        #畫出斜紋累積總數、斜紋累積補償數的折線圖與斜紋總數、斜紋補償數的表格。
-        grapher.plotCountsGraphAndTable(counts, compensateCounts, cumCounts, cumCompensateCounts)
-        #畫出斜紋斜率隨時間變化的圖。
-        #範圍一（滑輪上）
-        range1 = (int(round(0.35 * frameHeight)), int(round(0.55 * frameHeight)))
-        #範圍二（滑輪下）
-        range2 = (int(round(0.9 * frameHeight)), int(round(1.0 * frameHeight)))
-        grapher.plotSlopesGraph(cumLines, [range1, range2])
-        cv2.destroyAllWindows()
+        #每組每一幀的斜紋，邊處理邊寫入結果資料夾，不需全部存放在記憶體中。
+        lineStore = None
+        #計算平均斜率的範圍。範圍一（滑輪上）與範圍二（滑輪下）。
+        lineRanges = [(int(round(0.35 * frameHeight)), int(round(0.55 * frameHeight))), (int(round(0.9 * frameHeight)), int(round(1.0 * frameHeight)))]
+        #每組每一幀在每個範圍內的平均斜率，邊處理邊累計。
+        slopeAggregator = None
+        #處理過的幀數。
+        nProcessedFrames = 0
+        #決定每隔幾幀偵測一次，不跳幀時為None。
+        sampler = FrameSampler() if self._adaptiveSampling else None
+        #上一次追蹤的幀的位置。
+        lastTrackedPosition = None
+        #上一次存檢查點的幀的位置。
+        checkpointPosition = 0
+        #載入檢查點中的狀態，平均斜率由已寫入的斜紋表重新累計。
+        if state is not None:
+            detector.setState(state['detector'])
+            tracker, counter, sampler, lineStore = state['tracker'], state['counter'], state['sampler'], state['lineStore']
+            nProcessedFrames, lastTrackedPosition, checkpointPosition = state['nProcessedFrames'], state['lastTrackedPosition'], state['framePosition']
+            if counter is not None:
+                counts, cumCounts, compensateCounts, cumCompensateCounts = counter.results()
+            if lineStore.nGroup() > 0 and not self._countOnly:
+                slopeAggregator = SlopeAggregator.fromStore(lineStore, lineRanges)
+        else:
+            lineStore = LineStore('{}/lines'.format(folder))
+        #是否按下鍵盤Q中途停止。
+        stopped = False
+        #最後處理的一幀的畫面。
+        lastFrame = None
+        #在背景寫入標記好的畫面。從檢查點繼續時另存一部影片，不覆蓋之前的部分。
+        videoWriter = None
+        if self._annotatedVideo:
+            videoPath = '{}/annotated.mp4'.format(folder) if state is None else '{}/annotated_from_{}.mp4'.format(folder, state['framePosition'])
+            videoWriter = AnnotatedVideoWriter(videoPath, source.fps(), scale = self._videoScale, everyNth = self._videoEveryNth)
+        #邊處理邊輸出每一幀的結果與越過界線的斜紋。從檢查點繼續時同樣另存一份。
+        exporter = None
+        if self._exportFormat is not None:
+            exporter = ResultExporter(folder, self._exportFormat, suffix = '' if state is None else '_from_{}'.format(state['framePosition']))
+        #一幀一幀的讀取影片。由一個執行緒讀取影片，多個執行緒偵測斜紋，再依照幀的順序進行追蹤與計數。
+        with FramePipeline(source, detector, nWorkers = self._nWorkers, queueSize = self._bufferSize, sampler = sampler, dropPolicy = dropPolicy, grayscale = self._grayscale) as pipeline:
+            for frame, framePosition, frameMsec, groupedEllipses in pipeline.frames(bufferedFrames):
+                nProcessedFrames += 1
+                lastFrame = frame
+                #獲得斜紋偵測結果。
+                detectResult = detector.detect(frame, groupedEllipses)
+                #如果能正常偵測，則進行後續的追蹤與計數，否則跳過這一幀。
+                if detectResult is not None:
+                    #獲得斜紋、斜率、角度。
+                    groupedLines, groupedSlopes, groupedAngles = detectResult
+                    lineRows = lineStore.append(groupedLines)
+                    #初始化斜紋追蹤器。
+                    if tracker is None:
+                        tracker = self._createTracker(len(groupedLines), borderY, upward)
+                    #初始化斜紋計數器。
+                    if counter is None:
+                        counter = LineCounter(len(groupedLines), borderY, upward = upward) 
+                    #初始化平均斜率累計器。
+                    if not self._countOnly:
+                        if slopeAggregator is None:
+                            slopeAggregator = SlopeAggregator(len(groupedLines), lineRanges)
+                        slopeAggregator.add(lineRows, lineStore.nFrames())
+                    #獲得斜紋追蹤器正在追蹤的斜紋。
+                    #跳幀偵測或預測斜紋位置時，以實際經過的幀數計算。
+                    trackedFrames = framePosition - lastTrackedPosition if (sampler is not None or self._predictiveTracking) and lastTrackedPosition is not None else 1
+                    trackedLines = tracker.track(groupedLines, trackedFrames)
+                    #透過斜紋的位移更新每隔幾幀偵測一次。
+                    if sampler is not None and lastTrackedPosition is not None:
+                        sampler.update(tracker.getDisplacements(), trackedFrames, groupedLines)
+                    lastTrackedPosition = framePosition
+                    #透過斜紋計數器計算每組的斜紋數量、每組的累積斜紋數量、每組的斜紋補償數量、每組的累積斜紋補償數量。
+                    counts, cumCounts, compensateCounts, cumCompensateCounts = counter.count(trackedLines) 
+                    if exporter is not None:
+                        exporter.addFrame(framePosition, frameMsec, groupedSlopes, groupedAngles)
+                        exporter.addCrossings(framePosition, frameMsec, counter.crossings())
+                    #分別用不同顏色標記每條鋼纜上的斜紋。
+                    for index, group in enumerate(trackedLines):   
+                        for _, l in group.items():
+                            cv2.line(frame, l[0], l[1], Utils.groupColors()[index], 1)
+                    #畫出界線。
+                    cv2.line(frame, (0, borderY), (frame.shape[1], borderY), (0, 0, 0), 2)
+                    #標示影片時間軸。
+                    h, m, s = Utils.milliseconds2HMS(frameMsec)
+                    cv2.putText(frame, '{}:{}:{}'.format(h, m, s), (10 , frameHeight - 100), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 2)
+                    #標示每條鋼纜的斜紋數量。
+                    for index, c in enumerate(counts):
+                        cv2.putText(frame, str(c), (10 + 100 * index, frameHeight - 40), cv2.FONT_HERSHEY_SIMPLEX, 1.0, Utils.groupColors()[index], 2)
+                    if not self._headless:
+                        cv2.namedWindow('Frame', cv2.WINDOW_NORMAL)
+                        cv2.imshow('Frame', frame)
+                if videoWriter is not None:
+                    videoWriter.write(frame)
+                #如果影片已結束或是按下鍵盤Q中途停止影片，則停止讀取。即時來源會在讀不到畫面時結束。
+                if framePosition == frameNumber:
+                    break
+                if not self._headless and cv2.waitKey(1) == ord('q'):
+                    stopped = True
+                    break
+                #定期存檢查點。
+                if self._checkpointInterval is not None and framePosition - checkpointPosition >= self._checkpointInterval:
+                    self._saveCheckpoint(checkpoint, framePosition, upward, nProcessedFrames, lastTrackedPosition, detector, tracker, counter, sampler, lineStore)
+                    checkpointPosition = framePosition
+            #因偵測跟不上而被捨棄的幀數。
+            droppedFrames = pipeline.droppedFrames()
+        source.release()
+        if videoWriter is not None:
+            videoWriter.close()
+        if exporter is not None:
+            exporter.close()
+        #中途停止時存檢查點，之後可以從這裡繼續；處理完整部影片後則不再需要檢查點。
+        if checkpoint is not None:
+            if stopped:
+                self._saveCheckpoint(checkpoint, framePosition, upward, nProcessedFrames, lastTrackedPosition, detector, tracker, counter, sampler, lineStore)
+            else:
+                checkpoint.remove()
+        #輸出最後一幀的畫面。
+        if lastFrame is not None:
+            cv2.imwrite('{}/last_frame.png'.format(folder), lastFrame)
+        lineStore.flush()
+        #輸出斜紋偵測器的統計摘要。
+        if detectorStats is not None:
+            detectorStats.close()
+            summary = detectorStats.summary()
+            summary['droppedFrames'] = droppedFrames
+            if videoWriter is not None:
+                summary['droppedVideoFrames'] = videoWriter.droppedFrames()
+            with open('{}/detector_summary.json'.format(folder), 'w', encoding = 'utf-8') as f:
+                json.dump(summary, f, ensure_ascii = False, indent = 2)
+        #有幀因偵測跟不上而被捨棄時，計數結果可能少算，需提醒使用者。
+        if droppedFrames > 0:
+            print('Warning: {} frames were dropped because detection could not keep up; counts may be incomplete.'.format(droppedFrames), file = sys.stderr)
+        #輸出每組的斜紋數量、補償數量、處理過的幀數與被捨棄的幀數。
+        with open('{}/counts.json'.format(folder), 'w', encoding = 'utf-8') as f:
+            json.dump({'counts': counts, 'compensateCounts': compensateCounts, 'nFrames': nProcessedFrames, 'droppedFrames': droppedFrames}, f, indent = 2)
+        if not self._countOnly:
+            #初始化圖表繪圖器，只有需要畫圖時才載入 matplotlib。
+            from grapher import Grapher
+            grapher = Grapher()
+            #畫出斜紋累積總數、斜紋累積補償數的折線圖與斜紋總數、斜紋補償數的表格。
+            grapher.plotCountsGraphAndTable(counts, compensateCounts, cumCounts, cumCompensateCounts, savePath = '{}/counts.png'.format(folder) if self._headless else None)
+            #畫出斜紋斜率隨時間變化的圖。
+            grapher.plotSlopesGraph(slopeAggregator.meanSlopes(), savePath = '{}/slopes.png'.format(folder) if self._headless else None)
+        if not self._headless:
+            cv2.destroyAllWindows()
+        return (counts, compensateCounts, nProcessedFrames)
      
+    #建立追蹤[nGroup]條鋼纜上斜紋的追蹤器。只有使用預測斜紋位置的追蹤器時才載入其需要的 scipy。
+    def _createTracker(self, nGroup, borderY, upward):
+        if self._predictiveTracking:
+            from predictive_line_tracker import PredictiveLineTracker
+            return PredictiveLineTracker(nGroup, borderY = borderY, upward = upward)
+        return LineTracker(nGroup, borderY = borderY, upward = upward)
+
+    #會影響追蹤與計數方式的設定，從檢查點繼續時必須與存檢查點時相同。
+    def _checkpointOptions(self):
+        return {'roiMode': self._roiMode, 'roiVerticalMargin': self._roiVerticalMargin, 'adaptiveSampling': self._adaptiveSampling, 'predictiveTracking': self._predictiveTracking, 'detectionScale': self._detectionScale, 'refineMargin': self._refineMargin, 'ellipseFitting': self._ellipseFitting, 'temporalSmoothing': self._temporalSmoothing, 'reestimateInterval': self._reestimateInterval}
+
+    #將處理到第[framePosition]幀時的狀態存到檢查點[checkpoint]。
+    def _saveCheckpoint(self, checkpoint, framePosition, upward, nProcessedFrames, lastTrackedPosition, detector, tracker, counter, sampler, lineStore):
+        checkpoint.save({
+            'inputFile': os.path.basename(self._inputFile),
+            'options': self._checkpointOptions(),
+            'framePosition': framePosition,
+            'upward': upward,
+            'nProcessedFrames': nProcessedFrames,
+            'lastTrackedPosition': lastTrackedPosition,
+            'detector': detector.getState(),
+            'tracker': tracker,
+            'counter': counter,
+            'sampler': sampler,
+            'lineStore': lineStore,
+        })
+
     #處理輸入為圖片的情況。 
     def _handleImage(self):
         image = cv2.imread(self._inputFile)
         #斜紋偵測器。
-        detector = LineDetector(isVideo = False)
+        detector = LineDetector(isVideo = False, scale = self._detectionScale, ellipseFitting = self._ellipseFitting)
         #獲得斜紋偵測結果。
         detectResult = detector.detect(image)
         #獲得斜紋、斜率、角度。
@@ -167,14 +379,16 @@ class Runner:
             for l in group:
                 cv2.line(image, l[0], l[1], Utils.groupColors()[index], 1)
         #顯示結果圖片。
-        cv2.namedWindow('Frame', cv2.WINDOW_NORMAL)
-        cv2.imshow('Frame', image)
+        if not self._headless:
+            cv2.namedWindow('Frame', cv2.WINDOW_NORMAL)
+            cv2.imshow('Frame', image)
         #輸出結果圖片與Excel檔。
-        folderName = datetime.now().strftime('%Y%m%d%H%M%S')
-        if not os.path.exists('Result/{}'.format(folderName)):
-            os.makedirs('Result/{}'.format(folderName))
-        cv2.imwrite('Result/{}/result.png'.format(folderName), image)
-        workbook = xlsxwriter.Workbook('Result/{}/slope.xlsx'.format(folderName))
+        folder = self._resultFolder()
+        cv2.imwrite('{}/result.png'.format(folder), image)
+        import string
+        import xlsxwriter
+        #使用 constant_memory 模式，每寫完一列就寫入檔案，所以必須由上而下逐列寫入。
+        workbook = xlsxwriter.Workbook('{}/slope.xlsx'.format(folder), {'constant_memory': True})
         worksheet = workbook.add_worksheet()
         fmt = workbook.add_format()
         fmt.set_align('center')
@@ -182,29 +396,31 @@ class Runner:
         uppercases = string.ascii_uppercase
         for index in range(len(groupedLines)):
             worksheet.merge_range('{}1:{}1'.format(uppercases[2 * index], uppercases[2 * index + 1]), '鋼纜{}'.format(index + 1), fmt)
-            worksheet.write(1, 2 * index, '斜率', fmt)
-            worksheet.write(1, 2 * index + 1, '角度', fmt)
-        #寫入斜率。
-        for index1, group in enumerate(groupedSlopes):
-            for index2, s in enumerate(group):
-                worksheet.write(index2 + 2, 2 * index1, round(s, 3), fmt)
-        #寫入角度。
-        for index1, group in enumerate(groupedAngles):
-            for index2, a in enumerate(group):
-                worksheet.write(index2 + 2, 2 * index1 + 1, round(a, 3), fmt)
-        rowIndexOfAverage = max([len(group) for group in groupedLines]) + 3
+        worksheet.write_row(1, 0, ['斜率', '角度'] * len(groupedLines), fmt)
+        #逐列寫入每組的斜率與角度，斜紋較少的組留白。
+        nRows = max([len(group) for group in groupedLines])
+        for index2 in range(nRows):
+            row = []
+            for slopes, angles in zip(groupedSlopes, groupedAngles):
+                row += [round(slopes[index2], 3), round(angles[index2], 3)] if index2 < len(slopes) else [None, None]
+            worksheet.write_row(index2 + 2, 0, row, fmt)
+        rowIndexOfAverage = nRows + 3
         #平均斜率與角度。
         for index in range(len(groupedLines)):
             worksheet.merge_range('{}{}:{}{}'.format(uppercases[2 * index], rowIndexOfAverage, uppercases[2 * index + 1], rowIndexOfAverage), '平均', fmt)
-        #寫入平均斜率。
-        for index, group in enumerate(groupedSlopes):
-            worksheet.write(rowIndexOfAverage, 2 * index, round(np.mean(group), 3), fmt)
-        #寫入平均角度。
-        for index, group in enumerate(groupedAngles):
-            worksheet.write(rowIndexOfAverage, 2 * index + 1, round(np.mean(group), 3), fmt)
+        #寫入平均斜率與平均角度。
+        worksheet.write_row(rowIndexOfAverage, 0, [round(np.mean(group), 3) for pair in zip(groupedSlopes, groupedAngles) for group in pair], fmt)
         workbook.close()
-        cv2.waitKey(0)
-        cv2.destroyAllWindows()
+        if not self._headless:
+            cv2.waitKey(0)
+            cv2.destroyAllWindows()
+
+    #建立並回傳輸出結果的資料夾。
+    def _resultFolder(self):
+        folder = self._outputFolder if self._outputFolder is not None else 'Result/{}'.format(datetime.now().strftime('%Y%m%d%H%M%S'))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        return folder
                 
                 
         
@@ -0,0 +1,70 @@
+import numpy as np
+
+class SlopeAggregator:
+    '''
+    累計[nGroup]條鋼纜每一幀在各個Y座標範圍[lineRanges]內斜紋的平均斜率。斜紋以 LineStore 的斜紋表格式傳入，可在處理每一幀時傳入該幀的斜紋，也可在處理完後傳入整份斜紋表的區塊。
+    [capacity]為一開始預留的幀數，不足時會自動加倍。
+    '''
+    def __init__(self, nGroup, lineRanges, capacity = 1024):
+        #鋼纜數量。
+        self._nGroup = nGroup
+        #計算平均斜率的Y座標範圍 (下界, 上界)，不包含上下界。
+        self._lineRanges = np.array(lineRanges, dtype = np.float64).reshape(-1, 2)
+        #每個範圍每組每一幀的斜率總和與斜紋數量。
+        self._sums = np.zeros((len(self._lineRanges), self._nGroup, capacity))
+        self._counts = np.zeros((len(self._lineRanges), self._nGroup, capacity))
+        #已累計的幀數。
+        self._nFrames = 0
+
+    #從斜紋表[lineStore]建立範圍[lineRanges]內的平均斜率。
+    @staticmethod
+    def fromStore(lineStore, lineRanges):
+        aggregator = SlopeAggregator(lineStore.nGroup(), lineRanges, capacity = max(1, lineStore.nFrames()))
+        for chunk in lineStore.chunks():
+            aggregator.add(chunk)
+        #最後幾幀可能沒有任何斜紋。
+        aggregator.add(None, lineStore.nFrames())
+        return aggregator
+
+    '''
+    累計斜紋表[rows]中的斜紋，[rows]可為None。[nFrames]為目前總共的幀數（包含沒有任何斜紋的幀），為None時以[rows]中最後一幀為準。
+    所有斜紋一次以向量化的方式依照範圍、鋼纜與幀分類累加。
+    '''
+    def add(self, rows, nFrames = None):
+        if rows is not None and len(rows) > 0:
+            lastFrame = int(rows['frame'].max()) + 1
+            nFrames = lastFrame if nFrames is None else max(nFrames, lastFrame)
+        if nFrames is not None and nFrames > self._nFrames:
+            self._reserve(nFrames)
+            self._nFrames = nFrames
+        if rows is None or len(rows) == 0:
+            return
+        startX, startY = rows['startX'].astype(np.int64), rows['startY'].astype(np.int64)
+        endX, endY = rows['endX'].astype(np.int64), rows['endY'].astype(np.int64)
+        #斜紋中心點的Y座標，與 Utils.getLineCentroid 的結果相同。垂直的斜紋沒有斜率，不列入計算。
+        centroidYs = np.rint((startY + endY) / 2)
+        valid = endX != startX
+        slopes = np.zeros(len(rows))
+        slopes[valid] = (startY[valid] - endY[valid]) / (endX[valid] - startX[valid])
+        #每條斜紋落在哪些範圍內。
+        inRange = (centroidYs[None, :] > self._lineRanges[:, :1]) & (centroidYs[None, :] < self._lineRanges[:, 1:]) & valid[None, :]
+        rangeIndexes, lineIndexes = np.nonzero(inRange)
+        index = (rangeIndexes, rows['cable'][lineIndexes].astype(np.int64), rows['frame'][lineIndexes].astype(np.int64))
+        np.add.at(self._sums, index, slopes[lineIndexes])
+        np.add.at(self._counts, index, 1)
+
+    #每個範圍每組每一幀的平均斜率，形狀為 (範圍數量, 鋼纜數量, 幀數)，沒有斜紋的幀為NaN。
+    def meanSlopes(self):
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            return self._sums[:, :, :self._nFrames] / self._counts[:, :, :self._nFrames]
+
+    #確保至少能存放[nFrames]幀，容量不足時加倍。
+    def _reserve(self, nFrames):
+        capacity = self._sums.shape[2]
+        if nFrames <= capacity:
+            return
+        while capacity < nFrames:
+            capacity *= 2
+        padding = ((0, 0), (0, 0), (0, capacity - self._sums.shape[2]))
+        self._sums = np.pad(self._sums, padding)
+        self._counts = np.pad(self._counts, padding)
@@ -0,0 +1,42 @@
+import sys
+import time
+import numpy as np
+from frame_source import FrameSource
+
+class StdinSource(FrameSource):
+    '''
+    從[stream]（預設為標準輸入）讀取連續的原始BGR畫面，每幀為寬x高x3個位元組，[frameSize]為 (寬, 高)。
+    例如 ffmpeg -i rtsp://... -f rawvideo -pix_fmt bgr24 - 的輸出。[fps]不為None時以其計算每幀的時間，否則使用讀取當下的時間。
+    '''
+    def __init__(self, frameSize, fps = None, stream = None):
+        super().__init__()
+        if frameSize is None:
+            raise Exception('Frame size is required for raw frames from stdin.')
+        #畫面的寬與高。
+        self._size = (int(frameSize[0]), int(frameSize[1]))
+        #每秒的幀數。
+        self._fps = fps
+        #讀取畫面的來源。
+        self._stream = stream if stream is not None else sys.stdin.buffer
+        #開始讀取的時間。
+        self._startTime = time.monotonic()
+
+    def read(self):
+        width, height = self._size
+        data = self._stream.read(width * height * 3)
+        #資料不足一幀代表已讀完。
+        if data is None or len(data) < width * height * 3:
+            return (False, None)
+        frame = np.frombuffer(data, dtype = np.uint8).reshape(height, width, 3).copy()
+        self._msec = self._position * 1000 / self._fps if self._fps else (time.monotonic() - self._startTime) * 1000
+        self._position += 1
+        return (True, frame)
+
+    def isLive(self):
+        return True
+
+    def fps(self):
+        return self._fps if self._fps else 0.0
+
+    def size(self):
+        return self._size
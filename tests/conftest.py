@@ -0,0 +1,5 @@
+import os
+import sys
+
+#測試直接匯入專案根目錄中的模組。
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,15 @@
+from benchmark import Benchmark
+
+#以很短的影片完整執行一個場景。
+def test_short_scenario():
+    results = Benchmark(['baseline'], nFrames = 30).run()
+    assert results[0]['error'] is None
+    assert len(results[0]['counts']) == len(results[0]['truth'])
+    assert 'baseline' in Benchmark.summary(results)
+
+#場景執行失敗時回報錯誤，其他場景仍繼續執行。
+def test_failed_scenario_is_reported():
+    results = Benchmark(['baseline', 'slow'], nFrames = 1).run()
+    assert [r['scenario'] for r in results] == ['baseline', 'slow']
+    assert all(r['error'] is not None for r in results)
+    assert '錯誤' in Benchmark.summary(results)
@@ -0,0 +1,13 @@
+import numpy as np
+from benchmark import SyntheticVideo
+from chunked_runner import ChunkedRunner
+from runner import Runner
+
+#跳幀偵測時，分段處理不會跳過每段的最後一幀，計數結果與不分段處理時相近。每段的取樣間隔重新開始，所以每條鋼纜可能差一條斜紋。
+def test_adaptive_sampling_matches_sequential(tmp_path):
+    path = str(tmp_path / 'slow.avi')
+    SyntheticVideo(nFrames = 200, speed = 0.8).write(path)
+    counts, _, _ = Runner(path, headless = True, countOnly = True, adaptiveSampling = True, outputFolder = str(tmp_path / 'sequential')).run()
+    chunkedCounts, _, _ = ChunkedRunner(path, nChunks = 4, nThreads = 1, countOnly = True, adaptiveSampling = True, outputFolder = str(tmp_path / 'chunked')).run()
+    assert len(chunkedCounts) == len(counts)
+    assert np.all(np.abs(np.array(chunkedCounts) - np.array(counts)) <= 1)
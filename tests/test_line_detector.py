@@ -0,0 +1,53 @@
+import numpy as np
+from line_detector import ELLIPSE_DTYPE, LineDetector
+from robust_stats import RunningRobustStats
+
+#上下界固定的斜率統計量，加入斜率不會改變上下界。
+class FixedBounds:
+    def __init__(self, lower, upper):
+        self._bounds = (lower, upper)
+
+    def add(self, value):
+        pass
+
+    def bounds(self, lowerFactor, upperFactor):
+        return self._bounds
+
+#以固定上下界一次判斷的合併規則，與以相同上下界依序判斷的結果相同。
+def test_fixed_bounds_combined_pairs_match_sequential_rule():
+    detector = LineDetector()
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n = int(rng.integers(1, 40))
+        diffXs = rng.choice([0.0, 1.0, -2.0, 5.0], size = n)
+        combinedSlopes = rng.normal(0.35, 0.2, size = n)
+        #中心相連為垂直線時斜率為無限大。
+        combinedSlopes[diffXs == 0] = np.inf
+        lower, upper = sorted(rng.normal(0.35, 0.2, size = 2))
+        keptIndices, keptCombined = detector._findFixedBoundsCombinedPairs(diffXs, combinedSlopes, lower, upper)
+        expectedIndices, expectedCombined = detector._findCombinedPairs(diffXs, combinedSlopes, FixedBounds(lower, upper))
+        assert np.array_equal(keptIndices, expectedIndices)
+        assert np.array_equal(keptCombined, expectedCombined)
+
+#中心相連的直線的斜率與長軸斜率相近的兩個橢圓合併，中心相連為垂直線或斜率差異大的不合併，合併過的橢圓不會再與下個橢圓合併。
+def test_combined_pairs_add_combined_slopes():
+    detector = LineDetector()
+    slopes = np.array([0.3, 0.32, 0.35, 0.31, 0.9])
+    diffXs = np.array([1.0, 0.0, 2.0, 1.0])
+    combinedSlopes = np.array([0.33, np.inf, 5.0, 0.3])
+    keptIndices, keptCombined = detector._findCombinedPairs(diffXs, combinedSlopes, RunningRobustStats(slopes))
+    assert keptIndices.tolist() == [0, 2, 3]
+    assert keptCombined.tolist() == [True, False, True]
+
+#跨幀平滑時，因組數異常被捨棄的幀不會改變面積與角度的估計值，沒有被捨棄的幀才會。
+def test_rejected_frames_do_not_update_smoothed_stats():
+    detector = LineDetector(borderY = 100, temporalSmoothing = 0.1)
+    detector.setState(dict(detector.getState(), groupMeanCenterXs = [50.0, 150.0]))
+    group = np.zeros(10, dtype = ELLIPSE_DTYPE)
+    group['area'] = np.linspace(100, 200, 10)
+    group['angle'] = np.linspace(40, 50, 10)
+    group['centerY'] = np.arange(10) * 20.0
+    assert detector.detect(np.zeros((240, 320), dtype = np.uint8), [group.copy()]) is None
+    assert np.isnan(detector.getState()['smoothedStats']['area'].medianAndMad()[0])
+    detector.detect(np.zeros((240, 320), dtype = np.uint8), [group.copy(), group.copy()])
+    assert detector.getState()['smoothedStats']['area'].medianAndMad()[0] == 150.0
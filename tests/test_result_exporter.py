@@ -0,0 +1,42 @@
+import csv
+import sys
+import numpy as np
+import pytest
+from result_exporter import ResultExporter
+
+#寫入兩幀的結果與越過界線的斜紋，batchSize 為1讓每一列都分批寫入。
+def _export(folder, fileFormat):
+    with ResultExporter(str(folder), fileFormat, batchSize = 1) as exporter:
+        exporter.addFrame(1, 33.3, [[0.3, 0.5], []], [[16.0, 26.0], []])
+        exporter.addFrame(2, 66.7, [[0.2], [0.4]], [[11.0], [22.0]])
+        exporter.addCrossings(2, 66.7, [(0, 5, False), (1, 7, True)])
+
+def test_csv(tmp_path):
+    _export(tmp_path, 'csv')
+    with open(tmp_path / 'frames.csv', encoding = 'utf-8') as f:
+        frames = list(csv.DictReader(f))
+    assert [(r['frame'], r['cable'], r['nLines']) for r in frames] == [('1', '0', '2'), ('1', '1', '0'), ('2', '0', '1'), ('2', '1', '1')]
+    assert float(frames[0]['meanSlope']) == pytest.approx(0.4)
+    assert frames[1]['meanSlope'] == 'nan'
+    with open(tmp_path / 'crossings.csv', encoding = 'utf-8') as f:
+        crossings = list(csv.DictReader(f))
+    assert [(r['cable'], r['lineId'], r['compensated']) for r in crossings] == [('0', '5', 'False'), ('1', '7', 'True')]
+
+def test_parquet(tmp_path):
+    pyarrowParquet = pytest.importorskip('pyarrow.parquet')
+    _export(tmp_path, 'parquet')
+    frames = pyarrowParquet.read_table(str(tmp_path / 'frames.parquet')).to_pydict()
+    assert frames['frame'] == [1, 1, 2, 2]
+    assert frames['nLines'] == [2, 0, 1, 1]
+    assert frames['meanSlope'][0] == pytest.approx(0.4)
+    assert np.isnan(frames['meanSlope'][1])
+    crossings = pyarrowParquet.read_table(str(tmp_path / 'crossings.parquet')).to_pydict()
+    assert crossings['lineId'] == [5, 7]
+    assert crossings['compensated'] == [False, True]
+
+#沒有安裝 pyarrow 時，在建立任何檔案之前就回報。
+def test_parquet_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    with pytest.raises(Exception, match = 'requires pyarrow'):
+        ResultExporter(str(tmp_path), 'parquet')
+    assert list(tmp_path.iterdir()) == []
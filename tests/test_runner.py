@@ -0,0 +1,53 @@
+import io
+import json
+import sys
+import types
+import numpy as np
+import pytest
+from benchmark import SyntheticVideo
+from runner import Runner
+
+#縮放偵測時，判斷鋼纜移動方向的前幾幀中最早的斜紋可能已離開畫面，仍可正常判斷方向並計數。
+@pytest.mark.parametrize('upward', [True, False])
+def test_detection_scale(tmp_path, upward):
+    path = str(tmp_path / 'video.avi')
+    video = SyntheticVideo(nFrames = 90, upward = upward)
+    video.write(path)
+    truth, _ = video.groundTruth(int(round(0.35 * video.size()[1])))
+    counts, _, nFrames = Runner(path, headless = True, countOnly = True, detectionScale = 0.5, outputFolder = str(tmp_path / 'result')).run()
+    assert nFrames == 90
+    assert all(abs(c - t) <= 1 for c, t in zip(counts, truth))
+
+#以管線傳入標準輸入的檔案，未指定捨棄方式時不會捨棄任何幀。
+def test_stdin_does_not_drop_frames(tmp_path, monkeypatch):
+    video = SyntheticVideo(nFrames = 60)
+    data = b''.join(np.ascontiguousarray(frame).tobytes() for frame in video.frames())
+    monkeypatch.setattr(sys, 'stdin', types.SimpleNamespace(buffer = io.BytesIO(data)))
+    folder = tmp_path / 'result'
+    _, _, nFrames = Runner('-', nWorkers = 1, bufferSize = 1, headless = True, countOnly = True, frameSize = video.size(), fps = 30, outputFolder = str(folder)).run()
+    assert nFrames == 60
+    with open(folder / 'counts.json', encoding = 'utf-8') as f:
+        assert json.load(f)['droppedFrames'] == 0
+
+#只處理界線上下的範圍時，計數與實際數量相同，且不比處理整張影像時差。
+@pytest.mark.parametrize('upward', [True, False])
+@pytest.mark.parametrize('roiMode', ['union', 'lanes'])
+def test_roi_vertical_margin(tmp_path, upward, roiMode):
+    path = str(tmp_path / 'video.avi')
+    video = SyntheticVideo(nFrames = 90, upward = upward, noise = 4)
+    video.write(path)
+    truth, _ = video.groundTruth(int(round(0.35 * video.size()[1])))
+    fullCounts, _, _ = Runner(path, nWorkers = 1, headless = True, countOnly = True, outputFolder = str(tmp_path / 'full')).run()
+    for margin in (80, 150):
+        counts, _, _ = Runner(path, nWorkers = 1, headless = True, countOnly = True, roiMode = roiMode, roiVerticalMargin = margin, outputFolder = str(tmp_path / 'roi{}'.format(margin))).run()
+        assert counts == truth
+        assert all(abs(c - t) <= abs(f - t) for c, f, t in zip(counts, fullCounts, truth))
+
+#依照斜紋速度跳幀時，跳過的幀由每一幀的追蹤結果依序決定，加速的鋼纜的計數與執行緒數量及暫存幀數無關。
+def test_adaptive_sampling_is_deterministic(tmp_path):
+    path = str(tmp_path / 'video.avi')
+    SyntheticVideo(nFrames = 90, speed = 0.5, acceleration = 0.04).write(path)
+    results = [Runner(path, nWorkers = nWorkers, bufferSize = bufferSize, headless = True, countOnly = True, adaptiveSampling = True, outputFolder = str(tmp_path / 'result{}_{}'.format(nWorkers, bufferSize))).run() for nWorkers, bufferSize in [(1, 1), (2, 4), (8, 64)]]
+    assert results[0][2] < 90
+    assert results[1] == results[0]
+    assert results[2] == results[0]
@@ -1,3 +1,5 @@
+import unicodedata
+
 class Utils:
     @staticmethod
     #每條鋼纜使用的顏色。
@@ -22,4 +24,17 @@ class Utils:
     #計算線段[line]的中心點。
     @staticmethod
     def getLineCentroid(line):
-        return (int(round((line[0][0] + line[1][0]) / 2)), int(round((line[0][1] + line[1][1]) / 2)))
\ No newline at end of file
+        return (int(round((line[0][0] + line[1][0]) / 2)), int(round((line[0][1] + line[1][1]) / 2)))
+
+    #文字[text]在終端機中的顯示寬度，中文等全形字元佔兩格。
+    @staticmethod
+    def displayWidth(text):
+        return sum(2 if unicodedata.east_asian_width(c) in ('W', 'F') else 1 for c in text)
+
+    #將表頭[header]與每一列[rows]排成以空白對齊的表格文字，第二行為分隔線。
+    @staticmethod
+    def formatTable(header, rows):
+        widths = [max(Utils.displayWidth(row[i]) for row in [header] + rows) for i in range(len(header))]
+        lines = ['  '.join(cell + ' ' * (w - Utils.displayWidth(cell)) for cell, w in zip(row, widths)).rstrip() for row in [header] + rows]
+        lines.insert(1, '  '.join('-' * w for w in widths))
+        return '\n'.join(lines)